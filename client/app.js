@@ -79,8 +79,12 @@ document.addEventListener('DOMContentLoaded', function() {
             chart_type: chartType
         };
         
-        // Make the API call
-        fetch('http://127.0.0.1:8000/api/v1/analysis/analyse', {
+        // Make the API call; the report streams in as newline-delimited JSON events
+        let htmlSoFar = '';
+        let lastRender = 0;
+        let result = null;
+        
+        fetch('http://127.0.0.1:8000/api/v1/analysis/analyse/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -91,27 +95,30 @@ document.addEventListener('DOMContentLoaded', function() {
             if (!response.ok) {
                 throw new Error('Network response was not ok');
             }
-            return response.json();
+            return readEvents(response, handleEvent);
         })
-        .then(data => {
+        .then(() => {
+            if (!result) {
+                throw new Error('The report stream ended unexpectedly');
+            }
             // Hide loader and show response data
             loader.classList.add('hidden');
             responseData.classList.remove('hidden');
             
             // Update UI with response data
-            statusElem.textContent = data.status;
-            filePathElem.textContent = extractFilename(data.file_path);
+            statusElem.textContent = result.status;
+            filePathElem.textContent = extractFilename(result.file_path);
             
             // Format explanation for markdown and add to chat
-            const formattedExplanation = formatMarkdown(data.explanation);
+            const formattedExplanation = formatMarkdown(result.explanation);
             addMessage(`### Analysis complete!\n\n${formattedExplanation}`, 'system');
             
             // Automatically display the artifact without requiring a click
-            displayArtifact(data.file_path);
+            displayArtifact(result.file_path);
             
             // Keep the clickable functionality for the file path
             filePathElem.onclick = function() {
-                displayArtifact(data.file_path);
+                displayArtifact(result.file_path);
                 addMessage(`Viewing chart in the artifact window.`, 'system');
             };
         })
@@ -128,10 +135,62 @@ document.addEventListener('DOMContentLoaded', function() {
             // Add error message to chat
             addMessage(`### Error\n\n${error.message}\n\nPlease check your API server and try again.`, 'system');
         });
+        
+        // Apply one streamed event to the UI
+        function handleEvent(event) {
+            if (event.event === 'status') {
+                addMessage(event.message, 'system');
+            } else if (event.event === 'html') {
+                htmlSoFar += event.delta;
+                // Re-render the partial report at most a few times per second
+                const now = Date.now();
+                if (now - lastRender > 300) {
+                    lastRender = now;
+                    displayPartialArtifact(htmlSoFar);
+                }
+            } else if (event.event === 'done') {
+                result = event;
+            } else if (event.event === 'error') {
+                throw new Error(event.detail);
+            }
+        }
+    }
+    
+    // Read a newline-delimited JSON response, calling onEvent for every complete line
+    async function readEvents(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            for (const line of lines) {
+                if (line.trim()) {
+                    onEvent(JSON.parse(line));
+                }
+            }
+            if (done) {
+                if (buffer.trim()) {
+                    onEvent(JSON.parse(buffer));
+                }
+                return;
+            }
+        }
+    }
+    
+    // Function to display a report that is still being generated
+    function displayPartialArtifact(html) {
+        artifactFrame.srcdoc = html;
+        artifactPlaceholder.classList.add('hidden');
+        artifactContent.classList.remove('hidden');
     }
     
     // Function to display artifact in the right panel
     function displayArtifact(filePath) {
+        // srcdoc takes precedence over src, drop the streamed preview first
+        artifactFrame.removeAttribute('srcdoc');
         // Set iframe source to the file path
         artifactFrame.src = filePath;
         
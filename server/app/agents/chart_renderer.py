@@ -0,0 +1,259 @@
+import re
+import json
+import html
+from datetime import date, datetime
+from decimal import Decimal
+from string import Template
+from typing import Any, Dict, List, Optional, Sequence
+
+# Chart types the renderer draws itself; anything else goes to the model
+CHART_TYPES = ("bar", "line", "pie", "doughnut", "scatter", "table")
+_CHART_TYPE_ALIASES = {
+    "column": "bar", "histogram": "bar", "trend": "line", "area": "line",
+    "donut": "doughnut", "scatter plot": "scatter", "tabular": "table",
+}
+_CHART_TYPE_PATTERN = re.compile(
+    r"\b(" + "|".join(sorted(CHART_TYPES + tuple(_CHART_TYPE_ALIASES), key=len, reverse=True)) + r")\b",
+    re.IGNORECASE,
+)
+
+MAX_SERIES = 6
+MAX_PIE_SLICES = 12
+MAX_CHART_POINTS = 500
+MAX_TABLE_ROWS = 500
+OTHER_LABEL = "Other"
+COLORS = ["#4e79a7", "#f28e2b", "#59a14f", "#e15759", "#76b7b2", "#edc948",
+          "#b07aa1", "#ff9da7", "#9c755f", "#bab0ac", "#86bcb6", "#d37295"]
+
+_PAGE_TEMPLATE = Template("""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>$title</title>
+<script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
+<style>
+body { font-family: -apple-system, "Segoe UI", Roboto, sans-serif; background: #f7f9fc; color: #243447; margin: 0; padding: 24px; }
+.card { background: #fff; border-radius: 10px; box-shadow: 0 1px 4px rgba(0,0,0,.08); padding: 20px; margin: 0 auto 20px; max-width: 1100px; }
+h1 { font-size: 1.3rem; margin: 0 0 4px; }
+.meta { color: #6b7c93; font-size: .85rem; margin-bottom: 12px; }
+.chart { position: relative; height: 420px; }
+table { border-collapse: collapse; width: 100%; font-size: .85rem; }
+th, td { border-bottom: 1px solid #e6ebf1; padding: 6px 10px; text-align: left; }
+th { background: #f0f4f8; position: sticky; top: 0; }
+td.num { text-align: right; font-variant-numeric: tabular-nums; }
+.table-wrap { max-height: 480px; overflow: auto; }
+.explanation { white-space: pre-wrap; line-height: 1.5; }
+</style>
+</head>
+<body>
+<div class="card"><h1>$title</h1><div class="meta">$meta</div>$chart</div>
+$explanation
+<div class="card"><div class="table-wrap">$table</div></div>
+</body>
+</html>
+""")
+
+_CHART_TEMPLATE = Template("""<div class="chart"><canvas id="chart"></canvas></div>
+<script>
+new Chart(document.getElementById("chart"), $config);
+</script>""")
+
+
+def parse_chart_type(text: Optional[str]) -> Optional[str]:
+    """Chart type named in a chart_type value or a free-text HTML prompt"""
+    if not text:
+        return None
+    match = _CHART_TYPE_PATTERN.search(text)
+    if match is None:
+        return None
+    chart_type = match.group(1).lower()
+    return _CHART_TYPE_ALIASES.get(chart_type, chart_type)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+
+def _is_date(value: Any) -> bool:
+    return isinstance(value, (date, datetime)) or (isinstance(value, str) and re.match(r"^\d{4}-\d{2}(-\d{2})?", value) is not None)
+
+
+def _to_json_value(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if value is None or _is_number(value) or isinstance(value, (str, bool)):
+        return value
+    return str(value)
+
+
+def _format_cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (float, Decimal)):
+        return f"{value:,.2f}"
+    if isinstance(value, int) and not isinstance(value, bool):
+        return f"{value:,}"
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M")
+    return str(value)
+
+
+def _dump_script_json(data: Any) -> str:
+    # "</" would end the <script> element early
+    return json.dumps(data, default=str).replace("</", "<\\/")
+
+
+class ChartRenderer:
+    """
+    Turns a query result into a self-contained HTML report from templates:
+    a Chart.js chart of the requested type, the explanation and a data table.
+    """
+
+    def classify_columns(self, columns: Sequence[str], rows: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+        """Split columns into numeric, date and other by their non-null values"""
+        kinds = {"numeric": [], "date": [], "other": []}
+        for column in columns:
+            values = [row.get(column) for row in rows if row.get(column) is not None]
+            if values and all(_is_number(value) for value in values):
+                kinds["numeric"].append(column)
+            elif values and all(_is_date(value) for value in values):
+                kinds["date"].append(column)
+            else:
+                kinds["other"].append(column)
+        return kinds
+
+    def resolve_chart_type(self, chart_type: Optional[str], columns: Sequence[str], rows: List[Dict[str, Any]]) -> Optional[str]:
+        """
+        The chart type to draw for this result, or None when the requested type is
+        not one the renderer knows. Results without numbers are shown as a table.
+        """
+        if chart_type is not None and chart_type not in CHART_TYPES:
+            return None
+        kinds = self.classify_columns(columns, rows)
+        if not rows or not kinds["numeric"]:
+            return "table"
+        if chart_type is None:
+            # No preference given: dates read best as a line, a single value as a table
+            if len(rows) == 1 and len(columns) <= 2:
+                return "table"
+            return "line" if kinds["date"] else "bar"
+        if chart_type == "scatter" and len(kinds["numeric"]) < 2:
+            return "bar"
+        return chart_type
+
+    def build_chart_config(self, chart_type: str, columns: Sequence[str], rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        kinds = self.classify_columns(columns, rows)
+        numeric = kinds["numeric"]
+        if chart_type == "scatter":
+            x_column, y_column = numeric[0], numeric[1]
+            points = [
+                {"x": _to_json_value(row[x_column]), "y": _to_json_value(row[y_column])}
+                for row in rows[:MAX_CHART_POINTS] if row.get(x_column) is not None and row.get(y_column) is not None
+            ]
+            return {
+                "type": "scatter",
+                "data": {"datasets": [{"label": f"{y_column} vs {x_column}", "data": points, "backgroundColor": COLORS[0]}]},
+                "options": {
+                    "maintainAspectRatio": False,
+                    "scales": {"x": {"title": {"display": True, "text": x_column}},
+                               "y": {"title": {"display": True, "text": y_column}}},
+                },
+            }
+
+        label_columns = kinds["date"] + kinds["other"]
+        label_column = label_columns[0] if label_columns else None
+        value_columns = [column for column in numeric if column != label_column]
+        if label_column is None and len(numeric) > 1:
+            # All-numeric result: the first column is the category (e.g. a year or an id)
+            label_column, value_columns = numeric[0], numeric[1:]
+        if label_column in kinds["date"] and chart_type == "line":
+            rows = sorted(rows, key=lambda row: str(row.get(label_column)))
+        if chart_type in ("pie", "doughnut"):
+            value_columns = value_columns[:1]
+            if value_columns:
+                rows = self._fold_slices(rows, label_column, value_columns[0])
+        else:
+            rows = rows[:MAX_CHART_POINTS]
+            value_columns = value_columns[:MAX_SERIES]
+
+        labels = [_to_json_value(row.get(label_column)) if label_column else index + 1 for index, row in enumerate(rows)]
+        datasets = []
+        for index, column in enumerate(value_columns):
+            dataset = {"label": column, "data": [_to_json_value(row.get(column)) for row in rows]}
+            if chart_type in ("pie", "doughnut"):
+                dataset["backgroundColor"] = [COLORS[i % len(COLORS)] for i in range(len(rows))]
+            else:
+                dataset["backgroundColor"] = COLORS[index % len(COLORS)]
+                dataset["borderColor"] = COLORS[index % len(COLORS)]
+                if chart_type == "line":
+                    dataset["fill"] = False
+                    dataset["tension"] = 0.25
+            datasets.append(dataset)
+
+        options: Dict[str, Any] = {"maintainAspectRatio": False, "plugins": {"legend": {"display": len(datasets) > 1 or chart_type in ("pie", "doughnut")}}}
+        if chart_type in ("bar", "line"):
+            options["scales"] = {"y": {"beginAtZero": True}}
+            if label_column:
+                options["scales"]["x"] = {"title": {"display": True, "text": label_column}}
+        return {"type": chart_type, "data": {"labels": labels, "datasets": datasets}, "options": options}
+
+    def _fold_slices(self, rows: List[Dict[str, Any]], label_column: Optional[str], value_column: str) -> List[Dict[str, Any]]:
+        """Largest slices first; past MAX_PIE_SLICES the smallest are summed into one "Other" slice so shares stay true"""
+        rows = sorted(rows, key=lambda row: float(row.get(value_column) or 0), reverse=True)
+        if len(rows) <= MAX_PIE_SLICES:
+            return rows
+        kept, folded = rows[:MAX_PIE_SLICES - 1], rows[MAX_PIE_SLICES - 1:]
+        other = {value_column: sum(float(row.get(value_column) or 0) for row in folded)}
+        if label_column:
+            other[label_column] = OTHER_LABEL
+        return kept + [other]
+
+    def describe_limits(self, chart_type: str, rows: List[Dict[str, Any]]) -> List[str]:
+        """Notes for the report meta line on rows the chart or table does not show one by one"""
+        notes = []
+        if chart_type in ("pie", "doughnut") and len(rows) > MAX_PIE_SLICES:
+            notes.append(f"chart shows the largest {MAX_PIE_SLICES - 1} of {len(rows)} slices, the rest as {OTHER_LABEL}")
+        elif chart_type not in ("table", "pie", "doughnut") and len(rows) > MAX_CHART_POINTS:
+            notes.append(f"chart shows the first {MAX_CHART_POINTS} of {len(rows)} rows")
+        if len(rows) > MAX_TABLE_ROWS:
+            notes.append(f"table shows the first {MAX_TABLE_ROWS} rows")
+        return notes
+
+    def render_table(self, columns: Sequence[str], rows: List[Dict[str, Any]]) -> str:
+        if not rows:
+            return "<p>No data returned from query.</p>"
+        numeric = set(self.classify_columns(columns, rows)["numeric"])
+        header = "".join(f"<th>{html.escape(str(column))}</th>" for column in columns)
+        body = []
+        for row in rows[:MAX_TABLE_ROWS]:
+            cells = "".join(
+                f"<td class=\"num\">{html.escape(_format_cell(row.get(column)))}</td>" if column in numeric
+                else f"<td>{html.escape(_format_cell(row.get(column)))}</td>"
+                for column in columns
+            )
+            body.append(f"<tr>{cells}</tr>")
+        return f"<table><thead><tr>{header}</tr></thead><tbody>{''.join(body)}</tbody></table>"
+
+    def render(self, title: str, columns: Sequence[str], rows: List[Dict[str, Any]], chart_type: str,
+               explanation: str = "", truncated: bool = False) -> str:
+        """Full HTML report for a chart type returned by resolve_chart_type"""
+        chart_html = ""
+        if chart_type != "table":
+            chart_html = _CHART_TEMPLATE.substitute(config=_dump_script_json(self.build_chart_config(chart_type, columns, rows)))
+        meta = f"{len(rows)} rows" + (" (truncated)" if truncated else "")
+        for note in self.describe_limits(chart_type, rows):
+            meta += f" &middot; {html.escape(note)}"
+        meta += f" &middot; generated {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+        explanation_html = ""
+        if explanation:
+            explanation_html = f"<div class=\"card\"><h1>Analysis</h1><div class=\"explanation\">{html.escape(explanation)}</div></div>"
+        return _PAGE_TEMPLATE.substitute(
+            title=html.escape(title),
+            meta=meta,
+            chart=chart_html,
+            explanation=explanation_html,
+            table=self.render_table(columns, rows),
+        )
@@ -0,0 +1,62 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Any, Optional, Sequence
+
+from utils.tiered_cache import TieredCache
+
+
+def get_model_name(model) -> str:
+    """Model identifier of a chat model or a with_structured_output() runnable"""
+    bound = getattr(model, "bound", model)
+    return str(getattr(bound, "model_name", None) or getattr(bound, "model", None) or type(bound).__name__)
+
+
+def get_model_temperature(model) -> Optional[float]:
+    bound = getattr(model, "bound", model)
+    return getattr(bound, "temperature", None)
+
+
+def hash_messages(messages: Sequence[Any]) -> str:
+    """Hash a message list by message type and content"""
+    payload = [
+        {"type": getattr(message, "type", type(message).__name__), "content": getattr(message, "content", message)}
+        for message in messages
+    ]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache(TieredCache):
+    """
+    Cache of model responses keyed by model name, temperature, the message list
+    and the schema fingerprint the prompt was built from.
+    """
+
+    def make_key(self, model, messages: Sequence[Any], schema_fingerprint: Optional[str] = None, variant: Any = None) -> str:
+        raw_key = (
+            f"{get_model_name(model)}\x00{get_model_temperature(model)}\x00"
+            f"{hash_messages(messages)}\x00{schema_fingerprint}\x00{variant}"
+        )
+        return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
+
+
+_llm_cache: Optional[LLMResponseCache] = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """Get the process-wide LLM response cache, or None when disabled"""
+    global _llm_cache
+    if os.getenv("LLM_CACHE_ENABLED", "true").lower() != "true":
+        return None
+    if _llm_cache is None:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                _llm_cache = LLMResponseCache(
+                    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512")),
+                    ttl_seconds=int(os.getenv("LLM_CACHE_TTL", "86400")),
+                    disk_dir=os.getenv("LLM_CACHE_DIR") or None,
+                    disk_max_entries=int(os.getenv("LLM_CACHE_DISK_MAX_ENTRIES", "5000")),
+                )
+    return _llm_cache
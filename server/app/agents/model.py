@@ -2,30 +2,154 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_cerebras import ChatCerebras
 from langchain_core.messages import HumanMessage, SystemMessage
 import os
+import asyncio
+import threading
+import httpx
 from dotenv import load_dotenv
 import base64
+from agents.model_router import ModelRouter
 
 load_dotenv(override=True)
 
+DEFAULT_CEREBRAS_MODEL = "llama-4-scout-17b-16e-instruct"
+
+# Process-wide chat models keyed by (provider, model, temperature). Clients of
+# one provider share a keep-alive HTTP pool, so TLS setup is paid once per
+# connection instead of once per controller.
+_MODELS = {}
+_HTTP_CLIENTS = {}
+_HTTP_LIMITS = {}
+_MODEL_LOCK = threading.Lock()
+
 class GenerativeModel:
     def __init__(self):
         """Initialize GenerativeModel without immediate model creation"""
-        pass
+        # HTTP pool settings of the Cerebras clients
+        self.CEREBRAS_MAX_CONNECTIONS = int(os.getenv("CEREBRAS_MAX_CONNECTIONS", "20"))
+        self.CEREBRAS_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("CEREBRAS_MAX_KEEPALIVE_CONNECTIONS", "10"))
+        self.LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "120"))
+
+        # Models created and warmed with a one-token call at startup
+        self.LLM_WARMUP_ENABLED = os.getenv("LLM_WARMUP_ENABLED", "true").lower() == "true"
+        self.LLM_WARMUP_MODELS = [
+            name.strip() for name in os.getenv("LLM_WARMUP_MODELS", DEFAULT_CEREBRAS_MODEL).split(",") if name.strip()
+        ]
 
     def get_model(self, model_name: str, temperature: float = 0.5):
-        """Create and return a ChatGoogleGenerativeAI instance"""
-        return ChatGoogleGenerativeAI(
-            api_key=os.getenv("GOOGLE_API_KEY"),
-            model=model_name,
-            temperature=temperature,
-            verbose=True
-        )
-    
-    def get_cerebras_model(self, model_name: str, temperature: float = 0.5):
-        return ChatCerebras(
-            api_key=os.getenv("CEREBRAS_API_KEY"),
-            model=model_name,
-            tools=[],
-            temperature=temperature,
-            verbose=True
-        )
+        """Get the shared ChatGoogleGenerativeAI instance of a model"""
+        key = ("google", model_name, temperature)
+        with _MODEL_LOCK:
+            if key not in _MODELS:
+                # The Google client manages its own transport; reusing the instance keeps it open
+                _MODELS[key] = ChatGoogleGenerativeAI(
+                    api_key=os.getenv("GOOGLE_API_KEY"),
+                    model=model_name,
+                    temperature=temperature,
+                    verbose=True
+                )
+            return _MODELS[key]
+
+    def get_cerebras_model(self, model_name: str = DEFAULT_CEREBRAS_MODEL, temperature: float = 0.5):
+        """Get the shared ChatCerebras instance of a model, on the pooled Cerebras HTTP clients"""
+        key = ("cerebras", model_name, temperature)
+        with _MODEL_LOCK:
+            if key not in _MODELS:
+                http_client, http_async_client = self._get_http_clients(
+                    "cerebras", self.CEREBRAS_MAX_CONNECTIONS, self.CEREBRAS_MAX_KEEPALIVE_CONNECTIONS
+                )
+                _MODELS[key] = ChatCerebras(
+                    api_key=os.getenv("CEREBRAS_API_KEY"),
+                    model=model_name,
+                    tools=[],
+                    temperature=temperature,
+                    verbose=True,
+                    http_client=http_client,
+                    http_async_client=http_async_client
+                )
+                print(f"Created shared LLM client: {key}")
+            return _MODELS[key]
+
+    def get_model_router(self, backend_specs: str, temperature: float = 0.5) -> ModelRouter:
+        """
+        Get the shared router over comma-separated provider:model backends, in
+        order of preference, e.g. "cerebras:llama-4-scout-17b-16e-instruct,google:gemini-2.0-flash".
+        """
+        specs = tuple(spec.strip() for spec in backend_specs.split(",") if spec.strip())
+        key = ("router", ",".join(specs), temperature)
+        with _MODEL_LOCK:
+            router = _MODELS.get(key)
+        if router is not None:
+            return router
+        backends = {}
+        for spec in specs:
+            provider, _, model_name = spec.partition(":")
+            if provider == "cerebras":
+                backends[spec] = self.get_cerebras_model(model_name, temperature)
+            elif provider == "google":
+                backends[spec] = self.get_model(model_name, temperature)
+            else:
+                raise ValueError(f"Unknown LLM provider in LLM_ROUTER_BACKENDS: {spec}")
+        with _MODEL_LOCK:
+            return _MODELS.setdefault(key, ModelRouter(backends))
+
+    def _get_http_clients(self, provider: str, max_connections: int, max_keepalive_connections: int):
+        """Sync and async keep-alive HTTP clients of a provider; call with _MODEL_LOCK held"""
+        if provider not in _HTTP_CLIENTS:
+            limits = httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=self.LLM_KEEPALIVE_EXPIRY,
+            )
+            _HTTP_CLIENTS[provider] = (httpx.Client(limits=limits), httpx.AsyncClient(limits=limits))
+            _HTTP_LIMITS[provider] = {
+                "max_connections": max_connections,
+                "max_keepalive_connections": max_keepalive_connections,
+                "keepalive_expiry": self.LLM_KEEPALIVE_EXPIRY,
+            }
+        return _HTTP_CLIENTS[provider]
+
+    async def warm_up(self) -> None:
+        """
+        Create the LLM_WARMUP_MODELS clients and open a connection in both of
+        their pools with a one-token completion, so the first request skips
+        connection setup. Failures are logged and never block startup.
+        """
+        if not self.LLM_WARMUP_ENABLED:
+            return
+        warm_up_messages = [HumanMessage(content="ping")]
+        for model_name in self.LLM_WARMUP_MODELS:
+            model = self.get_cerebras_model(model_name)
+            results = await asyncio.gather(
+                model.ainvoke(warm_up_messages, max_tokens=1),
+                asyncio.to_thread(model.invoke, warm_up_messages, max_tokens=1),
+                return_exceptions=True,
+            )
+            errors = [result for result in results if isinstance(result, Exception)]
+            if errors:
+                print(f"Warning: LLM warm-up of {model_name} failed: {errors[0]}")
+            else:
+                print(f"LLM client warmed up: {model_name}")
+
+    @staticmethod
+    def get_client_stats() -> dict:
+        """Shared models and HTTP pool limits for monitoring"""
+        with _MODEL_LOCK:
+            return {
+                "models": [f"{provider}:{model_name}@{temperature}" for provider, model_name, temperature in _MODELS],
+                "routers": {
+                    model_name: model.get_stats() for (provider, model_name, _), model in _MODELS.items() if provider == "router"
+                },
+                "http_pools": dict(_HTTP_LIMITS),
+            }
+
+    @staticmethod
+    async def close_clients() -> None:
+        """Close the shared HTTP pools and forget every shared model"""
+        with _MODEL_LOCK:
+            clients = list(_HTTP_CLIENTS.values())
+            _HTTP_CLIENTS.clear()
+            _HTTP_LIMITS.clear()
+            _MODELS.clear()
+        for http_client, http_async_client in clients:
+            http_client.close()
+            await http_async_client.aclose()
@@ -0,0 +1,382 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+# Threads running sync hedged requests; a losing request finishes in the background
+_HEDGE_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_ROUTER_HEDGE_THREADS", "8")), thread_name_prefix="llm-hedge")
+
+
+class CircuitBreaker:
+    """
+    Health of one backend. Opens after failure_threshold consecutive failures or
+    when the recent error rate passes max_error_rate; after cooldown seconds one
+    trial request is let through (half-open) and its outcome closes or reopens it.
+    """
+
+    def __init__(self, failure_threshold: int = 3, max_error_rate: float = 0.5,
+                 cooldown: float = 30.0, window: int = 50, min_requests: int = 10):
+        self.failure_threshold = failure_threshold
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self.min_requests = min_requests
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.consecutive_failures = 0
+        self._outcomes = deque(maxlen=window)
+
+    @property
+    def error_rate(self) -> float:
+        return self._outcomes.count(False) / len(self._outcomes) if self._outcomes else 0.0
+
+    def available(self) -> bool:
+        """Whether a request could be sent now, without changing state"""
+        if self.state == "closed":
+            return True
+        return self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown
+
+    def allow(self) -> bool:
+        """Claim a request slot; the first request after the cooldown becomes the trial"""
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = "half_open"
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self._outcomes.append(True)
+        self.consecutive_failures = 0
+        if self.state == "half_open":
+            # Fresh start so the failures that opened the circuit do not reopen it
+            self._outcomes.clear()
+            self._outcomes.append(True)
+        self.state = "closed"
+
+    def record_failure(self) -> None:
+        self._outcomes.append(False)
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold or (
+            len(self._outcomes) >= self.min_requests and self.error_rate > self.max_error_rate
+        ):
+            if self.state != "open":
+                print(f"LLM router: circuit opened (error rate {self.error_rate:.0%}, {self.consecutive_failures} consecutive failures)")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class RouterState:
+    """Latency windows per (stage, backend) and circuit breakers per backend, shared by every router view"""
+
+    def __init__(self, backend_names: Sequence[str], window: int = 50, **breaker_options):
+        self.backend_names = list(backend_names)
+        self.window = window
+        self.breakers = {name: CircuitBreaker(window=window, **breaker_options) for name in backend_names}
+        self.latencies: Dict[Tuple[str, str], deque] = {}
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.lock = threading.Lock()
+
+    def get_latencies(self, stage: str, name: str) -> List[float]:
+        with self.lock:
+            return list(self.latencies.get((stage, name), ()))
+
+    def release(self, name: str) -> None:
+        """Give back a half-open trial that was cancelled, so the next request can take it"""
+        with self.lock:
+            breaker = self.breakers[name]
+            if breaker.state == "half_open":
+                breaker.state = "open"
+
+    def record(self, stage: str, name: str, latency: Optional[float]) -> None:
+        """Record a finished request; latency None marks a failure"""
+        with self.lock:
+            if latency is None:
+                self.breakers[name].record_failure()
+                return
+            self.breakers[name].record_success()
+            self.latencies.setdefault((stage, name), deque(maxlen=self.window)).append(latency)
+
+
+class ModelRouter:
+    """
+    Chat model facade over several backends (e.g. Cerebras and Gemini) that sends
+    each request to the fastest healthy backend for its stage, fails over on
+    errors and skips backends whose circuit is open. Non-streaming requests are
+    hedged: when the chosen backend has not answered within its p95 latency, the
+    next backend is asked too and the first answer wins.
+    Supports invoke, ainvoke, astream and with_structured_output, which is all
+    the agents use; for_stage() returns a view with its own latency statistics.
+    """
+
+    def __init__(self, backends: Dict[str, Any], stage: str = "default", state: Optional[RouterState] = None,
+                 hedge_enabled: Optional[bool] = None, hedge_min_samples: Optional[int] = None,
+                 hedge_min_delay: Optional[float] = None):
+        self.backends = dict(backends)
+        self.stage = stage
+        self.state = state or RouterState(
+            list(self.backends),
+            window=int(os.getenv("LLM_ROUTER_WINDOW", "50")),
+            failure_threshold=int(os.getenv("LLM_ROUTER_FAILURE_THRESHOLD", "3")),
+            max_error_rate=float(os.getenv("LLM_ROUTER_MAX_ERROR_RATE", "0.5")),
+            cooldown=float(os.getenv("LLM_ROUTER_COOLDOWN", "30")),
+        )
+        self.hedge_enabled = hedge_enabled if hedge_enabled is not None else os.getenv("LLM_ROUTER_HEDGE_ENABLED", "true").lower() == "true"
+        self.hedge_min_samples = hedge_min_samples if hedge_min_samples is not None else int(os.getenv("LLM_ROUTER_HEDGE_MIN_SAMPLES", "20"))
+        self.hedge_min_delay = hedge_min_delay if hedge_min_delay is not None else float(os.getenv("LLM_ROUTER_HEDGE_MIN_DELAY", "0.5"))
+        # Read by the LLM response cache key
+        self.model_name = "router:" + ",".join(self.backends)
+        self.temperature = None
+
+    def _derive(self, backends: Dict[str, Any], stage: str) -> "ModelRouter":
+        return ModelRouter(backends, stage, self.state, self.hedge_enabled, self.hedge_min_samples, self.hedge_min_delay)
+
+    def for_stage(self, stage: str) -> "ModelRouter":
+        """View of the router whose latencies are tracked separately, e.g. for sql or report requests"""
+        return self._derive(self.backends, stage)
+
+    def with_structured_output(self, schema, **kwargs) -> "ModelRouter":
+        return self._derive({name: backend.with_structured_output(schema, **kwargs) for name, backend in self.backends.items()}, self.stage)
+
+    def rank(self) -> List[str]:
+        """
+        Backends by expected time to a successful answer for this stage: median
+        latency inflated by the error rate. Backends without samples keep their
+        configured order after measured ones; unavailable backends come last.
+        """
+        def key(item):
+            index, name = item
+            breaker = self.state.breakers[name]
+            latencies = self.state.get_latencies(self.stage, name)
+            expected = float(np.median(latencies)) / max(1.0 - breaker.error_rate, 0.1) if latencies else float("inf")
+            return not breaker.available(), expected, index
+
+        return [name for _, name in sorted(enumerate(self.backends), key=key)]
+
+    def get_hedge_delay(self, name: str) -> Optional[float]:
+        """p95 latency of a backend for this stage, or None while there are too few samples to hedge"""
+        latencies = self.state.get_latencies(self.stage, name)
+        if not self.hedge_enabled or len(latencies) < self.hedge_min_samples:
+            return None
+        return max(float(np.percentile(latencies, 95)), self.hedge_min_delay)
+
+    def _claim_next(self, candidates: List[str], index: int) -> Tuple[Optional[str], int]:
+        """Next candidate from index whose circuit lets a request through, and the index after it"""
+        while index < len(candidates):
+            name = candidates[index]
+            index += 1
+            with self.state.lock:
+                if self.state.breakers[name].allow():
+                    return name, index
+        return None, index
+
+    def _claim_first(self, candidates: List[str]) -> Tuple[str, int]:
+        name, index = self._claim_next(candidates, 0)
+        # Every circuit open: try the best backend anyway rather than fail outright
+        return (name, index) if name is not None else (candidates[0], len(candidates))
+
+    def _call(self, name: str, input: Any, config: Any, kwargs: Dict[str, Any]) -> Any:
+        started = time.monotonic()
+        try:
+            result = self.backends[name].invoke(input, config, **kwargs)
+        except Exception:
+            self.state.record(self.stage, name, None)
+            raise
+        self.state.record(self.stage, name, time.monotonic() - started)
+        return result
+
+    async def _acall(self, name: str, input: Any, config: Any, kwargs: Dict[str, Any]) -> Any:
+        started = time.monotonic()
+        try:
+            result = await self.backends[name].ainvoke(input, config, **kwargs)
+        except asyncio.CancelledError:
+            # Lost a hedge race; says nothing about the backend's health
+            self.state.release(name)
+            raise
+        except Exception:
+            self.state.record(self.stage, name, None)
+            raise
+        self.state.record(self.stage, name, time.monotonic() - started)
+        return result
+
+    def _count_hedge(self, won: bool) -> None:
+        with self.state.lock:
+            if won:
+                self.state.hedge_wins += 1
+            else:
+                self.state.hedges += 1
+
+    def invoke(self, input: Any, config: Any = None, **kwargs) -> Any:
+        candidates = self.rank()
+        name, index = self._claim_first(candidates)
+        last_error = None
+        while name is not None:
+            hedge_delay = self.get_hedge_delay(name) if index < len(candidates) else None
+            futures = {}
+            if hedge_delay is None:
+                try:
+                    return self._call(name, input, config, kwargs)
+                except Exception as e:
+                    print(f"LLM router: {name} failed ({self.stage}): {e}")
+                    last_error = e
+            else:
+                futures[_HEDGE_EXECUTOR.submit(self._call, name, input, config, kwargs)] = name
+                done, _ = wait(futures, timeout=hedge_delay)
+                if not done:
+                    hedge_name, index = self._claim_next(candidates, index)
+                    if hedge_name is not None:
+                        print(f"LLM router: {name} slower than {hedge_delay:.2f}s ({self.stage}), hedging with {hedge_name}")
+                        self._count_hedge(won=False)
+                        futures[_HEDGE_EXECUTOR.submit(self._call, hedge_name, input, config, kwargs)] = hedge_name
+                pending = set(futures)
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if future.exception() is None:
+                            if futures[future] != name:
+                                self._count_hedge(won=True)
+                            return future.result()
+                        print(f"LLM router: {futures[future]} failed ({self.stage}): {future.exception()}")
+                        last_error = future.exception()
+            name, index = self._claim_next(candidates, index)
+        raise last_error or Exception("No LLM backend available")
+
+    async def ainvoke(self, input: Any, config: Any = None, **kwargs) -> Any:
+        candidates = self.rank()
+        name, index = self._claim_first(candidates)
+        last_error = None
+        while name is not None:
+            hedge_delay = self.get_hedge_delay(name) if index < len(candidates) else None
+            tasks = {}
+            if hedge_delay is None:
+                try:
+                    return await self._acall(name, input, config, kwargs)
+                except Exception as e:
+                    print(f"LLM router: {name} failed ({self.stage}): {e}")
+                    last_error = e
+            else:
+                tasks[asyncio.ensure_future(self._acall(name, input, config, kwargs))] = name
+                pending = set(tasks)
+                try:
+                    done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+                    if not done:
+                        hedge_name, index = self._claim_next(candidates, index)
+                        if hedge_name is not None:
+                            print(f"LLM router: {name} slower than {hedge_delay:.2f}s ({self.stage}), hedging with {hedge_name}")
+                            self._count_hedge(won=False)
+                            hedge_task = asyncio.ensure_future(self._acall(hedge_name, input, config, kwargs))
+                            tasks[hedge_task] = hedge_name
+                            pending.add(hedge_task)
+                    while pending:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            if task.exception() is None:
+                                if tasks[task] != name:
+                                    self._count_hedge(won=True)
+                                return task.result()
+                            print(f"LLM router: {tasks[task]} failed ({self.stage}): {task.exception()}")
+                            last_error = task.exception()
+                finally:
+                    for task in pending:
+                        task.cancel()
+            name, index = self._claim_next(candidates, index)
+        raise last_error or Exception("No LLM backend available")
+
+    async def astream(self, input: Any, config: Any = None, **kwargs) -> AsyncIterator[Any]:
+        """Stream from the best backend; fails over only while nothing has been yielded"""
+        candidates = self.rank()
+        name, index = self._claim_first(candidates)
+        last_error = None
+        while name is not None:
+            started = time.monotonic()
+            yielded = False
+            try:
+                async for chunk in self.backends[name].astream(input, config, **kwargs):
+                    yielded = True
+                    yield chunk
+            except (asyncio.CancelledError, GeneratorExit):
+                self.state.release(name)
+                raise
+            except Exception as e:
+                self.state.record(self.stage, name, None)
+                if yielded:
+                    raise
+                print(f"LLM router: {name} failed before streaming ({self.stage}): {e}")
+                last_error = e
+                name, index = self._claim_next(candidates, index)
+                continue
+            self.state.record(self.stage, name, time.monotonic() - started)
+            return
+        raise last_error or Exception("No LLM backend available")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Circuit state per backend and latency percentiles per stage and backend"""
+        with self.state.lock:
+            backends = {
+                name: {"state": breaker.state, "error_rate": round(breaker.error_rate, 3),
+                       "consecutive_failures": breaker.consecutive_failures}
+                for name, breaker in self.state.breakers.items()
+            }
+            latencies = {key: list(values) for key, values in self.state.latencies.items()}
+            hedges, hedge_wins = self.state.hedges, self.state.hedge_wins
+        stages: Dict[str, Dict[str, Any]] = {}
+        for (stage, name), values in latencies.items():
+            stages.setdefault(stage, {})[name] = {
+                "requests": len(values),
+                "p50": round(float(np.percentile(values, 50)), 3),
+                "p95": round(float(np.percentile(values, 95)), 3),
+            }
+        return {"backends": backends, "stages": stages, "hedges": hedges, "hedge_wins": hedge_wins}
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Local stand-in for a provider, for exercising the router offline: answers
+    after a log-normal latency around `latency` seconds, with a `tail_rate`
+    share of requests taking `tail_latency` instead, and fails at `error_rate`.
+    """
+
+    model_name: str = "stub"
+    latency: float = 0.2
+    tail_latency: float = 2.0
+    tail_rate: float = 0.05
+    error_rate: float = 0.0
+    response: str = "stub response"
+    seed: Optional[int] = None
+    _random: random.Random = PrivateAttr()
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._random = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def sample_latency(self) -> float:
+        if self._random.random() < self.tail_rate:
+            return self.tail_latency
+        return self.latency * self._random.lognormvariate(0.0, 0.25)
+
+    def _result(self) -> ChatResult:
+        if self._random.random() < self.error_rate:
+            raise ConnectionError(f"{self.model_name}: simulated provider error")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.sample_latency())
+        return self._result()
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.sample_latency())
+        return self._result()
@@ -0,0 +1,220 @@
+import os
+import re
+import zlib
+import threading
+from datetime import datetime
+from typing import Callable, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# Domain synonyms folded to one token before hashing
+SYNONYMS = {
+    "car": "vehicle", "cars": "vehicle", "vehicles": "vehicle", "truck": "vehicle", "trucks": "vehicle",
+    "plate": "vehicle", "plates": "vehicle",
+    "cost": "amount", "costs": "amount", "spend": "amount", "spending": "amount", "spent": "amount",
+    "expense": "amount", "expenses": "amount", "paid": "amount", "price": "amount", "money": "amount",
+    "liter": "quantity", "liters": "quantity", "litre": "quantity", "litres": "quantity", "volume": "quantity",
+    "drivers": "driver", "stations": "station", "products": "product", "fuels": "fuel", "gas": "fuel",
+    "petrol": "fuel", "transactions": "transaction", "receipts": "transaction", "receipt": "transaction",
+    "daily": "day", "days": "day", "weekly": "week", "weeks": "week", "monthly": "month", "months": "month",
+    "yearly": "year", "annual": "year", "years": "year", "quarterly": "quarter", "quarters": "quarter",
+    "previous": "last", "past": "last", "current": "this",
+}
+
+STOPWORDS = frozenset(
+    "a an the of for by per in on at to and or with from me my our us show give list get what which how "
+    "is are was were be been do does did please each all total".split()
+)
+
+# Tokens that change the meaning of a query's time window or its numbers
+_TIME_TOKENS = frozenset(
+    "today yesterday tomorrow day week month year quarter last this next ytd "
+    "january february march april may june july august september october november december".split()
+)
+
+# Words that shape the analysis rather than name data
+ANALYSIS_WORDS = frozenset(
+    "top bottom most least highest lowest average avg sum count number many much compare comparison "
+    "trend chart graph report breakdown between than over under more less first latest recent "
+    "group grouped sort sorted order rank ranking percentage share ratio min max minimum maximum".split()
+)
+
+_DATE_LITERAL_PATTERN = re.compile(r"'\d{4}-\d{2}-\d{2}")
+_QUOTED_PATTERN = re.compile(r"'([^']*)'|\"([^\"]*)\"")
+# Function words of questions, never names of data
+_QUERY_WORDS = frozenset(
+    "where when who whose that this these those there their them it its than then every any only "
+    "has have had not no also into as per vs versus during since until used using".split()
+)
+_KNOWN_WORDS = STOPWORDS | _TIME_TOKENS | ANALYSIS_WORDS | _QUERY_WORDS | frozenset(SYNONYMS) | frozenset(SYNONYMS.values())
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = re.findall(r"[a-z0-9]+", text.lower())
+    return [SYNONYMS.get(token, token) for token in tokens if token not in STOPWORDS]
+
+
+def get_time_tokens(tokens: Iterable[str]) -> FrozenSet[str]:
+    return frozenset(token for token in tokens if token in _TIME_TOKENS or token.isdigit())
+
+
+def get_schema_vocabulary(catalog) -> FrozenSet[str]:
+    """Words of the table and column names of a schema catalog"""
+    words = set()
+    for table_name in catalog.table_names:
+        words.update(tokenize(table_name.replace("_", " ")))
+        for column in catalog.get_table(table_name).columns:
+            words.update(tokenize(column.name.replace("_", " ")))
+    return frozenset(words)
+
+
+def get_entity_tokens(text: str, vocabulary: FrozenSet[str] = frozenset()) -> FrozenSet[str]:
+    """
+    Tokens that name specific data: quoted literals, capitalized words after the
+    first (station or driver names), words mixing letters and digits (plates) and
+    words outside the synonym, analysis and schema vocabulary.
+    """
+    entities = set()
+    for match in _QUOTED_PATTERN.finditer(text):
+        entities.add(repr((match.group(1) if match.group(1) is not None else match.group(2)).lower()))
+    for position, word in enumerate(re.findall(r"[A-Za-z0-9]+", _QUOTED_PATTERN.sub(" ", text))):
+        token = word.lower()
+        if token.isdigit():
+            continue
+        if (position > 0 and word[0].isupper()) or (any(char.isdigit() for char in token) and not token.isdigit()):
+            entities.add(token)
+            continue
+        singular = token[:-1] if token.endswith("s") else token
+        if not any(candidate in _KNOWN_WORDS or candidate in vocabulary for candidate in (token, singular)):
+            entities.add(token)
+    return frozenset(entities)
+
+
+class HashedNgramVectorizer:
+    """
+    Stateless text vectorizer: word unigrams, word bigrams and character trigrams
+    hashed into a fixed number of signed features, then L2-normalized.
+    """
+
+    def __init__(self, n_features: int = 2 ** 14):
+        self.n_features = n_features
+
+    def _add(self, vector: np.ndarray, feature: str, weight: float) -> None:
+        hashed = zlib.crc32(feature.encode("utf-8"))
+        sign = -1.0 if hashed & 0x80000000 else 1.0
+        vector[hashed % self.n_features] += sign * weight
+
+    def transform(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.n_features, dtype=np.float32)
+        tokens = tokenize(text)
+        for token in tokens:
+            self._add(vector, f"w:{token}", 1.0)
+            padded = f" {token} "
+            for index in range(len(padded) - 2):
+                self._add(vector, f"c:{padded[index:index + 3]}", 0.3)
+        for first, second in zip(tokens, tokens[1:]):
+            self._add(vector, f"b:{first} {second}", 0.7)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class PromptMatch(NamedTuple):
+    score: float
+    prompt: str
+    sql_statement: str
+    reusable: bool
+
+
+class PromptSQLIndex:
+    """
+    In-memory cosine similarity index over past (prompt, SQL) pairs.
+    A match is reusable as-is when it is above reuse_threshold, asks about the
+    same time window, names the same entities (see get_entity_tokens) and its
+    SQL has no hard-coded dates from another day. Matches above adapt_threshold
+    are returned as examples for the model.
+    """
+
+    def __init__(self, reuse_threshold: float = 0.9, adapt_threshold: float = 0.7,
+                 max_entries: int = 5000, vectorizer: Optional[HashedNgramVectorizer] = None,
+                 vocabulary: Iterable[str] = ()):
+        self.reuse_threshold = reuse_threshold
+        self.adapt_threshold = adapt_threshold
+        self.max_entries = max_entries
+        self.vectorizer = vectorizer or HashedNgramVectorizer()
+        self.vocabulary = frozenset(vocabulary)
+        self._entries: List[Tuple[str, str, FrozenSet[str], FrozenSet[str], Optional[datetime]]] = []
+        self._vectors: List[np.ndarray] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, prompt: str, sql_statement: str, created_at: Optional[datetime] = None) -> None:
+        """Add a pair, replacing an older pair with the same normalized prompt"""
+        key = " ".join(tokenize(prompt))
+        if not key or not sql_statement:
+            return
+        entry = (prompt, sql_statement, get_time_tokens(key.split()), get_entity_tokens(prompt, self.vocabulary), created_at)
+        vector = self.vectorizer.transform(prompt)
+        with self._lock:
+            index = self._keys.get(key)
+            if index is not None:
+                self._entries[index] = entry
+                self._vectors[index] = vector
+            elif len(self._entries) < self.max_entries:
+                self._keys[key] = len(self._entries)
+                self._entries.append(entry)
+                self._vectors.append(vector)
+            self._matrix = None
+
+    def add_many(self, pairs: Iterable[Tuple[str, str, Optional[datetime]]]) -> None:
+        for prompt, sql_statement, created_at in pairs:
+            self.add(prompt, sql_statement, created_at)
+
+    def search(self, prompt: str) -> Optional[PromptMatch]:
+        """Best match above adapt_threshold, or None"""
+        with self._lock:
+            if not self._entries:
+                return None
+            if self._matrix is None:
+                self._matrix = np.vstack(self._vectors)
+            matrix, entries = self._matrix, list(self._entries)
+        scores = matrix @ self.vectorizer.transform(prompt)
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+        if score < self.adapt_threshold:
+            return None
+        matched_prompt, sql_statement, time_tokens, entity_tokens, created_at = entries[best]
+        same_window = time_tokens == get_time_tokens(tokenize(prompt))
+        # "...at Total station" and "...at Caltex station" score alike but select different rows
+        same_entities = entity_tokens == get_entity_tokens(prompt, self.vocabulary)
+        dates_current = not _DATE_LITERAL_PATTERN.search(sql_statement) or (
+            created_at is not None and created_at.date() == datetime.now().date()
+        )
+        reusable = score >= self.reuse_threshold and same_window and same_entities and dates_current
+        return PromptMatch(score, matched_prompt, sql_statement, reusable)
+
+
+_prompt_index: Optional[PromptSQLIndex] = None
+_prompt_index_lock = threading.Lock()
+
+
+def get_prompt_index(load_pairs: Callable[[], Iterable[Tuple[str, str, Optional[datetime]]]],
+                     vocabulary: Iterable[str] = ()) -> PromptSQLIndex:
+    """Get the process-wide index, filled from load_pairs() on first use; vocabulary: schema words"""
+    global _prompt_index
+    if _prompt_index is None:
+        with _prompt_index_lock:
+            if _prompt_index is None:
+                index = PromptSQLIndex(
+                    reuse_threshold=float(os.getenv("PROMPT_REUSE_THRESHOLD", "0.9")),
+                    adapt_threshold=float(os.getenv("PROMPT_ADAPT_THRESHOLD", "0.7")),
+                    max_entries=int(os.getenv("PROMPT_INDEX_MAX_ENTRIES", "5000")),
+                    vocabulary=vocabulary,
+                )
+                index.add_many(load_pairs())
+                _prompt_index = index
+                print(f"Prompt reuse index loaded: {len(index)} prompts")
+    return _prompt_index
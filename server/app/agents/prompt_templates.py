@@ -72,7 +72,8 @@ def generate_psql_query_prompt(prompt: str, schema: str, current_date_time: str)
                                 f"Based on the user request below, the database schema, and the current date/time, "
                                 f"generate the appropriate PostgreSQL SELECT query.\n\n"
                                 f"User Request: {prompt}\n\n"
-                                f"Database Schema:\n{schema}\n\n"
+                                f"Database Schema (one table per line: table(column type, ...); PK marks the primary key, "
+                                f"-> a foreign key to table.column, ? a nullable column, ...N more columns left out):\n{schema}\n\n"
                                 f"Current Date and Time: {current_date_time}"
                             )
                         }
@@ -137,7 +138,7 @@ def generate_psql_query_prompt(prompt: str, schema: str, current_date_time: str)
 def generate_html_text_prompt(prompt: str, data: str):
     """Generates prompt messages asking for JSON output for HTML report."""
     system_message = """You are an expert data analyst and web developer specializing in creating insightful HTML reports from data.
-        You will receive a user request (which might include chart preferences) and data in JSON format.
+        You will receive a user request (which might include chart preferences) and a summary of the query result: per-column statistics over all rows (with row counts per time bucket for date columns) followed by CSV rows, which may be only the first rows of a larger result.
 
         **IMPORTANT OUTPUT FORMAT:**
         Your response MUST be **only** a single, valid JSON string. Do not include *any* other text, greetings, introductions, or explanations outside the JSON structure. Do not wrap the JSON in markdown backticks.
@@ -149,7 +150,7 @@ def generate_html_text_prompt(prompt: str, data: str):
         **Content Guidelines:**
         - Generate modern, responsive, and visually appealing charts using light color schemes.
         - Adhere to the user's requested chart type if specified in the prompt.
-        - Ensure the JavaScript for the chart correctly uses the provided data.
+        - Ensure the JavaScript for the chart correctly uses the provided data. When only some rows are listed, chart the column summary (time buckets, top values) rather than the partial rows.
         - Ensure the HTML is valid and error-free.
         - The explanation should focus on fuel transactions relevant to an ISP.
 
@@ -164,8 +165,52 @@ def generate_html_text_prompt(prompt: str, data: str):
     human_message = f"""User Request: {prompt}
 
         Data Provided:
-        ```json     
-        {data}    
+        ```
+        {data}
+        ```
+    """
+    return [system_message, human_message]
+
+
+def generate_explanation_prompt(prompt: str, data: str):
+    """Generates prompt messages asking only for the written analysis; the chart is rendered locally."""
+    system_message = """You are an expert data analyst writing the analysis section of a report whose chart and data table are already rendered.
+        You will receive a user request and a summary of the query result: per-column statistics over all rows (with row counts per time bucket for date columns) followed by CSV rows, which may be only the first rows of a larger result.
+
+        **IMPORTANT OUTPUT FORMAT:**
+        Respond with the analysis text only: no JSON, no HTML, no markdown code fences, no greetings.
+
+        **Content Guidelines:**
+        - Write a concise analysis formatted with bullet points, from the perspective of an Internet Service Provider (ISP) company data analyst focusing on fuel transactions.
+        - Highlight key trends, outliers, comparisons, actionable recommendations for the ISP, and potential business implications.
+        - Refer to the actual numbers in the data. Keep it under 200 words.
+        """
+
+    human_message = f"""User Request: {prompt}
+
+        Data Provided:
+        ```
+        {data}
         ```
     """
     return [system_message, human_message]
+
+
+def generate_sql_correction_prompt(sql: str, error_message: str, schema: str):
+    """Generates prompt messages asking for a corrected version of a query the database rejected."""
+    system_message = SystemMessage(
+        content="""You are a PostgreSQL expert fixing a SELECT query that failed to execute.
+        Use the error message and the schema to find the mistake (wrong column or table names, missing GROUP BY columns, type mismatches, bad casts, ...).
+        Change only what is needed to fix the error and keep the intent of the query.
+
+        **OUTPUT ONLY THE CORRECTED RAW SQL QUERY TEXT.** No explanations, no markdown, no JSON.
+        The corrected query must be a single SELECT statement."""
+    )
+    human_message = HumanMessage(
+        content=(
+            f"Failed query:\n{sql}\n\n"
+            f"Database error:\n{error_message}\n\n"
+            f"Database Schema:\n{schema}"
+        )
+    )
+    return [system_message, human_message]
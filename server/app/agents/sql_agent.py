@@ -1,6 +1,7 @@
+import asyncio
 import base64
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
 import json
 import re 
 import traceback 
@@ -12,7 +13,10 @@ from agents.schemas.html_text import HTMLText
 from agents.schemas.sematic_table import SemanticTable 
 
 from agents.model import GenerativeModel
+from agents.llm_cache import get_llm_cache
+from agents.streaming_json import StreamingJSONFieldParser
 from agents.prompt_templates import (
+    generate_explanation_prompt,
     generate_html_text_prompt, 
     generate_psql_query_prompt,
     get_text_from_image_prompt, 
@@ -22,16 +26,37 @@ class SQLAgent:
     def __init__(self):
         pass
 
+    def _get_cache_key(self, model, messages, use_cache: bool, schema_fingerprint: Optional[str] = None, variant: Any = None) -> Optional[str]:
+        llm_cache = get_llm_cache() if use_cache else None
+        return llm_cache.make_key(model, messages, schema_fingerprint, variant) if llm_cache else None
+
+    def _get_cached_response(self, cache_key: Optional[str]) -> Any:
+        llm_cache = get_llm_cache()
+        if not cache_key or llm_cache is None:
+            return None
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            print("LLM response served from cache")
+        return cached
+
+    def _cache_response(self, cache_key: Optional[str], value: Any) -> None:
+        """Cache a response once it has been parsed and validated"""
+        llm_cache = get_llm_cache()
+        if cache_key and llm_cache is not None:
+            llm_cache.put(cache_key, value)
+
+    def _build_image_messages(self, prompt: str, image_path: str):
+        with open(image_path, "rb") as image_file:
+            image_data = base64.b64encode(image_file.read()).decode("utf-8")
+        return get_text_from_image_prompt(prompt, image_data)
+
     def generate_struture_output_from_image(self, prompt: str, image_path: str, model: GenerativeModel, schema: Any) -> Any:
         """
         Generates structured output from an image using the provided schema.
         Assumes with_structured_output works for this specific task/schema.
         """
         try:
-            with open(image_path, "rb") as image_file:
-                image_data = base64.b64encode(image_file.read()).decode("utf-8")
-            messages = get_text_from_image_prompt(prompt, image_data)
-            system_message, human_message = messages
+            system_message, human_message = self._build_image_messages(prompt, image_path)
             llm = model.with_structured_output(schema)
             response = llm.invoke([system_message, human_message])
             return response
@@ -39,7 +64,67 @@ class SQLAgent:
             print(f"Error generating structured output from image: {str(e)}\n{traceback.format_exc()}")
             raise Exception(f"Error generating structured output from image: {str(e)}") from e
 
-    def generate_sql_query(self, schema_str: str, prompt: str, model: GenerativeModel) -> str:
+    async def agenerate_struture_output_from_image(self, prompt: str, image_path: str, model: GenerativeModel, schema: Any) -> Any:
+        """Async variant of generate_struture_output_from_image"""
+        try:
+            system_message, human_message = await asyncio.to_thread(self._build_image_messages, prompt, image_path)
+            llm = model.with_structured_output(schema)
+            return await llm.ainvoke([system_message, human_message])
+        except Exception as e:
+            print(f"Error generating structured output from image: {str(e)}\n{traceback.format_exc()}")
+            raise Exception(f"Error generating structured output from image: {str(e)}") from e
+
+    def _build_sql_messages(self, schema_str: str, prompt: str):
+        # Hour precision is enough for relative dates and lets repeated prompts hit the cache
+        current_date_time = datetime.now().strftime("%Y-%m-%d %H:00")
+        # Use the prompt designed for raw SQL output
+        return generate_psql_query_prompt(prompt, schema_str, current_date_time)
+
+    def parse_sql_response(self, raw_output_from_llm: str) -> str:
+        """
+        Clean markdown fences and validate the model output.
+        Returns the SQL or "RESTRICTED", raises ValueError for anything else.
+        """
+        print(f"LLM raw response for SQL: ```\n{raw_output_from_llm}\n```") # Log the raw output
+
+        # --- Clean potential markdown fences ---
+        cleaned_output = raw_output_from_llm.strip()
+        # Regex to find content within ```sql ... ``` or ``` ... ```
+        match = re.search(r"```(?:sql)?\s*(.*?)\s*```", cleaned_output, re.DOTALL | re.IGNORECASE)
+        if match:
+            sql_string_to_validate = match.group(1).strip()
+            print(f"Cleaned markdown. SQL Content to validate: ```\n{sql_string_to_validate}\n```")
+        else:
+            sql_string_to_validate = cleaned_output
+            print("No markdown fences found for SQL. Using raw stripped output for validation.")
+
+        # --- Check for RESTRICTED marker ---
+        if sql_string_to_validate == "query=RESTRICTED":
+            print("SQL generation resulted in RESTRICTED marker.")
+            return "RESTRICTED"
+
+        # --- Validate if it's a SELECT query, ignoring comments/whitespace ---
+        is_select_query = False
+        lines = sql_string_to_validate.splitlines()
+        for line in lines:
+            stripped_line = line.strip()
+            if not stripped_line: continue # Skip empty lines
+            if stripped_line.startswith('--'): continue # Skip comment lines
+            # Found the first significant line
+            # Read-only enforcement proper happens in SQLChecker before execution
+            if stripped_line.upper().startswith(("SELECT", "WITH")):
+                is_select_query = True
+            break # Only check the first significant line
+
+        if not is_select_query:
+             print(f"Warning: Validated LLM output did not start with SELECT or WITH after ignoring comments/whitespace. Content: ```\n{sql_string_to_validate}\n```")
+             raise ValueError("LLM response for SQL query was invalid (not SELECT/WITH or RESTRICTED after cleaning and comment check).")
+        print("Validated SQL query generated successfully (ignoring comments).")
+        # Return the string *including* the comments/original formatting
+        return sql_string_to_validate
+
+    def generate_sql_query(self, schema_str: str, prompt: str, model: GenerativeModel,
+                           use_cache: bool = True, schema_fingerprint: Optional[str] = None) -> str:
         """
         Generates a raw PostgreSQL query string based on the prompt and schema.
         Handles 'query=RESTRICTED', cleans markdown fences, and ignores leading comments/whitespace.
@@ -48,64 +133,97 @@ class SQLAgent:
             schema_str: Database schema string.
             prompt: User's natural language request.
             model: GenerativeModel instance.
+            use_cache: Serve and store the response in the LLM response cache.
+            schema_fingerprint: Fingerprint of the schema catalog, part of the cache key.
 
         Returns:
             Cleaned SQL query string or the exact string "RESTRICTED".
         """
         try:
-            current_date_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            # Use the prompt designed for raw SQL output
-            messages = generate_psql_query_prompt(prompt, schema_str, current_date_time)
-            system_message, human_message = messages
-
-            print(f"Invoking LLM for raw SQL generation...")
-            response_message: AIMessage = model.invoke([system_message, human_message])
-            raw_output_from_llm = response_message.content
-
-            print(f"LLM raw response for SQL: ```\n{raw_output_from_llm}\n```") # Log the raw output
-
-            # --- Clean potential markdown fences ---
-            cleaned_output = raw_output_from_llm.strip()
-            # Regex to find content within ```sql ... ``` or ``` ... ```
-            match = re.search(r"```(?:sql)?\s*(.*?)\s*```", cleaned_output, re.DOTALL | re.IGNORECASE)
-            if match:
-                sql_string_to_validate = match.group(1).strip()
-                print(f"Cleaned markdown. SQL Content to validate: ```\n{sql_string_to_validate}\n```")
-            else:
-                sql_string_to_validate = cleaned_output
-                print("No markdown fences found for SQL. Using raw stripped output for validation.")
-
-            # --- Check for RESTRICTED marker ---
-            if sql_string_to_validate == "query=RESTRICTED":
-                print("SQL generation resulted in RESTRICTED marker.")
-                return "RESTRICTED"
-
-            # --- Validate if it's a SELECT query, ignoring comments/whitespace ---
-            is_select_query = False
-            lines = sql_string_to_validate.splitlines()
-            for line in lines:
-                stripped_line = line.strip()
-                if not stripped_line: continue # Skip empty lines
-                if stripped_line.startswith('--'): continue # Skip comment lines
-                # Found the first significant line
-                if stripped_line.upper().startswith("SELECT"):
-                    is_select_query = True
-                break # Only check the first significant line
-
-            if not is_select_query:
-                 print(f"Warning: Validated LLM output did not start with SELECT after ignoring comments/whitespace. Content: ```\n{sql_string_to_validate}\n```")
-                 raise ValueError("LLM response for SQL query was invalid (not SELECT or RESTRICTED after cleaning and comment check).")
-            else:
-                print("Validated SQL query generated successfully (ignoring comments).")
-                # Return the string *including* the comments/original formatting
-                return sql_string_to_validate
+            messages = self._build_sql_messages(schema_str, prompt)
+            cache_key = self._get_cache_key(model, messages, use_cache, schema_fingerprint)
+            raw_output_from_llm = self._get_cached_response(cache_key)
+            if raw_output_from_llm is None:
+                print(f"Invoking LLM for raw SQL generation...")
+                response_message: AIMessage = model.invoke(messages)
+                raw_output_from_llm = response_message.content
+            sql_query = self.parse_sql_response(raw_output_from_llm)
+            self._cache_response(cache_key, raw_output_from_llm)
+            return sql_query
+        except Exception as e:
+            print(f"Error generating raw SQL query: {str(e)}\n{traceback.format_exc()}")
+            raise Exception(f"Error generating SQL query: {str(e)}") from e
 
+    async def agenerate_sql_query(self, schema_str: str, prompt: str, model: GenerativeModel,
+                                  use_cache: bool = True, schema_fingerprint: Optional[str] = None) -> str:
+        """Async variant of generate_sql_query"""
+        try:
+            messages = self._build_sql_messages(schema_str, prompt)
+            cache_key = self._get_cache_key(model, messages, use_cache, schema_fingerprint)
+            raw_output_from_llm = self._get_cached_response(cache_key)
+            if raw_output_from_llm is None:
+                print(f"Invoking LLM for raw SQL generation...")
+                response_message: AIMessage = await model.ainvoke(messages)
+                raw_output_from_llm = response_message.content
+            sql_query = self.parse_sql_response(raw_output_from_llm)
+            self._cache_response(cache_key, raw_output_from_llm)
+            return sql_query
         except Exception as e:
             print(f"Error generating raw SQL query: {str(e)}\n{traceback.format_exc()}")
             raise Exception(f"Error generating SQL query: {str(e)}") from e
 
+    def evict_sql_query(self, schema_str: str, prompt: str, model: GenerativeModel,
+                        use_cache: bool = True, schema_fingerprint: Optional[str] = None) -> None:
+        """Drop the cached response of generate_sql_query for these arguments, e.g. once its SQL failed"""
+        cache_key = self._get_cache_key(model, self._build_sql_messages(schema_str, prompt), use_cache, schema_fingerprint)
+        llm_cache = get_llm_cache()
+        if cache_key and llm_cache is not None:
+            llm_cache.delete(cache_key)
+
+    def _parse_html_response(self, raw_content: str) -> HTMLText:
+        """Extract the JSON object from the model output and validate it as HTMLText"""
+        print(f"LLM raw response content (HTML JSON):\n```\n{raw_content}\n```")
+
+        # --- Robust JSON Cleaning (using regex) ---
+        json_string_to_parse = raw_content.strip()
+        # Regex to find content within ```json ... ``` or ``` ... ```
+        match = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", json_string_to_parse, re.DOTALL | re.IGNORECASE)
+        if match:
+            # If markdown found, use the content inside (the JSON object)
+            json_string_to_parse = match.group(1).strip()
+            print(f"Cleaned markdown. JSON Content to parse: ```\n{json_string_to_parse}\n```")
+        else:
+            # Fallback: If no markdown found, check for braces just in case, but prioritize regex
+            json_start = json_string_to_parse.find('{')
+            json_end = json_string_to_parse.rfind('}')
+            if json_start != -1 and json_end != -1:
+                json_string_to_parse = json_string_to_parse[json_start:json_end+1].strip()
+                print("No markdown fences found, but found braces. Extracted content between braces.")
+            else:
+                print("No markdown fences or clear braces found. Attempting to parse raw stripped output.")
+                # Use the stripped raw_content directly (json_string_to_parse is already set)
 
-    def generate_html_text(self, prompt: str, data: str, model: GenerativeModel) -> HTMLText:
+        # --- Parse the cleaned JSON string ---
+        try:
+            parsed_data = json.loads(json_string_to_parse)
+        except json.JSONDecodeError as json_err:
+            print(f"Failed to decode JSON from LLM response: {json_err}")
+            print(f"Attempted to parse: ```{json_string_to_parse}```")
+            # Raise a specific error indicating JSON format failure
+            raise Exception(f"LLM response for HTML was not valid JSON after cleaning: {json_err}")
+
+        # --- Validate and instantiate the HTMLText object ---
+        try:
+            # Use the HTMLText schema defined in context
+            html_text_obj = HTMLText(**parsed_data)
+            print("Manual JSON parsing and HTMLText validation successful.")
+            return html_text_obj
+        except Exception as pydantic_err: # Catch Pydantic validation errors specifically
+             print(f"Failed to validate parsed JSON against HTMLText schema: {pydantic_err}")
+             print(f"Parsed data was: {parsed_data}")
+             raise Exception(f"LLM JSON structure did not match expected HTMLText format: {pydantic_err}")
+
+    def generate_html_text(self, prompt: str, data: str, model: GenerativeModel, use_cache: bool = True) -> HTMLText:
         """
         Generates HTML report using manual JSON parsing from LLM response.
         Cleans potential markdown fences before parsing. Relies on the prompt
@@ -115,6 +233,7 @@ class SQLAgent:
             prompt: Prompt guiding report generation (should ask for JSON output).
             data: Data string to be analyzed.
             model: The GenerativeModel instance.
+            use_cache: Serve and store the response in the LLM response cache.
 
         Returns:
             An HTMLText object containing the html, explanation, and file_name.
@@ -122,80 +241,192 @@ class SQLAgent:
         try:
             # Use the prompt that asks for JSON output
             messages = generate_html_text_prompt(prompt, data)
-            system_message, human_message = messages
-            print(f"Invoking LLM for HTML generation (expecting JSON string)...")
-
-            # Invoke WITHOUT structured output
-            response_message: AIMessage = model.invoke([system_message, human_message])
-            raw_content = response_message.content
-            print(f"LLM raw response content (HTML JSON):\n```\n{raw_content}\n```")
-
-            # --- Robust JSON Cleaning (using regex) ---
-            json_string_to_parse = raw_content.strip()
-            # Regex to find content within ```json ... ``` or ``` ... ```
-            match = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", json_string_to_parse, re.DOTALL | re.IGNORECASE)
-            if match:
-                # If markdown found, use the content inside (the JSON object)
-                json_string_to_parse = match.group(1).strip()
-                print(f"Cleaned markdown. JSON Content to parse: ```\n{json_string_to_parse}\n```")
-            else:
-                # Fallback: If no markdown found, check for braces just in case, but prioritize regex
-                json_start = json_string_to_parse.find('{')
-                json_end = json_string_to_parse.rfind('}')
-                if json_start != -1 and json_end != -1:
-                    json_string_to_parse = json_string_to_parse[json_start:json_end+1].strip()
-                    print("No markdown fences found, but found braces. Extracted content between braces.")
-                else:
-                    print("No markdown fences or clear braces found. Attempting to parse raw stripped output.")
-                    # Use the stripped raw_content directly (json_string_to_parse is already set)
-
-            # --- Parse the cleaned JSON string ---
-            try:
-                parsed_data = json.loads(json_string_to_parse)
-            except json.JSONDecodeError as json_err:
-                print(f"Failed to decode JSON from LLM response: {json_err}")
-                print(f"Attempted to parse: ```{json_string_to_parse}```")
-                # Raise a specific error indicating JSON format failure
-                raise Exception(f"LLM response for HTML was not valid JSON after cleaning: {json_err}")
-
-            # --- Validate and instantiate the HTMLText object ---
-            try:
-                # Use the HTMLText schema defined in context
-                html_text_obj = HTMLText(**parsed_data)
-                print("Manual JSON parsing and HTMLText validation successful.")
-                return html_text_obj
-            except Exception as pydantic_err: # Catch Pydantic validation errors specifically
-                 print(f"Failed to validate parsed JSON against HTMLText schema: {pydantic_err}")
-                 print(f"Parsed data was: {parsed_data}")
-                 raise Exception(f"LLM JSON structure did not match expected HTMLText format: {pydantic_err}")
-
+            cache_key = self._get_cache_key(model, messages, use_cache)
+            raw_content = self._get_cached_response(cache_key)
+            if raw_content is None:
+                print(f"Invoking LLM for HTML generation (expecting JSON string)...")
+                # Invoke WITHOUT structured output
+                response_message: AIMessage = model.invoke(messages)
+                raw_content = response_message.content
+            html_text_obj = self._parse_html_response(raw_content)
+            self._cache_response(cache_key, raw_content)
+            return html_text_obj
         except Exception as e:
             # Catch any other errors during the process
             print(f"Error during manual HTML generation/parsing: {str(e)}\n{traceback.format_exc()}")
             raise Exception(f"Error generating/processing HTML report structure: {str(e)}") from e
 
-    def get_main_table_from_prompt(self, prompt: str, relational_tables_str: str, model: GenerativeModel) -> List[str]:
+    async def agenerate_html_text(self, prompt: str, data: str, model: GenerativeModel, use_cache: bool = True) -> HTMLText:
+        """Async variant of generate_html_text"""
+        try:
+            messages = generate_html_text_prompt(prompt, data)
+            cache_key = self._get_cache_key(model, messages, use_cache)
+            raw_content = self._get_cached_response(cache_key)
+            if raw_content is None:
+                print(f"Invoking LLM for HTML generation (expecting JSON string)...")
+                response_message: AIMessage = await model.ainvoke(messages)
+                raw_content = response_message.content
+            html_text_obj = self._parse_html_response(raw_content)
+            self._cache_response(cache_key, raw_content)
+            return html_text_obj
+        except Exception as e:
+            print(f"Error during manual HTML generation/parsing: {str(e)}\n{traceback.format_exc()}")
+            raise Exception(f"Error generating/processing HTML report structure: {str(e)}") from e
+
+    async def astream_html_text(self, prompt: str, data: str, model: GenerativeModel,
+                                use_cache: bool = True) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Streaming variant of generate_html_text built on model.astream.
+        Yields (field, text) pairs as the "html" and "explanation" fields arrive,
+        then ("result", HTMLText) once the full response has been validated.
+        """
+        try:
+            messages = generate_html_text_prompt(prompt, data)
+            cache_key = self._get_cache_key(model, messages, use_cache)
+            parser = StreamingJSONFieldParser()
+            raw_content = self._get_cached_response(cache_key)
+            if raw_content is not None:
+                for field, text in parser.feed(raw_content):
+                    yield field, text
+            else:
+                print(f"Streaming LLM HTML generation (expecting JSON string)...")
+                raw_parts = []
+                async for chunk in model.astream(messages):
+                    if not chunk.content:
+                        continue
+                    raw_parts.append(chunk.content)
+                    for field, text in parser.feed(chunk.content):
+                        yield field, text
+                raw_content = "".join(raw_parts)
+            # The complete response goes through the same validation as the non-streaming path
+            html_text_obj = self._parse_html_response(raw_content)
+            self._cache_response(cache_key, raw_content)
+            yield "result", html_text_obj
+        except Exception as e:
+            print(f"Error during streamed HTML generation/parsing: {str(e)}\n{traceback.format_exc()}")
+            raise Exception(f"Error generating/processing HTML report structure: {str(e)}") from e
+
+    def _parse_explanation_response(self, raw_content: str) -> str:
+        explanation = raw_content.strip()
+        match = re.search(r"```(?:\w+)?\s*(.*?)\s*```", explanation, re.DOTALL)
+        if match:
+            explanation = match.group(1).strip()
+        if not explanation:
+            raise ValueError("LLM returned an empty explanation.")
+        return explanation
+
+    def generate_explanation_text(self, prompt: str, data: str, model: GenerativeModel, use_cache: bool = True) -> str:
+        """
+        Generates only the written analysis of a report, for charts rendered by ChartRenderer.
+        """
+        try:
+            messages = generate_explanation_prompt(prompt, data)
+            cache_key = self._get_cache_key(model, messages, use_cache)
+            raw_content = self._get_cached_response(cache_key)
+            if raw_content is None:
+                print(f"Invoking LLM for report explanation...")
+                response_message: AIMessage = model.invoke(messages)
+                raw_content = response_message.content
+            explanation = self._parse_explanation_response(raw_content)
+            self._cache_response(cache_key, raw_content)
+            return explanation
+        except Exception as e:
+            print(f"Error generating explanation: {str(e)}\n{traceback.format_exc()}")
+            raise Exception(f"Error generating report explanation: {str(e)}") from e
+
+    async def agenerate_explanation_text(self, prompt: str, data: str, model: GenerativeModel, use_cache: bool = True) -> str:
+        """Async variant of generate_explanation_text"""
+        try:
+            messages = generate_explanation_prompt(prompt, data)
+            cache_key = self._get_cache_key(model, messages, use_cache)
+            raw_content = self._get_cached_response(cache_key)
+            if raw_content is None:
+                print(f"Invoking LLM for report explanation...")
+                response_message: AIMessage = await model.ainvoke(messages)
+                raw_content = response_message.content
+            explanation = self._parse_explanation_response(raw_content)
+            self._cache_response(cache_key, raw_content)
+            return explanation
+        except Exception as e:
+            print(f"Error generating explanation: {str(e)}\n{traceback.format_exc()}")
+            raise Exception(f"Error generating report explanation: {str(e)}") from e
+
+    async def astream_explanation_text(self, prompt: str, data: str, model: GenerativeModel,
+                                       use_cache: bool = True) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Streaming variant of generate_explanation_text.
+        Yields ("explanation", text) pairs, then ("result", cleaned explanation).
+        """
+        try:
+            messages = generate_explanation_prompt(prompt, data)
+            cache_key = self._get_cache_key(model, messages, use_cache)
+            raw_content = self._get_cached_response(cache_key)
+            if raw_content is not None:
+                yield "explanation", raw_content
+            else:
+                print(f"Streaming LLM report explanation...")
+                raw_parts = []
+                async for chunk in model.astream(messages):
+                    if chunk.content:
+                        raw_parts.append(chunk.content)
+                        yield "explanation", chunk.content
+                raw_content = "".join(raw_parts)
+            explanation = self._parse_explanation_response(raw_content)
+            self._cache_response(cache_key, raw_content)
+            yield "result", explanation
+        except Exception as e:
+            print(f"Error during streamed explanation generation: {str(e)}\n{traceback.format_exc()}")
+            raise Exception(f"Error generating report explanation: {str(e)}") from e
+
+    def _build_table_messages(self, prompt: str, relational_tables_str: str):
+        prompt_content = (
+            f"Analyze the following user prompt and database table relationship information. "
+            f"Identify the primary table the user is asking about and any directly related tables necessary to answer the prompt. "
+            f"Return ONLY a list of these table names.\n\n"
+            f"User Prompt: \"{prompt}\"\n\n"
+            f"Database Tables Info (one line per table: table: related_table(join columns), ... # note):\n{relational_tables_str}"
+        )
+        return [HumanMessage(content=prompt_content)]
+
+    def _parse_table_response(self, response, cache_key: Optional[str]) -> List[str]:
+        # Basic validation
+        if hasattr(response, 'table_names') and isinstance(response.table_names, list):
+             self._cache_response(cache_key, list(response.table_names))
+             return response.table_names
+        print(f"Warning: get_main_table_from_prompt did not return expected structure. Got: {response}")
+        return [] # Return empty list on failure
+
+    def get_main_table_from_prompt(self, prompt: str, relational_tables_str: str, model: GenerativeModel,
+                                   use_cache: bool = True, schema_fingerprint: Optional[str] = None) -> List[str]:
         """
         Identifies main and related tables from a prompt and schema info string.
         Assumes with_structured_output works for the SemanticTable schema.
         """
         try:
+            messages = self._build_table_messages(prompt, relational_tables_str)
+            cache_key = self._get_cache_key(model, messages, use_cache, schema_fingerprint, SemanticTable.__name__)
+            cached_table_names = self._get_cached_response(cache_key)
+            if cached_table_names is not None:
+                return list(cached_table_names)
             llm = model.with_structured_output(SemanticTable) # Uses SemanticTable schema
-            prompt_content = (
-                f"Analyze the following user prompt and database table relationship information. "
-                f"Identify the primary table the user is asking about and any directly related tables necessary to answer the prompt. "
-                f"Return ONLY a list of these table names.\n\n"
-                f"User Prompt: \"{prompt}\"\n\n"
-                f"Database Tables Info:\n{relational_tables_str}"
-            )
-            messages = [HumanMessage(content=prompt_content)]
             response = llm.invoke(messages) # response is a SemanticTable object
-            # Basic validation
-            if hasattr(response, 'table_names') and isinstance(response.table_names, list):
-                 return response.table_names
-            else:
-                 print(f"Warning: get_main_table_from_prompt did not return expected structure. Got: {response}")
-                 return [] # Return empty list on failure
+            return self._parse_table_response(response, cache_key)
+        except Exception as e:
+            print(f"Error getting main table from prompt: {str(e)}\n{traceback.format_exc()}")
+            raise Exception(f"Error getting main table from prompt: {str(e)}") from e
+
+    async def aget_main_table_from_prompt(self, prompt: str, relational_tables_str: str, model: GenerativeModel,
+                                          use_cache: bool = True, schema_fingerprint: Optional[str] = None) -> List[str]:
+        """Async variant of get_main_table_from_prompt"""
+        try:
+            messages = self._build_table_messages(prompt, relational_tables_str)
+            cache_key = self._get_cache_key(model, messages, use_cache, schema_fingerprint, SemanticTable.__name__)
+            cached_table_names = self._get_cached_response(cache_key)
+            if cached_table_names is not None:
+                return list(cached_table_names)
+            llm = model.with_structured_output(SemanticTable)
+            response = await llm.ainvoke(messages)
+            return self._parse_table_response(response, cache_key)
         except Exception as e:
             print(f"Error getting main table from prompt: {str(e)}\n{traceback.format_exc()}")
-            raise Exception(f"Error getting main table from prompt: {str(e)}") from e
\ No newline at end of file
+            raise Exception(f"Error getting main table from prompt: {str(e)}") from e
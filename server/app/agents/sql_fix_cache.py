@@ -0,0 +1,110 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import Dict, NamedTuple, Optional
+
+# Errors whose fix is a renamed identifier: kind -> pattern capturing the bad name
+_ERROR_PATTERNS = [
+    ("column", re.compile(r'column "?(?:\w+\.)?(\w+)"? does not exist', re.IGNORECASE)),
+    ("relation", re.compile(r'relation "?(?:\w+\.)?(\w+)"? does not exist', re.IGNORECASE)),
+    ("function", re.compile(r"function (\w+)\(", re.IGNORECASE)),
+]
+_SQL_TOKEN_PATTERN = re.compile(r"'(?:[^']|'')*'|\w+|\S")
+_STRING_LITERAL_PATTERN = re.compile(r"('(?:[^']|'')*')")
+
+
+class SQLErrorKey(NamedTuple):
+    kind: str
+    identifier: str
+
+
+def get_db_error_message(error: Exception) -> str:
+    """Driver message of a database error, without SQLAlchemy's statement dump"""
+    message = str(getattr(error, "orig", None) or error)
+    return message.split("\n[SQL:")[0].strip()
+
+
+def parse_sql_error(error_message: str) -> Optional[SQLErrorKey]:
+    for kind, pattern in _ERROR_PATTERNS:
+        match = pattern.search(error_message)
+        if match:
+            return SQLErrorKey(kind, match.group(1).lower())
+    return None
+
+
+class SQLFixCache:
+    """
+    Identifier fixes learned from model corrections, e.g. column "amount" does
+    not exist -> total_amount. A later query failing with the same error is
+    rewritten locally instead of going back to the model.
+    """
+
+    def __init__(self, max_entries: int = 500):
+        self.max_entries = max_entries
+        self._fixes: "OrderedDict[SQLErrorKey, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._fixes)
+
+    def learn(self, error_message: str, failed_sql: str, fixed_sql: str) -> Optional[str]:
+        """Record the identifier that replaced the one named in the error, if the fix shows one"""
+        key = parse_sql_error(error_message)
+        if key is None:
+            return None
+        failed_tokens = [token.lower() for token in _SQL_TOKEN_PATTERN.findall(failed_sql)]
+        fixed_tokens = _SQL_TOKEN_PATTERN.findall(fixed_sql)
+        matcher = SequenceMatcher(None, failed_tokens, [token.lower() for token in fixed_tokens], autojunk=False)
+        for op, i1, i2, j1, j2 in matcher.get_opcodes():
+            if op == "replace" and failed_tokens[i1:i2] == [key.identifier] and j2 - j1 == 1 and re.fullmatch(r"\w+", fixed_tokens[j1]):
+                replacement = fixed_tokens[j1]
+                with self._lock:
+                    self._fixes[key] = replacement
+                    self._fixes.move_to_end(key)
+                    while len(self._fixes) > self.max_entries:
+                        self._fixes.popitem(last=False)
+                print(f"Learned SQL fix: {key.kind} {key.identifier} -> {replacement}")
+                return replacement
+        return None
+
+    def apply(self, sql_query: str, error_message: str) -> Optional[str]:
+        """The query with a learned fix applied, or None when no fix is known"""
+        key = parse_sql_error(error_message)
+        with self._lock:
+            replacement = self._fixes.get(key) if key else None
+            if replacement is None:
+                self.misses += 1
+                return None
+            self._fixes.move_to_end(key)
+            self.hits += 1
+        pattern = re.compile(rf"(?<![\w\"]){re.escape(key.identifier)}(?![\w\"])", re.IGNORECASE)
+        # Leave string literals alone, only identifiers are renamed
+        parts = _STRING_LITERAL_PATTERN.split(sql_query)
+        fixed = "".join(part if index % 2 else pattern.sub(replacement, part) for index, part in enumerate(parts))
+        return fixed if fixed != sql_query else None
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "fixes": {f"{key.kind}:{key.identifier}": value for key, value in self._fixes.items()},
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_sql_fix_cache: Optional[SQLFixCache] = None
+_sql_fix_cache_lock = threading.Lock()
+
+
+def get_sql_fix_cache() -> SQLFixCache:
+    """Get the process-wide cache of learned SQL fixes"""
+    global _sql_fix_cache
+    if _sql_fix_cache is None:
+        with _sql_fix_cache_lock:
+            if _sql_fix_cache is None:
+                _sql_fix_cache = SQLFixCache(int(os.getenv("SQL_FIX_CACHE_MAX_ENTRIES", "500")))
+    return _sql_fix_cache
@@ -1,14 +1,29 @@
 from agents.model import GenerativeModel
-from langchain_core.messages import SystemMessage, HumanMessage
+from agents.prompt_templates import generate_sql_correction_prompt
+from agents.sql_agent import SQLAgent
+
+
 class SQLValidator:
     def __init__(self):
-        pass
+        self.sql_agent = SQLAgent()
+
+    def correct_sql_statement(self, sql: str, error_message: str, model: GenerativeModel, schema_str: str = "") -> str:
+        """
+        Ask the model to fix a query the database rejected.
+        Returns the corrected SQL, validated like generated SQL.
+        """
+        try:
+            messages = generate_sql_correction_prompt(sql, error_message, schema_str)
+            response = model.invoke(messages)
+            return self.sql_agent.parse_sql_response(response.content)
+        except Exception as e:
+            raise Exception(f"Error validating SQL statement: {str(e)}")
 
-    def correct_sql_statement(self, sql: str, error_message: str, model: GenerativeModel) -> str:
+    async def acorrect_sql_statement(self, sql: str, error_message: str, model: GenerativeModel, schema_str: str = "") -> str:
+        """Async variant of correct_sql_statement"""
         try:
-            system_message = SystemMessage(content="You are a SQL expert. You are given a SQL statement and you need to check if it is correct.")
-            human_message = HumanMessage(content=f"The following is the SQL statement: {sql} and the error message is: {error_message}")
-            response = model.invoke(system_message, human_message)
-            return response
+            messages = generate_sql_correction_prompt(sql, error_message, schema_str)
+            response = await model.ainvoke(messages)
+            return self.sql_agent.parse_sql_response(response.content)
         except Exception as e:
-            raise Exception(f"Error validating SQL statement: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Error validating SQL statement: {str(e)}")
@@ -0,0 +1,137 @@
+import json
+from typing import Dict, List, Tuple
+
+_WHITESPACE = " \t\r\n"
+
+
+class StreamingJSONFieldParser:
+    """
+    Incremental parser for a flat JSON object of string fields, as the model
+    streams it. feed() returns the decoded text added to each string field by
+    the chunk, so a field can be delivered long before the object is complete.
+    Text before the opening brace (e.g. a markdown fence) is skipped; non-string
+    values are skipped without being decoded.
+    """
+
+    def __init__(self):
+        self.values: Dict[str, str] = {}
+        self.done = False
+        self._state = "start"
+        self._key_parts: List[str] = []
+        self._field = None
+        self._escape = None  # escape sequence being read, without the backslash
+        self._high_surrogate = None
+        self._depth = 0
+        self._in_nested_string = False
+        self._nested_escape = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """Consume a chunk, returning (field, added text) pairs in arrival order"""
+        deltas: List[Tuple[str, str]] = []
+        current = []
+        for char in chunk:
+            if self.done:
+                break
+            state = self._state
+            if state == "start":
+                if char == "{":
+                    self._state = "key_wait"
+            elif state == "key_wait":
+                if char == '"':
+                    self._key_parts = []
+                    self._state = "key"
+                elif char == "}":
+                    self.done = True
+            elif state == "key":
+                decoded = self._read_string_char(char)
+                if decoded is None:
+                    self._field = "".join(self._key_parts)
+                    self._state = "colon"
+                else:
+                    self._key_parts.append(decoded)
+            elif state == "colon":
+                if char == ":":
+                    self._state = "value_wait"
+            elif state == "value_wait":
+                if char == '"':
+                    self.values[self._field] = ""
+                    self._state = "string_value"
+                elif char not in _WHITESPACE:
+                    self._depth = 1 if char in "[{" else 0
+                    self._in_nested_string = False
+                    self._state = "other_value"
+                    if self._depth == 0 and char in ",}":
+                        self._end_value(char)
+            elif state == "string_value":
+                decoded = self._read_string_char(char)
+                if decoded is None:
+                    self._flush(deltas, current)
+                    self._state = "after_value"
+                elif decoded:
+                    current.append(decoded)
+            elif state == "other_value":
+                self._skip_value_char(char)
+            elif state == "after_value":
+                if char in ",}":
+                    self._end_value(char)
+        if self._state == "string_value":
+            self._flush(deltas, current)
+        return deltas
+
+    def _flush(self, deltas: List[Tuple[str, str]], current: List[str]) -> None:
+        if not current:
+            return
+        text = "".join(current)
+        current.clear()
+        self.values[self._field] += text
+        if deltas and deltas[-1][0] == self._field:
+            deltas[-1] = (self._field, deltas[-1][1] + text)
+        else:
+            deltas.append((self._field, text))
+
+    def _end_value(self, char: str) -> None:
+        if char == "}":
+            self.done = True
+        else:
+            self._state = "key_wait"
+
+    def _read_string_char(self, char: str):
+        """Decoded text for one character of a JSON string, "" while an escape is incomplete, None at the closing quote"""
+        if self._escape is not None:
+            self._escape += char
+            if self._escape[0] == "u" and len(self._escape) < 5:
+                return ""
+            sequence, self._escape = self._escape, None
+            if sequence[0] != "u":
+                return json.loads(f'"\\{sequence}"')
+            code_point = int(sequence[1:], 16)
+            if 0xD800 <= code_point < 0xDC00:
+                self._high_surrogate = sequence
+                return ""
+            if 0xDC00 <= code_point < 0xE000 and self._high_surrogate:
+                high, self._high_surrogate = self._high_surrogate, None
+                return json.loads(f'"\\{high}\\{sequence}"')
+            return chr(code_point)
+        if char == "\\":
+            self._escape = ""
+            return ""
+        if char == '"':
+            return None
+        return char
+
+    def _skip_value_char(self, char: str) -> None:
+        if self._in_nested_string:
+            if self._nested_escape:
+                self._nested_escape = False
+            elif char == "\\":
+                self._nested_escape = True
+            elif char == '"':
+                self._in_nested_string = False
+        elif char == '"':
+            self._in_nested_string = True
+        elif char in "[{":
+            self._depth += 1
+        elif char in "]}" and self._depth > 0:
+            self._depth -= 1
+        elif char in ",}" and self._depth == 0:
+            self._end_value(char)
@@ -0,0 +1,123 @@
+import os
+import time
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from agents.prompt_index import ANALYSIS_WORDS, get_time_tokens, tokenize
+
+# Column name words that say nothing about what a table holds
+_GENERIC_COLUMN_WORDS = frozenset("id at created updated".split())
+
+TABLE_WEIGHT = 3.0
+COLUMN_WEIGHT = 1.0
+VALUE_WEIGHT = 4.0
+
+
+class TableSelection(NamedTuple):
+    table_names: List[str]
+    confidence: float
+    scores: Dict[str, float]
+
+
+class TableSelector:
+    """
+    Picks the tables a prompt is about without a model call, from an inverted
+    index over table names, column names, domain synonyms and the distinct
+    values of dimension tables (plate numbers, station names, ...).
+    Confidence is the share of the prompt's data words the index recognised.
+    """
+
+    def __init__(self, catalog, dimension_values: Optional[Dict[str, Iterable[str]]] = None,
+                 exclude_tables: Iterable[str] = ()):
+        self.table_names = [name for name in catalog.table_names if name not in set(exclude_tables)]
+        self._terms: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._values: Dict[str, List[Tuple[Tuple[str, ...], str]]] = defaultdict(list)
+        self.built_at = time.monotonic()
+
+        for table_name in self.table_names:
+            for word in tokenize(table_name.replace("_", " ")):
+                self._add_term(word, table_name, TABLE_WEIGHT)
+            for column in catalog.get_table(table_name).columns:
+                for word in tokenize(column.name.replace("_", " ")):
+                    if word not in _GENERIC_COLUMN_WORDS:
+                        self._add_term(word, table_name, COLUMN_WEIGHT)
+
+        for table_name, values in (dimension_values or {}).items():
+            if table_name not in self.table_names:
+                continue
+            for value in values:
+                value_tokens = tuple(tokenize(str(value))) if value is not None else ()
+                if value_tokens:
+                    self._values[value_tokens[0]].append((value_tokens, table_name))
+
+    def _add_term(self, word: str, table_name: str, weight: float) -> None:
+        tables = self._terms[word]
+        tables[table_name] = max(tables.get(table_name, 0.0), weight)
+
+    def select(self, prompt: str, min_share: float = 0.25) -> TableSelection:
+        """
+        Score every table against the prompt; tables scoring at least min_share
+        of the best score are selected, best first.
+        """
+        tokens = tokenize(prompt)
+        scores: Dict[str, float] = defaultdict(float)
+        recognised: Set[int] = set()
+
+        index = 0
+        while index < len(tokens):
+            # Longest dimension value starting here, e.g. a multi-word station name
+            match = None
+            for value_tokens, table_name in self._values.get(tokens[index], ()):
+                if tuple(tokens[index:index + len(value_tokens)]) == value_tokens and (
+                    match is None or len(value_tokens) > len(match[0])
+                ):
+                    match = (value_tokens, table_name)
+            if match is not None:
+                scores[match[1]] += VALUE_WEIGHT
+                recognised.update(range(index, index + len(match[0])))
+                index += len(match[0])
+                continue
+            for table_name, weight in self._terms.get(tokens[index], {}).items():
+                scores[table_name] += weight
+                recognised.add(index)
+            index += 1
+
+        time_tokens = get_time_tokens(tokens)
+        data_positions = [
+            position for position, token in enumerate(tokens)
+            if token not in time_tokens and token not in ANALYSIS_WORDS and not token.isdigit()
+        ]
+        if not scores or not data_positions:
+            return TableSelection([], 0.0, dict(scores))
+        confidence = len(recognised.intersection(data_positions)) / len(data_positions)
+        best = max(scores.values())
+        selected = sorted(
+            (name for name, score in scores.items() if score >= best * min_share),
+            key=lambda name: (-scores[name], self.table_names.index(name)),
+        )
+        return TableSelection(selected, confidence, dict(scores))
+
+
+_selector: Optional[TableSelector] = None
+_selector_catalog = None
+_selector_lock = threading.Lock()
+
+
+def get_table_selector(catalog, load_dimension_values: Callable[[], Dict[str, Iterable[str]]],
+                       exclude_tables: Iterable[str] = ()) -> TableSelector:
+    """
+    Get the process-wide selector of a catalog. It is rebuilt for a refreshed
+    catalog and after TABLE_SELECTOR_TTL seconds so new dimension values are found.
+    """
+    global _selector, _selector_catalog
+    ttl_seconds = int(os.getenv("TABLE_SELECTOR_TTL", "3600"))
+    selector = _selector
+    if selector is None or _selector_catalog is not catalog or time.monotonic() - selector.built_at > ttl_seconds:
+        with _selector_lock:
+            if _selector is None or _selector_catalog is not catalog or time.monotonic() - _selector.built_at > ttl_seconds:
+                _selector = TableSelector(catalog, load_dimension_values(), exclude_tables)
+                _selector_catalog = catalog
+                print(f"Table selector built: {len(_selector.table_names)} tables")
+            selector = _selector
+    return selector
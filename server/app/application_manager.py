@@ -3,15 +3,22 @@ from contextlib import asynccontextmanager
 import asyncio
 from utils.telegram_bot import TelegramBot
 from commands.report_scheduler import ReportScheduler
+from commands.maintenance_scheduler import MaintenanceScheduler
 from configs.cors import configure_cors
 from middlewares.api_logger import setup_logging_middleware
 from routers.api import router
+from utils.db_ops import DBOps
+from utils.async_db_ops import AsyncDBOps
+from agents.llm_cache import get_llm_cache
+from agents.model import GenerativeModel
 
 class ApplicationManager:
     def __init__(self):
         self.telegram_bot = TelegramBot()
         self.report_scheduler = None
+        self.maintenance_scheduler = MaintenanceScheduler()
         self.bot_task = None
+        self.llm_warmup_task = None
         
     def configure_app(self, app: FastAPI) -> None:
         """Configure FastAPI application with middleware and routes"""
@@ -23,12 +30,53 @@ class ApplicationManager:
         @app.get("/bot/status")
         async def bot_status():
             return self.telegram_bot.get_status()
+
+        # Add database pool status endpoint
+        @app.get("/db/pool")
+        async def db_pool_status():
+            return DBOps().get_pool_status()
+
+        # Add dimension cache status endpoint
+        @app.get("/db/dimension-cache")
+        async def dimension_cache_status():
+            return DBOps().get_dimension_cache_stats()
+
+        # Add query result cache status endpoint
+        @app.get("/db/query-cache")
+        async def query_cache_status():
+            return DBOps().get_query_cache_stats()
+
+        # Add LLM response cache status endpoint
+        @app.get("/llm/cache")
+        async def llm_cache_status():
+            llm_cache = get_llm_cache()
+            return llm_cache.get_stats() if llm_cache else {"enabled": False}
+
+        # Add shared LLM client status endpoint
+        @app.get("/llm/clients")
+        async def llm_client_status():
+            return GenerativeModel.get_client_stats()
+
+        # Add full-text index usage endpoint
+        @app.get("/db/fts-indexes")
+        async def fts_index_status():
+            return DBOps().get_fts_index_stats()
         
     @asynccontextmanager
     async def lifespan(self, app: FastAPI):
         """Manage the lifecycle of the application"""
         print("Starting application lifecycle...")
         
+        # Listen for dimension inserts made by other workers
+        DBOps().start_dimension_cache_listener()
+        print("Dimension cache listener started...")
+
+        # Open LLM connections in the background so the first request skips the TLS handshake
+        self.llm_warmup_task = asyncio.create_task(GenerativeModel().warm_up())
+
+        # Nightly rollup rebuild and partition maintenance
+        self.maintenance_scheduler.start_scheduler()
+
         # Initialize the bot first
         await self.telegram_bot.init_bot()
         print("Bot initialized...")
@@ -53,6 +101,7 @@ class ApplicationManager:
                 if self.report_scheduler:
                     await self.report_scheduler.stop_scheduler()
                     print("Scheduler stopped")
+                await self.maintenance_scheduler.stop_scheduler()
                 
                 # Stop the bot
                 if self.telegram_bot:
@@ -67,6 +116,18 @@ class ApplicationManager:
                     except (asyncio.CancelledError, RuntimeError):
                         pass
                     print("Bot task cancelled")
+
+                # Close the shared LLM HTTP pools
+                if self.llm_warmup_task and not self.llm_warmup_task.done():
+                    self.llm_warmup_task.cancel()
+                await GenerativeModel.close_clients()
+                print("LLM clients closed")
+
+                # Close pooled database connections
+                DBOps().stop_dimension_cache_listener()
+                await AsyncDBOps.dispose_engines()
+                DBOps.dispose_engines()
+                print("Database connections closed")
                     
             except Exception as e:
                 print(f"Error during application shutdown: {e}")
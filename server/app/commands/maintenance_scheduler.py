@@ -0,0 +1,60 @@
+import os
+import asyncio
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from typing import Optional
+from utils.db_ops import DBOps
+
+class MaintenanceScheduler:
+    """Nightly database maintenance: rebuild the fuel KPI rollups and create upcoming partitions"""
+
+    def __init__(self):
+        self.db_ops = DBOps()
+        self.maintenance_hour = int(os.getenv("DB_MAINTENANCE_HOUR", "2"))
+        self.scheduler: Optional[AsyncIOScheduler] = None
+
+    async def rebuild_rollups(self) -> None:
+        """Rebuild the rollup tables without blocking the event loop"""
+        try:
+            await asyncio.to_thread(self.db_ops.rebuild_fuel_rollups)
+        except Exception as e:
+            print(f"Error rebuilding fuel rollups: {str(e)}")
+
+    async def ensure_partitions(self) -> None:
+        """Create fuel_transaction partitions of the coming months"""
+        try:
+            await asyncio.to_thread(self.db_ops.ensure_fuel_transaction_partitions)
+        except Exception as e:
+            print(f"Error creating fuel_transaction partitions: {str(e)}")
+
+    def start_scheduler(self) -> None:
+        """Schedule the enabled maintenance jobs"""
+        if not (self.db_ops.FUEL_ROLLUPS_ENABLED or self.db_ops.FUEL_TRANSACTION_PARTITIONING):
+            return
+        try:
+            self.scheduler = AsyncIOScheduler()
+            if self.db_ops.FUEL_TRANSACTION_PARTITIONING:
+                # Partitions are also checked at startup so a new month never lands in DEFAULT
+                self.scheduler.add_job(self.ensure_partitions)
+                self.scheduler.add_job(
+                    self.ensure_partitions,
+                    trigger='cron',
+                    hour=self.maintenance_hour,
+                    minute=0
+                )
+            if self.db_ops.FUEL_ROLLUPS_ENABLED:
+                self.scheduler.add_job(
+                    self.rebuild_rollups,
+                    trigger='cron',
+                    hour=self.maintenance_hour,
+                    minute=15
+                )
+            self.scheduler.start()
+            print(f"Maintenance scheduler started. Jobs run daily at {self.maintenance_hour}:00")
+        except Exception as e:
+            print(f"Error starting maintenance scheduler: {str(e)}")
+
+    async def stop_scheduler(self) -> None:
+        """Stop the scheduler gracefully"""
+        if self.scheduler and self.scheduler.running:
+            self.scheduler.shutdown()
+            print("Maintenance scheduler stopped")
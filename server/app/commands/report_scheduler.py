@@ -23,9 +23,10 @@ class ReportScheduler:
             print(f"Generating report with SQL prompt: {sql_prompt}")
             print(f"HTML prompt: {html_prompt}")
             
-            html_file_path, explanation = self.analysis_controller.retrive_and_generate_html_file(
+            html_file_path, explanation = await self.analysis_controller.aretrive_and_generate_html_file(
                 sql_prompt=sql_prompt,
-                html_prompt=html_prompt
+                html_prompt=html_prompt,
+                chart_type=chart_type
             )
 
             if html_file_path == "RESTRICTED":
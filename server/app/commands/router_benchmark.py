@@ -0,0 +1,76 @@
+import time
+import asyncio
+import argparse
+
+import numpy as np
+from langchain_core.messages import HumanMessage
+
+from agents.model_router import ModelRouter, StubChatModel
+
+
+def build_backends(seed: int) -> dict:
+    """A fast provider with a slow tail and a slower, steadier fallback"""
+    return {
+        "stub:fast": StubChatModel(model_name="fast", latency=0.2, tail_latency=2.0, tail_rate=0.08, seed=seed),
+        "stub:steady": StubChatModel(model_name="steady", latency=0.35, tail_latency=0.8, tail_rate=0.01, seed=seed + 1),
+    }
+
+
+async def run_scenario(name: str, model, requests: int, concurrency: int, outage_at: int = None, backends: dict = None) -> None:
+    """Send requests through a model and print latency percentiles; outage_at makes the fast stub fail from then on"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def send(index: int):
+        nonlocal errors
+        if outage_at is not None and index == outage_at:
+            backends["stub:fast"].error_rate = 1.0
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                await model.ainvoke([HumanMessage(content="ping")])
+                latencies.append(time.monotonic() - started)
+            except Exception:
+                errors += 1
+
+    # Requests are issued in order so the outage starts at a known point
+    for start in range(0, requests, concurrency):
+        await asyncio.gather(*(send(index) for index in range(start, min(start + concurrency, requests))))
+    values = np.array(latencies) if latencies else np.zeros(1)
+    print(
+        f"{name:<28} ok {len(latencies):>4}  errors {errors:>3}  "
+        f"p50 {np.percentile(values, 50):.3f}s  p95 {np.percentile(values, 95):.3f}s  "
+        f"p99 {np.percentile(values, 99):.3f}s  max {values.max():.3f}s"
+    )
+    if isinstance(model, ModelRouter):
+        stats = model.get_stats()
+        circuits = ", ".join(f"{backend}={info['state']}" for backend, info in stats["backends"].items())
+        print(f"{'':<28} hedges {stats['hedges']}, hedge wins {stats['hedge_wins']}, circuits {circuits}")
+
+
+async def main(requests: int, concurrency: int, seed: int) -> None:
+    backends = build_backends(seed)
+    await run_scenario("single fast backend", backends["stub:fast"], requests, concurrency)
+
+    backends = build_backends(seed)
+    await run_scenario("router, no hedging", ModelRouter(backends, "benchmark", hedge_enabled=False), requests, concurrency)
+
+    backends = build_backends(seed)
+    router = ModelRouter(backends, "benchmark", hedge_enabled=True, hedge_min_samples=20, hedge_min_delay=0.1)
+    await run_scenario("router, p95 hedging", router, requests, concurrency)
+
+    backends = build_backends(seed)
+    router = ModelRouter(backends, "benchmark", hedge_enabled=True, hedge_min_samples=20, hedge_min_delay=0.1)
+    await run_scenario("router, fast backend outage", router, requests, concurrency, outage_at=requests // 2, backends=backends)
+
+
+if __name__ == "__main__":
+    # Offline tail-latency benchmark of the LLM router on stub providers:
+    #   python -m commands.router_benchmark --requests 400 --concurrency 8
+    parser = argparse.ArgumentParser(description="Benchmark LLM routing, hedging and circuit breaking on stub providers")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.seed))
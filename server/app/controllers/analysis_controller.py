@@ -1,13 +1,29 @@
 import os
-import json
+import re
+import time
+import asyncio
 import traceback
-from typing import Tuple, Optional, Any, Dict, List
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime
+from typing import AsyncIterator, Tuple, Optional, Any, Dict, List
 
 from fastapi import HTTPException
+from sqlalchemy.exc import DataError, ProgrammingError
 
-from agents.model import GenerativeModel
+from agents.model import DEFAULT_CEREBRAS_MODEL, GenerativeModel
 from utils.db_ops import DBOps
+from utils.async_db_ops import AsyncDBOps
+from utils.query_guard import QueryRejected
+from utils.fuel_rollups import ROLLUP_TABLE_NAMES, get_rollup_schema_hint
+from utils.schema_serializer import SchemaSerializer
+from utils.result_encoder import ResultEncoder
+from utils.sql_checker import SQLChecker, SQLCheckFailed
 from agents.sql_agent import SQLAgent
+from agents.sql_validator import SQLValidator
+from agents.sql_fix_cache import get_db_error_message, get_sql_fix_cache
+from agents.prompt_index import PromptMatch, get_prompt_index, get_schema_vocabulary
+from agents.chart_renderer import ChartRenderer, parse_chart_type
+from agents.table_selector import get_table_selector
 from agents.tools.file_ops import FileOps
 
 from agents.schemas.fuel_transaction import FuelTransactionBase 
@@ -18,50 +34,133 @@ from agents.schemas.sematic_table import SemanticTable
 from models.analysis_history import AnalysisHistory
 
 
-def format_schema_dict_to_string(schema_data: Any) -> str:
-    if isinstance(schema_data, str): return schema_data
-    if not isinstance(schema_data, dict): return str(schema_data)
-    if not schema_data: return "-- No schema information provided --\n"
-    parts = [f"-- Schema for table: {name}\n{defn}\n" for name, defn in schema_data.items()]
-    return "\n".join(parts)
+def build_regeneration_prompt(sql_prompt: str, rejected_sql: str, reason: str) -> str:
+    return (
+        f"{sql_prompt}\n\n---\n"
+        f"The previous query was rejected before execution: {reason}.\n"
+        f"Rejected query:\n{rejected_sql}\n"
+        f"Write a cheaper query: filter early, aggregate instead of returning raw rows, avoid cartesian joins and add a LIMIT.\n---"
+    )
 
-def convert_db_result_to_string(data: any) -> str:
-    if not data: return "No data returned from query."
-    try:
-        MAX_ITEMS = 50
-        trunc = False
-        if isinstance(data, (list, tuple)) and len(data) > MAX_ITEMS:
-            data = data[:MAX_ITEMS]
-            trunc = True
-        json_str = json.dumps(data, indent=2, default=str)
-        return json_str + ("\n... (truncated)" if trunc else "")
-    except Exception: return str(data)
 
+SCHEMA_TOKEN_BUDGET = int(os.getenv("SCHEMA_TOKEN_BUDGET", "4000"))
+RESULT_TOKEN_BUDGET = int(os.getenv("RESULT_TOKEN_BUDGET", "3000"))
+SQL_GUARD_REGENERATE_ATTEMPTS = int(os.getenv("SQL_GUARD_REGENERATE_ATTEMPTS", "1"))
+SQL_CORRECTION_ATTEMPTS = int(os.getenv("SQL_CORRECTION_ATTEMPTS", "2"))
+SQL_CORRECTION_TIME_BUDGET = float(os.getenv("SQL_CORRECTION_TIME_BUDGET", "20"))
+RELATIONSHIP_MAX_JOINS = int(os.getenv("RELATIONSHIP_MAX_JOINS", "2"))
+LOCAL_CHART_RENDERER = os.getenv("LOCAL_CHART_RENDERER", "true").lower() == "true"
+TABLE_SELECTOR_ENABLED = os.getenv("TABLE_SELECTOR_ENABLED", "true").lower() == "true"
+TABLE_SELECTOR_MIN_CONFIDENCE = float(os.getenv("TABLE_SELECTOR_MIN_CONFIDENCE", "0.6"))
+# Comma-separated provider:model backends; when set, requests are routed by latency and health
+LLM_ROUTER_BACKENDS = os.getenv("LLM_ROUTER_BACKENDS", "")
+SPECULATIVE_SQL_ENABLED = os.getenv("SPECULATIVE_SQL_ENABLED", "true").lower() == "true"
+_SQL_TABLE_PATTERN = re.compile(r"\b(?:from|join)\s+(?:\w+\.)?(\w+)", re.IGNORECASE)
+# Threads running sync SQL corrections; one that runs out of time finishes in the background
+_CORRECTION_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("SQL_CORRECTION_THREADS", "4")), thread_name_prefix="sql-correction")
 
-MAX_SCHEMA_CHARS_IN_PROMPT = 16000 
+
+class SQLRetryBudget:
+    """
+    Bookkeeping of one query's execute/regenerate/correct loop: attempt counts,
+    the correction time budget, learned fixes and learning from model fixes
+    once the corrected query has run.
+    """
+
+    def __init__(self, sql_fix_cache, generated_prompt: Optional[str] = None):
+        self.sql_fix_cache = sql_fix_cache
+        # Prompt whose cached SQL response is the query being run, evicted once the query fails
+        self.generated_prompt = generated_prompt
+        self.regenerations = 0
+        self.corrections = 0
+        self.pending_fix = None
+        self.deadline = time.monotonic() + SQL_CORRECTION_TIME_BUDGET
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def succeeded(self) -> None:
+        if self.pending_fix:
+            self.sql_fix_cache.learn(*self.pending_fix)
+            self.pending_fix = None
+
+    def start_regeneration(self, rejected: QueryRejected) -> None:
+        """Count a regeneration of a query the cost guard rejected, re-raising once they are used up"""
+        if self.regenerations >= SQL_GUARD_REGENERATE_ATTEMPTS:
+            raise rejected
+        self.regenerations += 1
+        print(f"Query rejected by cost guard ({rejected.reason}), regenerating...")
+
+    def start_correction(self, db_error: Exception, failed_sql: str) -> Tuple[str, Optional[str]]:
+        """
+        Count a correction, re-raising the error once attempts or time are used up.
+        Returns the error message and a learned fix of the query, or None when the model is needed.
+        """
+        if self.corrections >= SQL_CORRECTION_ATTEMPTS or self.remaining() <= 0:
+            raise db_error
+        self.corrections += 1
+        error_message = get_db_error_message(db_error)
+        print(f"Query failed ({error_message}), correction attempt {self.corrections}/{SQL_CORRECTION_ATTEMPTS}...")
+        fixed_sql = self.sql_fix_cache.apply(failed_sql, error_message)
+        self.pending_fix = None
+        if fixed_sql is not None:
+            print("Applied a learned fix without calling the model.")
+        return error_message, fixed_sql
+
+    def expect_fix(self, error_message: str, failed_sql: str, fixed_sql: str) -> None:
+        """Remember a model fix, learned only if the fixed query then runs"""
+        self.pending_fix = (error_message, failed_sql, fixed_sql)
 
 
 class AnalysisController:
-    def __init__(self, model_name: str = "llama-4-scout-17b-16e-instruct"):
+    def __init__(self, model_name: str = DEFAULT_CEREBRAS_MODEL):
         print(f"Initializing AnalysisController with model: {model_name}")
         generative_model = GenerativeModel()
-        self.model = generative_model.get_cerebras_model(model_name)
+        if LLM_ROUTER_BACKENDS:
+            # Each stage is routed on its own latency statistics; health is shared
+            self.model = generative_model.get_model_router(LLM_ROUTER_BACKENDS)
+            self.stage_models = {stage: self.model.for_stage(stage) for stage in ("extract", "tables", "sql", "report")}
+        else:
+            # Shared client; controllers created per request reuse its warm connections
+            self.model = generative_model.get_cerebras_model(model_name)
+            self.stage_models = {stage: self.model for stage in ("extract", "tables", "sql", "report")}
         self.db_ops = DBOps()
+        self.async_db_ops = AsyncDBOps()
         self.sql_agent = SQLAgent()
+        self.sql_validator = SQLValidator()
+        self.sql_fix_cache = get_sql_fix_cache()
         self.file_ops = FileOps()
+        self.chart_renderer = ChartRenderer()
+        self.result_encoder = ResultEncoder(RESULT_TOKEN_BUDGET)
         try:
-            raw_schema = self.db_ops.get_schema_info()
-            self.full_db_schema_string = format_schema_dict_to_string(raw_schema)
-            print(f"Initialized Full DB Schema (Length: {len(self.full_db_schema_string)} chars). First 500 chars:\n{self.full_db_schema_string[:500]}...")
+            # Served from the process-wide schema catalog, no introspection per controller
+            catalog = self.db_ops.get_schema_catalog()
+            self.schema_fingerprint = catalog.fingerprint
+            self.schema_serializer = SchemaSerializer(catalog, SCHEMA_TOKEN_BUDGET)
+            self.sql_checker = SQLChecker(catalog)
+            # Point the model at the pre-aggregated rollups when they exist
+            self.rollup_tables = [name for name in ROLLUP_TABLE_NAMES if catalog.has_table(name)]
+            schema_vocabulary = get_schema_vocabulary(catalog)
+            print(f"Initialized schema serializer ({len(catalog.table_names)} tables, budget {SCHEMA_TOKEN_BUDGET} tokens).")
         except Exception as e:
             print(f"ERROR: Failed to initialize DB schema: {e}")
-            self.full_db_schema_string = "-- Error retrieving schema --"
+            self.schema_serializer = None
+            self.schema_fingerprint = None
+            self.sql_checker = SQLChecker()
+            self.rollup_tables = []
+            schema_vocabulary = frozenset()
         try:
-            self.relationship_info = self.db_ops.get_relationship_tables('table_relationships')
-            print(f"Initialized Relationship Info: Status={self.relationship_info.get('status')}")
+            # Loaded once from analysis_history and shared by every controller
+            self.prompt_index = get_prompt_index(self.db_ops.get_analysis_history_pairs, schema_vocabulary)
         except Exception as e:
-            print(f"ERROR: Failed to initialize relationship info: {e}")
-            self.relationship_info = {"status": False, "data": None, "message": str(e)}
+            print(f"ERROR: Failed to load prompt reuse index: {e}")
+            self.prompt_index = None
+        try:
+            # Built once per schema catalog and shared by every controller
+            self.relationship_graph = self.db_ops.get_relationship_graph()
+        except Exception as e:
+            print(f"ERROR: Failed to initialize relationship graph: {e}")
+            self.relationship_graph = None
 
     def extract_and_save_fuel_transaction(self, image_path: str, image_info: dict) -> FuelTransactionBase:
         """Extract text from image and save fuel transaction"""
@@ -73,7 +172,7 @@ class AnalysisController:
             result = self.sql_agent.generate_struture_output_from_image(
                 prompt, 
                 image_path, 
-                self.model, 
+                self.stage_models["extract"], 
                 FuelTransactionBase
             )
             self.db_ops.save_fuel_transaction(result, image_info["user_full_name"])
@@ -81,133 +180,669 @@ class AnalysisController:
         except Exception as e:
             raise Exception(f"OCR processing failed: {str(e)}")
 
-    def retrive_and_generate_html_file(self, sql_prompt: str, html_prompt: str) -> Tuple[str, str]:
+    def save_fuel_transactions_bulk(self, records: List[dict]) -> dict:
         """
-        Generates SQL (raw), executes it, generates HTML report (via JSON), saves file.
-        Includes logic to potentially use relevant schema and truncate if too long.
+        Validate already-extracted receipt records and save them in one batch.
+        Each record holds the FuelTransactionBase fields plus user_full_name.
+        Invalid records are reported per row and do not abort the batch.
         """
-        print(f"\n--- Starting Analysis ---")
-        print(f"Received SQL Prompt: {sql_prompt}")
-        print(f"Received HTML Prompt: {html_prompt}")
+        errors = []
+        batch = []
+        batch_indexes = []
+        for index, record in enumerate(records):
+            try:
+                if not isinstance(record, dict) or not isinstance(record.get("user_full_name"), str) or not record["user_full_name"]:
+                    raise ValueError("user_full_name is required and must be a string")
+                batch.append((FuelTransactionBase(**record), record["user_full_name"]))
+                batch_indexes.append(index)
+            except Exception as e:
+                errors.append({"index": index, "error": str(e)})
 
-        current_schema_string_untruncated = self.full_db_schema_string
-        schema_source = "Full Schema"
-        final_sql_prompt = sql_prompt
+        result = self.db_ops.save_fuel_transactions(batch) if batch else {"transaction_ids": [], "errors": []}
+        # Map batch positions back to positions in the request
+        errors.extend({"index": batch_indexes[error["index"]], "error": error["error"]} for error in result["errors"])
+        errors.sort(key=lambda error: error["index"])
+        return {
+            "received": len(records),
+            "saved": len(result["transaction_ids"]),
+            "failed": len(errors),
+            "transaction_ids": result["transaction_ids"],
+            "errors": errors,
+        }
 
+    async def aextract_and_save_fuel_transaction(self, image_path: str, image_info: dict) -> FuelTransactionBase:
+        """Async variant of extract_and_save_fuel_transaction that awaits the database"""
         try:
-            # 1. Determine Relevant Schema 
-            if self.relationship_info.get("status") == True and self.relationship_info.get("data"):
-                print("Attempting to identify relevant tables...")
-                try:
-                    table_names: List[str] = self.sql_agent.get_main_table_from_prompt(
-                        sql_prompt, self.relationship_info["data"], self.model
-                    )
-                    if table_names:
-                        print(f"Identified relevant tables: {table_names}")
-                        relevant_schema_dict = self.db_ops.get_table_schemas_by_names(table_names)
-                        current_schema_string_untruncated = format_schema_dict_to_string(relevant_schema_dict)
-                        schema_source = f"Relevant Tables Schema ({', '.join(table_names)})"
-                        print(f"Using {schema_source} (Length: {len(current_schema_string_untruncated)} chars).")
-                        # Update prompt context
-                        final_sql_prompt = (
-                                f"{sql_prompt}\n\n---\n"
-                                f"Context: Relevant tables are {', '.join(table_names)}. Focus on schema below.\n---\n"
-                                f"Generate SQL based on original prompt: '{sql_prompt}'"
-                           )
-                    else:
-                        print("Could not identify relevant tables, using full schema.")
-                        schema_source = "Full Schema (Fallback)"
-                except Exception as e:
-                    print(f"Warning: Failed during relevant table/schema step: {e}. Using full schema.")
-                    schema_source = "Full Schema (Error Fallback)"
-            else:
-                print("No relationship info or status False, using full schema.")
-
-            # --- Schema Truncation ---
-            schema_to_pass = current_schema_string_untruncated
-            if len(schema_to_pass) > MAX_SCHEMA_CHARS_IN_PROMPT:
-                print(f"Warning: Schema length ({len(schema_to_pass)}) exceeds limit ({MAX_SCHEMA_CHARS_IN_PROMPT}). Truncating.")
-                schema_to_pass = schema_to_pass[:MAX_SCHEMA_CHARS_IN_PROMPT] + "\n-- SCHEMA TRUNCATED --"
-            print(f"Schema to be passed to LLM (Length: {len(schema_to_pass)} chars, Source: {schema_source}).")
+            prompt = (
+                "Extract all visible text from this image. "
+                "Return only the extracted text, maintaining its original formatting."
+            )
+            result = await self.sql_agent.agenerate_struture_output_from_image(
+                prompt, 
+                image_path, 
+                self.stage_models["extract"], 
+                FuelTransactionBase
+            )
+            await self.async_db_ops.save_fuel_transaction(result, image_info["user_full_name"])
+            return result
+        except Exception as e:
+            raise Exception(f"OCR processing failed: {str(e)}")
 
+    def retrive_and_generate_html_file(self, sql_prompt: str, html_prompt: str, use_cache: bool = True,
+                                       chart_type: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Generates SQL (raw), executes it, renders the HTML report locally for known chart
+        types (the model only writes the explanation) or has the model write it (via JSON),
+        saves file. chart_type defaults to the chart named in html_prompt.
+        Includes logic to potentially use relevant schema, fitted to the token budget.
+        """
+        self._log_analysis_start(sql_prompt, html_prompt)
+        try:
+            # 0. Reuse the SQL of a near-duplicate earlier prompt
+            reuse_match = self._find_similar_prompt(sql_prompt) if use_cache else None
+            reused_sql = reuse_match.sql_statement if reuse_match and reuse_match.reusable else None
+            if reused_sql:
+                print(f"Reusing SQL of similar prompt '{reuse_match.prompt}' (score {reuse_match.score:.2f})")
+                sql_query_string = reused_sql
+                schema_to_pass, final_sql_prompt = self._prepare_schema(sql_prompt, None)
+            else:
+                # 1. Determine Relevant Schema, locally when the prompt is clear enough
+                table_names = self._select_tables_locally(sql_prompt)
+                if not table_names and self._has_relationship_info():
+                    print("Attempting to identify relevant tables...")
+                    try:
+                        table_names = self._connect_tables(self.sql_agent.get_main_table_from_prompt(
+                            sql_prompt, self.relationship_graph.to_prompt_text(), self.stage_models["tables"],
+                            schema_fingerprint=self.schema_fingerprint, use_cache=use_cache
+                        ))
+                    except Exception as e:
+                        print(f"Warning: Failed during relevant table/schema step: {e}. Using full schema.")
+                        table_names = False
+                elif not table_names:
+                    print("No relationship graph, using full schema.")
+                schema_to_pass, final_sql_prompt = self._prepare_schema(sql_prompt, table_names)
+                final_sql_prompt = self._add_similar_prompt_example(final_sql_prompt, reuse_match)
 
-            # 2. Generate RAW SQL Query
-            print(f"Generating raw SQL query...")
-            sql_query_string = self.sql_agent.generate_sql_query(
-                schema_to_pass, final_sql_prompt, self.model
-            )
+                # 2. Generate RAW SQL Query
+                print(f"Generating raw SQL query...")
+                sql_query_string = self.sql_agent.generate_sql_query(
+                    schema_to_pass, final_sql_prompt, self.stage_models["sql"], schema_fingerprint=self.schema_fingerprint, use_cache=use_cache
+                )
             print(f"SQL Agent returned: ```{sql_query_string}```")
 
             # 3. Handle RESTRICTED Query
             if sql_query_string == "RESTRICTED":
-                print("Query identified as RESTRICTED by agent.")
-                explanation = "Operation restricted."
-                # ... (Save restricted notice HTML) ...
-                reports_dir = os.path.join(os.path.dirname(__file__), "..", "public", "reports")
-                os.makedirs(reports_dir, exist_ok=True)
-                file_name = self.file_ops.date_time_now() + "_restricted.html"
-                file_path = os.path.join(reports_dir, file_name)
-                restricted_content = f"<html><body><h1>Operation Restricted</h1><p>{explanation}</p></body></html>"
-                self.file_ops.save_html_to_file(restricted_content, file_path)
-                return file_path, explanation
+                return self._save_restricted_report()
 
             print("SQL query generated successfully.")
 
             # 4. Execute the SQL Query
             print(f"Executing SQL: {sql_query_string}")
             try:
-                query_result = self.db_ops.execute_sql_query(sql_query_string)
-                print(f"Query execution successful.")
+                sql_query_string, capped_result = self._run_sql_with_retries(
+                    sql_query_string, schema_to_pass, final_sql_prompt, use_cache, generated=sql_query_string != reused_sql
+                )
+                if capped_result is None:
+                    return self._save_restricted_report()
+                query_result = capped_result.rows
+                print(f"Query execution successful ({len(query_result)} rows, truncated={capped_result.truncated}).")
             except Exception as db_error:
                 print(f"Database execution error: {db_error}\n{traceback.format_exc()}")
                 raise HTTPException(status_code=500, detail=f"Database Error: Failed to execute query. Error: {db_error}")
 
             # 5. Prepare Data for HTML generation
-            data_string = convert_db_result_to_string(query_result)
+            data_string = self.result_encoder.encode(
+                capped_result.columns, query_result, capped_result.truncated, capped_result.total_estimate
+            )
             final_html_prompt = html_prompt # Use original HTML prompt
             print("Prepared data for HTML generation.")
 
-            # 6. Generate HTML Content (via JSON parsing in Agent)
-            print(f"Generating HTML content (requesting JSON)...")
+            # 6. Generate HTML Content: rendered locally for known chart types, otherwise by the agent (via JSON)
+            local_chart_type = self._resolve_chart_type(chart_type, html_prompt, capped_result)
             try:
-                # Expecting an HTMLText object from the agent
-                html_text_obj: HTMLText = self.sql_agent.generate_html_text(
-                    final_html_prompt, data_string, self.model
-                )
-                print("HTML content generation successful from agent (via JSON).")
+                if local_chart_type:
+                    print(f"Rendering {local_chart_type} report locally, generating explanation...")
+                    explanation_text = self.sql_agent.generate_explanation_text(
+                        final_html_prompt, data_string, self.stage_models["report"], use_cache=use_cache
+                    )
+                    html_text_obj = self._render_local_report(sql_prompt, local_chart_type, capped_result, explanation_text)
+                else:
+                    print(f"Generating HTML content (requesting JSON)...")
+                    # Expecting an HTMLText object from the agent
+                    html_text_obj: HTMLText = self.sql_agent.generate_html_text(
+                        final_html_prompt, data_string, self.stage_models["report"], use_cache=use_cache
+                    )
+                print("HTML content generation successful.")
             except Exception as html_gen_error:
                  print(f"Error generating/parsing HTML structure: {html_gen_error}\n{traceback.format_exc()}")
                  raise HTTPException(status_code=500, detail=f"Analysis Error: Failed generation/parsing. Error: {html_gen_error}")
 
-            # 7. Save HTML File using data from HTMLText object
-            base_file_name_suggested = html_text_obj.file_name
-            safe_suffix = "".join(c for c in base_file_name_suggested if c.isalnum() or c in ('-', '_')).rstrip('.')
-            if not safe_suffix: safe_suffix = "report"
-            if not safe_suffix.endswith(".html"): safe_suffix += ".html"
-            base_file_name = self.file_ops.date_time_now() + "_" + safe_suffix
-            reports_dir = os.path.join(os.path.dirname(__file__), "..", "public", "reports")
-            os.makedirs(reports_dir, exist_ok=True)
-            file_path = os.path.join(reports_dir, base_file_name)
-            html_content_to_save = html_text_obj.html
-            print(f"Saving generated HTML content ({len(html_content_to_save)} bytes) to: {file_path}")
-            self.file_ops.save_html_to_file(html_content_to_save, file_path)
-
-            # 8. Prepare Final Explanation
-            html_explanation = html_text_obj.explanation
-            full_explanation = f"--- Data / Report Explanation ---\n{html_explanation}"
-
-            # 9. Save Analysis History
-            # try:
-            #     analysis_history = AnalysisHistory(...)
-            #     self.db_ops.save_analysis_history(analysis_history)
-            # except Exception as history_error: print(f"Warning: Failed history save: {history_error}")
-
-            print(f"--- Analysis Successful --- Report: {file_path}")
-            return file_path, full_explanation
+            # 7-9. Save HTML File and prepare final explanation
+            file_path, explanation = self._save_html_report(html_text_obj)
+            if sql_query_string != reused_sql:
+                self._record_analysis(sql_prompt, sql_query_string, file_path, explanation)
+            return file_path, explanation
 
         except HTTPException as http_exc:
               print(f"--- Analysis Failed (HTTPException) --- Status: {http_exc.status_code}, Detail: {http_exc.detail}")
               raise http_exc
         except Exception as e:
             print(f"--- Analysis Failed (Unexpected Error) --- Error: {str(e)}\n{traceback.format_exc()}")
-            raise HTTPException(status_code=500, detail=f"Internal server error during analysis: {str(e)}")
\ No newline at end of file
+            raise HTTPException(status_code=500, detail=f"Internal server error during analysis: {str(e)}")
+
+    async def aretrive_and_generate_html_file(self, sql_prompt: str, html_prompt: str, use_cache: bool = True,
+                                              chart_type: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Async variant of retrive_and_generate_html_file. Database and model calls are
+        awaited, so the event loop stays free for other requests and Telegram polling.
+        Table selection and a speculative full-schema SQL generation run concurrently;
+        the speculative SQL is kept when it only touches the selected tables.
+        """
+        self._log_analysis_start(sql_prompt, html_prompt)
+        try:
+            sql_query_string, reused_sql, capped_result, data_string = await self._aprepare_report_data(sql_prompt, use_cache)
+            if data_string is None:
+                return self._save_restricted_report()
+
+            # 6. Generate HTML Content: rendered locally for known chart types, otherwise by the agent (via JSON)
+            local_chart_type = self._resolve_chart_type(chart_type, html_prompt, capped_result)
+            try:
+                if local_chart_type:
+                    print(f"Rendering {local_chart_type} report locally, generating explanation...")
+                    explanation_text = await self.sql_agent.agenerate_explanation_text(
+                        html_prompt, data_string, self.stage_models["report"], use_cache=use_cache
+                    )
+                    html_text_obj = self._render_local_report(sql_prompt, local_chart_type, capped_result, explanation_text)
+                else:
+                    print(f"Generating HTML content (requesting JSON)...")
+                    html_text_obj: HTMLText = await self.sql_agent.agenerate_html_text(
+                        html_prompt, data_string, self.stage_models["report"], use_cache=use_cache
+                    )
+                print("HTML content generation successful.")
+            except Exception as html_gen_error:
+                 print(f"Error generating/parsing HTML structure: {html_gen_error}\n{traceback.format_exc()}")
+                 raise HTTPException(status_code=500, detail=f"Analysis Error: Failed generation/parsing. Error: {html_gen_error}")
+
+            # 7-9. Save HTML File and prepare final explanation
+            file_path, explanation = await asyncio.to_thread(self._save_html_report, html_text_obj)
+            if sql_query_string != reused_sql:
+                await self._arecord_analysis(sql_prompt, sql_query_string, file_path, explanation)
+            return file_path, explanation
+
+        except HTTPException as http_exc:
+              print(f"--- Analysis Failed (HTTPException) --- Status: {http_exc.status_code}, Detail: {http_exc.detail}")
+              raise http_exc
+        except Exception as e:
+            print(f"--- Analysis Failed (Unexpected Error) --- Error: {str(e)}\n{traceback.format_exc()}")
+            raise HTTPException(status_code=500, detail=f"Internal server error during analysis: {str(e)}")
+
+    async def astream_html_file(self, sql_prompt: str, html_prompt: str, use_cache: bool = True,
+                                chart_type: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of aretrive_and_generate_html_file. Yields progress events;
+        the HTML is appended to the report file as the model writes it and is also
+        delivered as "html" events. Locally rendered charts arrive as a single "html"
+        event before the explanation. The last event is "done" or "error".
+        """
+        self._log_analysis_start(sql_prompt, html_prompt)
+        file_path = None
+        try:
+            yield {"event": "status", "message": "Generating SQL query..."}
+            sql_query_string, reused_sql, capped_result, data_string = await self._aprepare_report_data(sql_prompt, use_cache)
+            if data_string is None:
+                file_path, explanation = self._save_restricted_report()
+                yield {"event": "done", "file_path": file_path, "explanation": explanation, "status": "restricted"}
+                return
+            yield {"event": "sql", "sql": sql_query_string}
+            yield {"event": "status", "message": "Generating report..."}
+
+            # Written under a provisional name, renamed once the report is complete
+            file_path = os.path.join(self._get_reports_dir(), self.file_ops.date_time_now() + "_report.html")
+            local_chart_type = self._resolve_chart_type(chart_type, html_prompt, capped_result)
+            html_text_obj = None
+            if local_chart_type:
+                # The chart is ready before the model writes a word; the explanation streams in after it
+                chart_html = self._render_local_report(sql_prompt, local_chart_type, capped_result, "").html
+                await asyncio.to_thread(self.file_ops.save_html_to_file, chart_html, file_path)
+                yield {"event": "html", "delta": chart_html}
+                async for field, value in self.sql_agent.astream_explanation_text(html_prompt, data_string, self.stage_models["report"], use_cache=use_cache):
+                    if field == "result":
+                        html_text_obj = self._render_local_report(sql_prompt, local_chart_type, capped_result, value)
+                    else:
+                        yield {"event": field, "delta": value}
+            else:
+                # File I/O runs in worker threads so a slow disk does not stall the event loop
+                report_file = await asyncio.to_thread(open, file_path, "w", encoding="utf-8")
+                try:
+                    async for field, value in self.sql_agent.astream_html_text(html_prompt, data_string, self.stage_models["report"], use_cache=use_cache):
+                        if field == "result":
+                            html_text_obj = value
+                        elif field in ("html", "explanation"):
+                            if field == "html":
+                                await asyncio.to_thread(self._append_to_report, report_file, value)
+                            yield {"event": field, "delta": value}
+                finally:
+                    await asyncio.to_thread(report_file.close)
+            print("HTML content generation successful (streamed).")
+
+            final_path = os.path.join(self._get_reports_dir(), self._get_report_file_name(html_text_obj.file_name))
+            # The validated HTML is authoritative; it only differs from the streamed text on malformed output
+            await asyncio.to_thread(self.file_ops.save_html_to_file, html_text_obj.html, file_path)
+            os.replace(file_path, final_path)
+            file_path = None
+            explanation = self._build_explanation(html_text_obj)
+            print(f"--- Analysis Successful --- Report: {final_path}")
+            if sql_query_string != reused_sql:
+                await self._arecord_analysis(sql_prompt, sql_query_string, final_path, explanation)
+            yield {"event": "done", "file_path": final_path, "explanation": explanation, "status": "success"}
+
+        except HTTPException as http_exc:
+            self._remove_partial_report(file_path)
+            print(f"--- Analysis Failed (HTTPException) --- Status: {http_exc.status_code}, Detail: {http_exc.detail}")
+            yield {"event": "error", "status_code": http_exc.status_code, "detail": http_exc.detail}
+        except Exception as e:
+            self._remove_partial_report(file_path)
+            print(f"--- Analysis Failed (Unexpected Error) --- Error: {str(e)}\n{traceback.format_exc()}")
+            yield {"event": "error", "status_code": 500, "detail": f"Internal server error during analysis: {str(e)}"}
+
+    async def _aprepare_report_data(self, sql_prompt: str, use_cache: bool) -> Tuple[str, Optional[str], Any, Optional[str]]:
+        """
+        Steps 0-5 of the async pipeline: get the SQL, run it and format the rows.
+        Returns the SQL, the reused SQL if any, the capped query result and the
+        data string (result and data string are None when RESTRICTED).
+        """
+        # 0. Reuse the SQL of a near-duplicate earlier prompt
+        reuse_match = await asyncio.to_thread(self._find_similar_prompt, sql_prompt) if use_cache else None
+        reused_sql = reuse_match.sql_statement if reuse_match and reuse_match.reusable else None
+        local_tables = None if reused_sql else await asyncio.to_thread(self._select_tables_locally, sql_prompt)
+        if reused_sql:
+            print(f"Reusing SQL of similar prompt '{reuse_match.prompt}' (score {reuse_match.score:.2f})")
+            sql_query_string = reused_sql
+            schema_to_pass, final_sql_prompt = self._prepare_schema(sql_prompt, None)
+        elif local_tables:
+            # 1-2. Tables picked without a model call, generate from their schema
+            schema_to_pass, final_sql_prompt = self._prepare_schema(sql_prompt, local_tables)
+            final_sql_prompt = self._add_similar_prompt_example(final_sql_prompt, reuse_match)
+            print(f"Generating raw SQL query...")
+            sql_query_string = await self.sql_agent.agenerate_sql_query(
+                schema_to_pass, final_sql_prompt, self.stage_models["sql"],
+                schema_fingerprint=self.schema_fingerprint, use_cache=use_cache
+            )
+        elif not self._has_relationship_info():
+            print("No relationship graph, using full schema.")
+            schema_to_pass, final_sql_prompt = self._prepare_schema(sql_prompt, None)
+            final_sql_prompt = self._add_similar_prompt_example(final_sql_prompt, reuse_match)
+            print(f"Generating raw SQL query...")
+            sql_query_string = await self.sql_agent.agenerate_sql_query(
+                schema_to_pass, final_sql_prompt, self.stage_models["sql"],
+                schema_fingerprint=self.schema_fingerprint, use_cache=use_cache
+            )
+        else:
+            # 1-2. Select tables while SQL is generated speculatively from the full schema
+            full_schema, full_sql_prompt = self._prepare_schema(sql_prompt, None)
+            full_sql_prompt = self._add_similar_prompt_example(full_sql_prompt, reuse_match)
+            print("Attempting to identify relevant tables...")
+            table_names, speculative_sql = await asyncio.gather(
+                self._aselect_tables(sql_prompt, use_cache),
+                self._agenerate_speculative_sql(full_schema, full_sql_prompt, use_cache),
+            )
+            if speculative_sql is not None and self._covers_sql_tables(table_names, speculative_sql):
+                print("Speculative SQL only uses the selected tables, keeping it.")
+                sql_query_string = speculative_sql
+                schema_to_pass, final_sql_prompt = full_schema, full_sql_prompt
+            else:
+                schema_to_pass, final_sql_prompt = self._prepare_schema(sql_prompt, table_names)
+                final_sql_prompt = self._add_similar_prompt_example(final_sql_prompt, reuse_match)
+                print(f"Generating raw SQL query...")
+                sql_query_string = await self.sql_agent.agenerate_sql_query(
+                    schema_to_pass, final_sql_prompt, self.stage_models["sql"],
+                    schema_fingerprint=self.schema_fingerprint, use_cache=use_cache
+                )
+        print(f"SQL Agent returned: ```{sql_query_string}```")
+
+        # 3. Handle RESTRICTED Query
+        if sql_query_string == "RESTRICTED":
+            return sql_query_string, reused_sql, None, None
+
+        print("SQL query generated successfully.")
+
+        # 4. Execute the SQL Query
+        print(f"Executing SQL: {sql_query_string}")
+        try:
+            sql_query_string, capped_result = await self._arun_sql_with_retries(
+                sql_query_string, schema_to_pass, final_sql_prompt, use_cache, generated=sql_query_string != reused_sql
+            )
+            if capped_result is None:
+                return sql_query_string, reused_sql, None, None
+            query_result = capped_result.rows
+            print(f"Query execution successful ({len(query_result)} rows, truncated={capped_result.truncated}).")
+        except Exception as db_error:
+            print(f"Database execution error: {db_error}\n{traceback.format_exc()}")
+            raise HTTPException(status_code=500, detail=f"Database Error: Failed to execute query. Error: {db_error}")
+
+        # 5. Prepare Data for HTML generation
+        data_string = self.result_encoder.encode(
+            capped_result.columns, query_result, capped_result.truncated, capped_result.total_estimate
+        )
+        print("Prepared data for HTML generation.")
+        return sql_query_string, reused_sql, capped_result, data_string
+
+    def _run_sql_with_retries(self, sql_query_string: str, schema_to_pass: str, final_sql_prompt: str,
+                              use_cache: bool, generated: bool = True) -> Tuple[str, Any]:
+        """
+        Check and execute the query, regenerating it when the cost guard rejects it and
+        correcting it when the local check or the database raises, within the attempt
+        and time budgets. Returns the SQL that ran and its capped result (None when RESTRICTED).
+        generated: the query is the generate_sql_query response for final_sql_prompt, whose
+        cache entry is dropped if the query fails.
+        """
+        retries = SQLRetryBudget(self.sql_fix_cache, final_sql_prompt if generated else None)
+        while True:
+            try:
+                # Broken or unsafe SQL fails here, before a database round trip
+                checked = self.sql_checker.check(sql_query_string)
+                # Stream with a hard row cap instead of pulling the whole result into memory
+                capped_result = self.db_ops.fetch_capped_sql_query(checked.sql, use_cache=use_cache)
+                retries.succeeded()
+                return sql_query_string, capped_result
+            except QueryRejected as rejected:
+                self._evict_generated_sql(retries, schema_to_pass, use_cache)
+                retries.start_regeneration(rejected)
+                regeneration_prompt = build_regeneration_prompt(final_sql_prompt, sql_query_string, rejected.reason)
+                sql_query_string = self.sql_agent.generate_sql_query(
+                    schema_to_pass, regeneration_prompt, self.stage_models["sql"],
+                    schema_fingerprint=self.schema_fingerprint, use_cache=use_cache
+                )
+                retries.generated_prompt = regeneration_prompt
+                if sql_query_string == "RESTRICTED":
+                    return sql_query_string, None
+            except (SQLCheckFailed, ProgrammingError, DataError) as db_error:
+                self._evict_generated_sql(retries, schema_to_pass, use_cache)
+                error_message, fixed_sql = retries.start_correction(db_error, sql_query_string)
+                if fixed_sql is None:
+                    # Run in a worker so the model call is bounded by the remaining time budget
+                    correction = _CORRECTION_EXECUTOR.submit(
+                        self.sql_validator.correct_sql_statement, sql_query_string, error_message, self.stage_models["sql"], schema_to_pass
+                    )
+                    try:
+                        fixed_sql = correction.result(timeout=retries.remaining())
+                    except FutureTimeoutError:
+                        print("SQL correction ran out of time.")
+                        raise db_error
+                    except Exception as correction_error:
+                        print(f"SQL correction failed: {correction_error}")
+                        raise db_error from correction_error
+                    retries.expect_fix(error_message, sql_query_string, fixed_sql)
+                if fixed_sql == "RESTRICTED":
+                    return fixed_sql, None
+                sql_query_string = fixed_sql
+
+    async def _arun_sql_with_retries(self, sql_query_string: str, schema_to_pass: str, final_sql_prompt: str,
+                                     use_cache: bool, generated: bool = True) -> Tuple[str, Any]:
+        """Async variant of _run_sql_with_retries; the model call is bounded by the remaining time budget"""
+        retries = SQLRetryBudget(self.sql_fix_cache, final_sql_prompt if generated else None)
+        while True:
+            try:
+                checked = self.sql_checker.check(sql_query_string)
+                capped_result = await self.async_db_ops.fetch_capped_sql_query(checked.sql, use_cache=use_cache)
+                retries.succeeded()
+                return sql_query_string, capped_result
+            except QueryRejected as rejected:
+                self._evict_generated_sql(retries, schema_to_pass, use_cache)
+                retries.start_regeneration(rejected)
+                regeneration_prompt = build_regeneration_prompt(final_sql_prompt, sql_query_string, rejected.reason)
+                sql_query_string = await self.sql_agent.agenerate_sql_query(
+                    schema_to_pass, regeneration_prompt, self.stage_models["sql"],
+                    schema_fingerprint=self.schema_fingerprint, use_cache=use_cache
+                )
+                retries.generated_prompt = regeneration_prompt
+                if sql_query_string == "RESTRICTED":
+                    return sql_query_string, None
+            except (SQLCheckFailed, ProgrammingError, DataError) as db_error:
+                self._evict_generated_sql(retries, schema_to_pass, use_cache)
+                error_message, fixed_sql = retries.start_correction(db_error, sql_query_string)
+                if fixed_sql is None:
+                    try:
+                        fixed_sql = await asyncio.wait_for(
+                            self.sql_validator.acorrect_sql_statement(sql_query_string, error_message, self.stage_models["sql"], schema_to_pass),
+                            timeout=retries.remaining()
+                        )
+                    except asyncio.TimeoutError:
+                        print("SQL correction ran out of time.")
+                        raise db_error
+                    except Exception as correction_error:
+                        print(f"SQL correction failed: {correction_error}")
+                        raise db_error from correction_error
+                    retries.expect_fix(error_message, sql_query_string, fixed_sql)
+                if fixed_sql == "RESTRICTED":
+                    return fixed_sql, None
+                sql_query_string = fixed_sql
+
+    def _evict_generated_sql(self, retries: SQLRetryBudget, schema_to_pass: str, use_cache: bool) -> None:
+        """Drop the cached response that produced a failing query, so a repeated prompt asks the model again"""
+        if retries.generated_prompt is None:
+            return
+        self.sql_agent.evict_sql_query(
+            schema_to_pass, retries.generated_prompt, self.stage_models["sql"],
+            schema_fingerprint=self.schema_fingerprint, use_cache=use_cache
+        )
+        retries.generated_prompt = None
+
+    def _log_analysis_start(self, sql_prompt: str, html_prompt: str) -> None:
+        print(f"\n--- Starting Analysis ---")
+        print(f"Received SQL Prompt: {sql_prompt}")
+        print(f"Received HTML Prompt: {html_prompt}")
+
+    def _has_relationship_info(self) -> bool:
+        return self.relationship_graph is not None and self.relationship_graph.has_edges()
+
+    def _connect_tables(self, table_names: List[str]) -> List[str]:
+        """Add the tables needed to join the selected ones"""
+        if not table_names or self.relationship_graph is None:
+            return table_names
+        connected = self.relationship_graph.connect(table_names, RELATIONSHIP_MAX_JOINS)
+        # Keep names the graph does not know so the DDL lookup can report them
+        connected += [name for name in table_names if name not in connected]
+        if len(connected) > len(table_names):
+            print(f"Added join path tables: {connected[len(table_names):]}")
+        return connected
+
+    def _select_tables_locally(self, sql_prompt: str) -> Optional[List[str]]:
+        """Tables picked by the local selector, or None when the model should pick them"""
+        if not TABLE_SELECTOR_ENABLED:
+            return None
+        try:
+            selector = get_table_selector(
+                self.db_ops.get_schema_catalog(), self.db_ops.get_dimension_values,
+                exclude_tables=[self.db_ops.RELATIONSHIP_TABLE, "analysis_history", *ROLLUP_TABLE_NAMES]
+            )
+            selection = selector.select(sql_prompt)
+        except Exception as e:
+            print(f"Warning: Local table selection failed: {e}")
+            return None
+        if not selection.table_names or selection.confidence < TABLE_SELECTOR_MIN_CONFIDENCE:
+            print(f"Local table selection not confident ({selection.confidence:.2f}, {selection.table_names}), asking the model.")
+            return None
+        print(f"Tables selected locally (confidence {selection.confidence:.2f}): {selection.table_names}")
+        return self._connect_tables(selection.table_names)
+
+    async def _aselect_tables(self, sql_prompt: str, use_cache: bool):
+        """Selected and join-connected tables, or False when the step failed"""
+        try:
+            return self._connect_tables(await self.sql_agent.aget_main_table_from_prompt(
+                sql_prompt, self.relationship_graph.to_prompt_text(), self.stage_models["tables"],
+                schema_fingerprint=self.schema_fingerprint, use_cache=use_cache
+            ))
+        except Exception as e:
+            print(f"Warning: Failed during relevant table/schema step: {e}. Using full schema.")
+            return False
+
+    async def _agenerate_speculative_sql(self, schema_str: str, sql_prompt: str, use_cache: bool) -> Optional[str]:
+        if not SPECULATIVE_SQL_ENABLED:
+            return None
+        try:
+            return await self.sql_agent.agenerate_sql_query(
+                schema_str, sql_prompt, self.stage_models["sql"], schema_fingerprint=self.schema_fingerprint, use_cache=use_cache
+            )
+        except Exception as e:
+            print(f"Warning: Speculative SQL generation failed: {e}")
+            return None
+
+    def _covers_sql_tables(self, table_names, sql_query_string: str) -> bool:
+        """
+        Whether the selection agrees with SQL written against the full schema.
+        A failed or empty selection means the full schema would be used anyway.
+        """
+        if sql_query_string == "RESTRICTED" or not table_names:
+            return True
+        allowed = set(table_names) | set(ROLLUP_TABLE_NAMES)
+        # CTE names and aliases are not graph tables and are skipped
+        used = {name.lower() for name in _SQL_TABLE_PATTERN.findall(sql_query_string)} & set(self.relationship_graph.adjacency)
+        return used <= allowed
+
+    def _prepare_schema(self, sql_prompt: str, table_names) -> Tuple[str, str]:
+        """
+        Serialize the identified tables when there are any, otherwise the full schema,
+        ranked by relevance to the prompt and fitted to the token budget.
+        table_names: identified tables, None when not attempted, False when the step failed
+        Returns the schema string and the SQL prompt to send to the model.
+        """
+        schema_source = "Full Schema"
+        final_sql_prompt = sql_prompt
+        schema_tables = None
+        if table_names:
+            print(f"Identified relevant tables: {table_names}")
+            schema_tables = list(table_names)
+            if "fuel_transaction" in table_names:
+                schema_tables += self.rollup_tables
+            schema_source = f"Relevant Tables Schema ({', '.join(table_names)})"
+            # Update prompt context
+            final_sql_prompt = (
+                    f"{sql_prompt}\n\n---\n"
+                    f"Context: Relevant tables are {', '.join(table_names)}. Focus on schema below.\n---\n"
+                    f"Generate SQL based on original prompt: '{sql_prompt}'"
+               )
+        elif table_names is False:
+            schema_source = "Full Schema (Error Fallback)"
+
+        if self.schema_serializer is None:
+            return "-- Error retrieving schema --", final_sql_prompt
+        rollup_included = self.rollup_tables and (schema_tables is None or "fuel_transaction" in schema_tables)
+        schema_to_pass = self.schema_serializer.serialize(
+            sql_prompt, schema_tables, notes=get_rollup_schema_hint() if rollup_included else ""
+        )
+        print(f"Schema to be passed to LLM (Length: {len(schema_to_pass)} chars, Source: {schema_source}).")
+        return schema_to_pass, final_sql_prompt
+
+    def _find_similar_prompt(self, sql_prompt: str) -> Optional[PromptMatch]:
+        if self.prompt_index is None:
+            return None
+        try:
+            return self.prompt_index.search(sql_prompt)
+        except Exception as e:
+            print(f"Warning: Prompt reuse lookup failed: {e}")
+            return None
+
+    def _add_similar_prompt_example(self, final_sql_prompt: str, reuse_match: Optional[PromptMatch]) -> str:
+        """Give the model the SQL of a similar earlier prompt to adapt"""
+        if reuse_match is None:
+            return final_sql_prompt
+        print(f"Adapting SQL of similar prompt '{reuse_match.prompt}' (score {reuse_match.score:.2f})")
+        return (
+            f"{final_sql_prompt}\n\n---\n"
+            f"A similar earlier request was: \"{reuse_match.prompt}\"\n"
+            f"It was answered with this query:\n{reuse_match.sql_statement}\n"
+            f"Reuse it, changing only what this request asks differently (time window, filters, grouping).\n---"
+        )
+
+    def _build_analysis_history(self, sql_prompt: str, sql_query_string: str, file_path: str, explanation: str) -> AnalysisHistory:
+        return AnalysisHistory(
+            prompt=sql_prompt,
+            file_path=file_path,
+            sql_statement=sql_query_string,
+            explanation=explanation
+        )
+
+    def _record_analysis(self, sql_prompt: str, sql_query_string: str, file_path: str, explanation: str) -> None:
+        """Save a successful analysis to history and the prompt reuse index"""
+        try:
+            self.db_ops.save_analysis_history(self._build_analysis_history(sql_prompt, sql_query_string, file_path, explanation))
+            if self.prompt_index is not None:
+                self.prompt_index.add(sql_prompt, sql_query_string, datetime.now())
+        except Exception as history_error: print(f"Warning: Failed history save: {history_error}")
+
+    async def _arecord_analysis(self, sql_prompt: str, sql_query_string: str, file_path: str, explanation: str) -> None:
+        """Async variant of _record_analysis"""
+        try:
+            await self.async_db_ops.save_analysis_history(self._build_analysis_history(sql_prompt, sql_query_string, file_path, explanation))
+            if self.prompt_index is not None:
+                self.prompt_index.add(sql_prompt, sql_query_string, datetime.now())
+        except Exception as history_error: print(f"Warning: Failed history save: {history_error}")
+
+    def _get_reports_dir(self) -> str:
+        reports_dir = os.path.join(os.path.dirname(__file__), "..", "public", "reports")
+        os.makedirs(reports_dir, exist_ok=True)
+        return reports_dir
+
+    def _save_restricted_report(self) -> Tuple[str, str]:
+        """Save the restricted notice HTML for queries the agent refused"""
+        print("Query identified as RESTRICTED by agent.")
+        explanation = "Operation restricted."
+        file_name = self.file_ops.date_time_now() + "_restricted.html"
+        file_path = os.path.join(self._get_reports_dir(), file_name)
+        restricted_content = f"<html><body><h1>Operation Restricted</h1><p>{explanation}</p></body></html>"
+        self.file_ops.save_html_to_file(restricted_content, file_path)
+        return file_path, explanation
+
+    def _resolve_chart_type(self, chart_type: Optional[str], html_prompt: str, capped_result) -> Optional[str]:
+        """Chart type to render locally, or None to let the model write the HTML"""
+        if not LOCAL_CHART_RENDERER:
+            return None
+        requested = parse_chart_type(chart_type or html_prompt)
+        if chart_type and requested is None:
+            print(f"Chart type '{chart_type}' is not rendered locally, asking the model for the HTML.")
+            return None
+        return self.chart_renderer.resolve_chart_type(requested, capped_result.columns, capped_result.rows)
+
+    def _render_local_report(self, sql_prompt: str, chart_type: str, capped_result, explanation: str) -> HTMLText:
+        return HTMLText(
+            html=self.chart_renderer.render(
+                sql_prompt, capped_result.columns, capped_result.rows, chart_type, explanation, capped_result.truncated
+            ),
+            explanation=explanation,
+            file_name=f"{chart_type}_report.html",
+        )
+
+    def _get_report_file_name(self, base_file_name_suggested: str) -> str:
+        """Timestamped report file name from the model's suggestion"""
+        safe_suffix = "".join(c for c in base_file_name_suggested if c.isalnum() or c in ('-', '_')).rstrip('.')
+        if not safe_suffix: safe_suffix = "report"
+        if not safe_suffix.endswith(".html"): safe_suffix += ".html"
+        return self.file_ops.date_time_now() + "_" + safe_suffix
+
+    def _build_explanation(self, html_text_obj: HTMLText) -> str:
+        return f"--- Data / Report Explanation ---\n{html_text_obj.explanation}"
+
+    @staticmethod
+    def _append_to_report(report_file, html_chunk: str) -> None:
+        report_file.write(html_chunk)
+        report_file.flush()
+
+    def _remove_partial_report(self, file_path: Optional[str]) -> None:
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+
+    def _save_html_report(self, html_text_obj: HTMLText) -> Tuple[str, str]:
+        """Save the generated HTML report and build the final explanation"""
+        # 7. Save HTML File using data from HTMLText object
+        base_file_name = self._get_report_file_name(html_text_obj.file_name)
+        file_path = os.path.join(self._get_reports_dir(), base_file_name)
+        html_content_to_save = html_text_obj.html
+        print(f"Saving generated HTML content ({len(html_content_to_save)} bytes) to: {file_path}")
+        self.file_ops.save_html_to_file(html_content_to_save, file_path)
+
+        # 8. Prepare Final Explanation
+        full_explanation = self._build_explanation(html_text_obj)
+
+        print(f"--- Analysis Successful --- Report: {file_path}")
+        return file_path, full_explanation
@@ -4,6 +4,27 @@ import time
 from datetime import datetime
 import os
 
+STREAMING_MEDIA_TYPES = ("application/x-ndjson", "text/event-stream")
+
+def write_log(req_body, status_code, res_body_str, process_time):
+    # Create logs directory if it doesn't exist
+    if not os.path.exists("logs"):
+        os.makedirs("logs")
+
+    # Get current timestamp
+    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    # Save to log file
+    with open("logs/api.log", "a") as log_file:
+        log_file.write(
+            f"[{current_time}]\n"
+            f"Request Body: {req_body}\n"
+            f"Response Status Code: {status_code}\n"
+            f"Response Body: {res_body_str}\n"
+            f"Processing Time: {process_time:.4f} seconds\n"
+            f"-------------------------\n"
+        )
+
 def setup_logging_middleware(app):
     async def middleware(request: Request, call_next):
         try:
@@ -15,29 +36,17 @@ def setup_logging_middleware(app):
         response = await call_next(request)
         process_time = time.perf_counter() - start_time
 
+        # Buffering a streamed body would hold it back from the client, log it without the body
+        if response.headers.get("content-type", "").startswith(STREAMING_MEDIA_TYPES):
+            write_log(req_body, response.status_code, "<streamed>", process_time)
+            return response
+
         res_body = [section async for section in response.body_iterator]
         response.body_iterator = iterate_in_threadpool(iter(res_body))
 
-        # Create logs directory if it doesn't exist
-        if not os.path.exists("logs"):
-            os.makedirs("logs")
-
         # Stringified response body object
         res_body_str = res_body[0].decode()
-        
-        # Get current timestamp
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        # Save to log file
-        with open("logs/api.log", "a") as log_file:
-            log_file.write(
-                f"[{current_time}]\n"
-                f"Request Body: {req_body}\n"
-                f"Response Status Code: {response.status_code}\n"
-                f"Response Body: {res_body_str}\n"
-                f"Processing Time: {process_time:.4f} seconds\n"
-                f"-------------------------\n"
-            )
+        write_log(req_body, response.status_code, res_body_str, process_time)
 
         return response
 
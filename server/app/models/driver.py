@@ -5,5 +5,5 @@ from models.base_model import Base, BaseModel
 class Driver(Base, BaseModel):
     __tablename__ = "driver"
     driver_id = Column(Integer, primary_key=True, autoincrement=True)
-    driver_name = Column(String(100))
+    driver_name = Column(String(100), unique=True)
     transactions = relationship("FuelTransaction", back_populates="driver")
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Date, Integer, Numeric, String
+from models.base_model import Base, BaseModel
+
+class FuelTransactionRollupMixin:
+    """Aggregates of fuel_transaction per period and per vehicle, driver, station or product"""
+    period_start = Column(Date, primary_key=True)
+    dimension = Column(String(20), primary_key=True)
+    dimension_id = Column(Integer, primary_key=True)
+    total_quantity = Column(Numeric(14, 2), nullable=False)
+    total_amount = Column(Numeric(14, 2), nullable=False)
+    transaction_count = Column(Integer, nullable=False)
+    min_km = Column(Numeric(10, 1))
+    max_km = Column(Numeric(10, 1))
+
+class FuelTransactionDailyRollup(Base, BaseModel, FuelTransactionRollupMixin):
+    __tablename__ = "fuel_transaction_daily_rollup"
+
+class FuelTransactionMonthlyRollup(Base, BaseModel, FuelTransactionRollupMixin):
+    __tablename__ = "fuel_transaction_monthly_rollup"
@@ -6,6 +6,6 @@ class Product(Base, BaseModel):
     __tablename__ = "product"
 
     product_id = Column(Integer, primary_key=True, autoincrement=True)
-    product_name = Column(String(50), nullable=False)
+    product_name = Column(String(50), nullable=False, unique=True)
 
     transactions = relationship("FuelTransaction", back_populates="product")
\ No newline at end of file
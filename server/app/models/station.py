@@ -6,7 +6,7 @@ class Station(Base, BaseModel):
     __tablename__ = "station"
 
     station_id = Column(Integer, primary_key=True, autoincrement=True)
-    station_name = Column(String(100), nullable=False)
+    station_name = Column(String(100), nullable=False, unique=True)
     street_address = Column(String(255))
 
     transactions = relationship("FuelTransaction", back_populates="station")
\ No newline at end of file
@@ -6,6 +6,6 @@ class Vehicle(Base, BaseModel):
     __tablename__ = "vehicle"
 
     vehicle_id = Column(Integer, primary_key=True, autoincrement=True)
-    plate_number = Column(String(20), index=True)
+    plate_number = Column(String(20), index=True, unique=True)
 
     transactions = relationship("FuelTransaction", back_populates="vehicle")
@@ -1,4 +1,7 @@
+import json
+import asyncio
 from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
 from controllers.analysis_controller import AnalysisController
@@ -44,7 +47,7 @@ async def extract_transaction(request: Request):
             
         # Process extraction
         controller = AnalysisController()
-        result = controller.extract_and_save_fuel_transaction(
+        result = await controller.aextract_and_save_fuel_transaction(
             image_path=image_info["image_path"],
             image_info={"user_full_name": image_info["user_full_name"]}
         )
@@ -59,6 +62,34 @@ async def extract_transaction(request: Request):
             detail=f"Failed to extract transaction: {str(e)}"
         )
 
+@router.post("/extract/bulk")
+async def extract_transactions_bulk(request: Request):
+    try:
+        # Get request body
+        data = await request.json()
+        
+        # Validate required fields
+        transactions = data.get("transactions") if isinstance(data, dict) else None
+        if not isinstance(transactions, list) or not transactions:
+            raise HTTPException(
+                status_code=400,
+                detail="transactions must be a non-empty list in request body"
+            )
+            
+        # Process bulk save, invalid rows are reported in the result
+        controller = AnalysisController()
+        result = await asyncio.to_thread(controller.save_fuel_transactions_bulk, transactions)
+        
+        return result
+        
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to save transactions: {str(e)}"
+        )
+
 @router.post("/analyse")
 async def analyse_transaction(request: Request):
     # try:
@@ -72,10 +103,14 @@ async def analyse_transaction(request: Request):
     
     sql_prompt = data.get("sql_prompt")
     chart_type = data.get("chart_type")
+    # Set use_cache to false to bypass cached model responses and query results
+    use_cache = data.get("use_cache", True) is not False
     
     controller = AnalysisController()
     html_prompt = f"Visualize the data as Based on this data, generate a html page for me to visualize it. {chart_type} chart"
-    file_path, explanation = controller.retrive_and_generate_html_file(sql_prompt, html_prompt)
+    file_path, explanation = await controller.aretrive_and_generate_html_file(
+        sql_prompt, html_prompt, use_cache=use_cache, chart_type=chart_type
+    )
     
     return {
         "file_path": file_path,
@@ -89,4 +124,43 @@ async def analyse_transaction(request: Request):
     #     raise HTTPException(
     #         status_code=500,
     #         detail=f"Failed to analyse transaction: {str(e)}"
-    #     )
\ No newline at end of file
+    #     )
+
+@router.post("/analyse/stream")
+async def analyse_transaction_stream(request: Request):
+    data = await request.json()
+    if not data.get("sql_prompt") or not data.get("chart_type"):
+        raise HTTPException(
+            status_code=400,
+            detail="sql_prompt and chart_type are required in request body"
+        )
+
+    sql_prompt = data.get("sql_prompt")
+    chart_type = data.get("chart_type")
+    use_cache = data.get("use_cache", True) is not False
+
+    controller = AnalysisController()
+    html_prompt = f"Visualize the data as Based on this data, generate a html page for me to visualize it. {chart_type} chart"
+
+    async def event_lines():
+        # One JSON event per line: status, sql, html, explanation, then done or error
+        async for event in controller.astream_html_file(sql_prompt, html_prompt, use_cache=use_cache, chart_type=chart_type):
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(event_lines(), media_type="application/x-ndjson")
+
+@router.post("/schema/refresh")
+async def refresh_schema():
+    try:
+        # Reflect the database again after migrations or manual schema changes, off the event loop
+        catalog = await asyncio.to_thread(DBOps().refresh_schema_catalog)
+        return {
+            "tables": list(catalog.table_names),
+            "fingerprint": catalog.fingerprint,
+            "status": "success"
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to refresh schema: {str(e)}"
+        )
@@ -8,8 +8,8 @@ source .env
 python3 -m venv venv
 . venv/bin/activate
 python -m pip install --upgrade pip
-# pip install pytest
+pip install pytest
 pip install -r requirements.txt
 
-# # Run tests
-# pytest ./app/tests/test_analysis_controller.py -v
\ No newline at end of file
+# Run tests
+pytest ./app/tests -v
\ No newline at end of file
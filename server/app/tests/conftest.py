@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app imports its packages from server/app (e.g. `from utils.db_ops import DBOps`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,65 @@
+import json
+import re
+from datetime import date
+from decimal import Decimal
+
+from agents.chart_renderer import ChartRenderer, parse_chart_type
+
+ROWS = [
+    {"month": date(2024, 2, 1), "station": "North", "total": Decimal("20.5")},
+    {"month": date(2024, 1, 1), "station": "South", "total": Decimal("10")},
+]
+COLUMNS = ["month", "station", "total"]
+
+
+def test_parse_chart_type():
+    assert parse_chart_type("Show a donut chart of spend") == "doughnut"
+    assert parse_chart_type("monthly TREND please") == "line"
+    assert parse_chart_type("make it pretty") is None
+
+
+def test_resolve_chart_type():
+    renderer = ChartRenderer()
+    assert renderer.resolve_chart_type(None, COLUMNS, ROWS) == "line"
+    assert renderer.resolve_chart_type("bar", COLUMNS, ROWS) == "bar"
+    assert renderer.resolve_chart_type("scatter", COLUMNS, ROWS) == "bar"
+    assert renderer.resolve_chart_type("radar", COLUMNS, ROWS) is None
+    assert renderer.resolve_chart_type("bar", ["station"], [{"station": "North"}]) == "table"
+
+
+def test_line_chart_is_sorted_by_date():
+    config = ChartRenderer().build_chart_config("line", COLUMNS, ROWS)
+    assert config["data"]["labels"] == ["2024-01-01", "2024-02-01"]
+    assert config["data"]["datasets"][0]["data"] == [10.0, 20.5]
+
+
+def test_render_escapes_text_and_script():
+    rows = [{"station": "<b>North</b>", "total": 1}, {"station": "</script>", "total": 2}]
+    page = ChartRenderer().render("Spend <by> station", ["station", "total"], rows, "bar", explanation="a < b")
+    assert "<title>Spend &lt;by&gt; station</title>" in page
+    assert "<td>&lt;b&gt;North&lt;/b&gt;</td>" in page
+    assert "a &lt; b" in page
+    config = re.search(r"new Chart\(document.getElementById\(\"chart\"\), (.*)\);", page).group(1)
+    assert "</script>" not in config
+    assert json.loads(config)["data"]["labels"] == ["<b>North</b>", "</script>"]
+
+
+def test_pie_folds_small_slices_into_other():
+    rows = [{"station": f"S{index}", "total": index} for index in range(1, 21)]
+    config = ChartRenderer().build_chart_config("pie", ["station", "total"], rows)
+    labels = config["data"]["labels"]
+    values = config["data"]["datasets"][0]["data"]
+    assert len(labels) == 12
+    assert labels[:3] == ["S20", "S19", "S18"] and labels[-1] == "Other"
+    assert values[-1] == sum(range(1, 10))
+    assert sum(values) == sum(range(1, 21))
+
+
+def test_bar_chart_is_capped_and_noted():
+    rows = [{"station": f"S{index}", "total": index} for index in range(1200)]
+    renderer = ChartRenderer()
+    config = renderer.build_chart_config("bar", ["station", "total"], rows)
+    assert len(config["data"]["labels"]) == 500
+    page = renderer.render("Spend", ["station", "total"], rows, "bar")
+    assert "chart shows the first 500 of 1200 rows" in page
+    assert "table shows the first 500 rows" in page
@@ -0,0 +1,76 @@
+from utils.dimension_cache import DimensionCache
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def one(self):
+        return self.rows[0]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class FakeConnection:
+    """Answers dimension upserts from a fixed table: key -> (id, created)"""
+    def __init__(self, rows):
+        self.rows = rows
+        self.upserts = 0
+        self.notified = []
+
+    def execute(self, statement, params=None):
+        if params is not None:
+            self.notified.append(params["payload"])
+            return FakeResult([])
+        self.upserts += 1
+        keys = [value for name, value in statement.compile().params.items() if name.startswith("station_name")]
+        if len(keys) == 1:
+            return FakeResult([self.rows[keys[0]]])
+        return FakeResult([(self.rows[key][0], key, self.rows[key][1]) for key in keys])
+
+
+def test_created_ids_are_cached_only_after_publish():
+    cache = DimensionCache()
+    connection = FakeConnection({"North": (7, True)})
+    staged = {}
+
+    assert cache.resolve(connection, "station", "North", staged) == 7
+    assert cache.get("station", "North") is None
+    assert staged == {("station", "North"): 7}
+    # A second lookup in the same transaction is served from the staged ids
+    assert cache.resolve(connection, "station", "North", staged) == 7
+    assert connection.upserts == 1
+    assert connection.notified
+
+    cache.publish(staged)
+    assert cache.get("station", "North") == 7
+    assert staged == {}
+
+
+def test_existing_ids_are_cached_immediately():
+    cache = DimensionCache()
+    connection = FakeConnection({"North": (7, False)})
+    staged = {}
+
+    assert cache.resolve(connection, "station", "North", staged) == 7
+    assert cache.get("station", "North") == 7
+    assert staged == {}
+    assert not connection.notified
+
+
+def test_rollback_drops_only_staged_ids():
+    cache = DimensionCache()
+    cache.put("station", "South", 3)
+    connection = FakeConnection({"North": (7, True), "East": (8, False)})
+    staged = {}
+
+    ids = cache.resolve_many(connection, "station", ["North", "East", "South", None], staged)
+    assert ids == {"North": 7, "East": 8, "South": 3}
+    assert staged == {("station", "North"): 7}
+
+    # The transaction rolls back: the caller discards staged without touching the cache
+    staged.clear()
+    assert cache.get("station", "North") is None
+    assert cache.get("station", "East") == 8
+    assert cache.get("station", "South") == 3
@@ -0,0 +1,28 @@
+from sqlalchemy import create_engine, text
+
+from utils.fts_indexes import extract_fts_predicates, get_fts_index_targets
+from utils.schema_catalog import SchemaCatalog
+
+
+def make_catalog() -> SchemaCatalog:
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE station (id INTEGER PRIMARY KEY, name VARCHAR(100), city TEXT)"))
+        connection.execute(text("CREATE TABLE fuel_transaction (id INTEGER PRIMARY KEY, note TEXT, total_amount NUMERIC)"))
+    return SchemaCatalog.reflect(engine)
+
+
+def test_index_targets_are_text_columns():
+    catalog = make_catalog()
+    assert get_fts_index_targets(catalog) == [("fuel_transaction", "note"), ("station", "name"), ("station", "city")]
+    assert get_fts_index_targets(catalog, exclude_tables=["fuel_transaction"]) == [("station", "name"), ("station", "city")]
+
+
+def test_extract_predicates_resolves_aliases():
+    sql = (
+        "SELECT s.name FROM station s JOIN fuel_transaction ft ON ft.id = s.id "
+        "WHERE to_tsvector('english', s.city) @@ plainto_tsquery('english', 'oslo') "
+        "AND to_tsvector('english', note) @@ plainto_tsquery('english', 'diesel')"
+    )
+    predicates = extract_fts_predicates(sql, make_catalog())
+    assert [(predicate.table, predicate.column) for predicate in predicates] == [("station", "city"), ("fuel_transaction", "note")]
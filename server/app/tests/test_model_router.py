@@ -0,0 +1,118 @@
+import time
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGenerationChunk
+
+from agents.model_router import ModelRouter, RouterState, StubChatModel
+
+MESSAGES = [HumanMessage(content="ping")]
+
+
+class BrokenStreamChatModel(StubChatModel):
+    """Streams one chunk, then loses the connection"""
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        yield ChatGenerationChunk(message=AIMessageChunk(content="partial"))
+        raise ConnectionError(f"{self.model_name}: stream interrupted")
+
+
+def stub(name: str, **kwargs) -> StubChatModel:
+    options = {"latency": 0.01, "tail_rate": 0.0, "response": name, "seed": 1}
+    options.update(kwargs)
+    return StubChatModel(model_name=name, **options)
+
+
+def make_router(backends, cooldown: float = 60.0, **kwargs) -> ModelRouter:
+    state = RouterState(list(backends), failure_threshold=3, cooldown=cooldown)
+    kwargs.setdefault("hedge_enabled", False)
+    return ModelRouter(backends, "test", state, **kwargs)
+
+
+def test_circuit_opens_after_failure_threshold():
+    failing = stub("a")
+    # b is slow enough that a stays ranked first, however high its error rate, until its circuit opens
+    router = make_router({"a": failing, "b": stub("b", latency=0.2)})
+    assert router.invoke(MESSAGES).content == "a"
+    failing.error_rate = 1.0
+    for attempt in range(3):
+        assert router.invoke(MESSAGES).content == "b"
+        assert router.get_stats()["backends"]["a"]["state"] == ("open" if attempt == 2 else "closed")
+    # Open circuit: a is skipped, so its failure count stays put
+    assert router.invoke(MESSAGES).content == "b"
+    assert router.get_stats()["backends"]["a"]["consecutive_failures"] == 3
+
+
+def test_half_open_trial_closes_or_reopens_circuit():
+    backend = stub("a", error_rate=1.0)
+    router = make_router({"a": backend}, cooldown=0.05)
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            asyncio.run(router.ainvoke(MESSAGES))
+    assert router.state.breakers["a"].state == "open"
+
+    # A failed trial reopens the circuit for another cooldown
+    time.sleep(0.06)
+    with pytest.raises(ConnectionError):
+        asyncio.run(router.ainvoke(MESSAGES))
+    assert router.state.breakers["a"].state == "open"
+
+    backend.error_rate = 0.0
+    time.sleep(0.06)
+    assert asyncio.run(router.ainvoke(MESSAGES)).content == "a"
+    assert router.state.breakers["a"].state == "closed"
+    assert router.state.breakers["a"].error_rate == 0.0
+
+
+def test_hedge_fires_after_p95_delay():
+    slow = stub("a")
+    router = make_router({"a": slow, "b": stub("b")}, hedge_enabled=True, hedge_min_samples=5, hedge_min_delay=0.05)
+    for _ in range(5):
+        asyncio.run(router.ainvoke(MESSAGES))
+    assert router.get_hedge_delay("a") == pytest.approx(0.05, abs=0.02)
+
+    slow.latency = 1.0
+    started = time.monotonic()
+    assert asyncio.run(router.ainvoke(MESSAGES)).content == "b"
+    assert time.monotonic() - started < 0.5
+    stats = router.get_stats()
+    assert (stats["hedges"], stats["hedge_wins"]) == (1, 1)
+    # The cancelled request is neither a failure nor a latency sample
+    assert stats["backends"]["a"]["consecutive_failures"] == 0
+    assert len(router.state.get_latencies("test", "a")) == 5
+
+
+def test_sync_hedge_fires_after_p95_delay():
+    slow = stub("a")
+    router = make_router({"a": slow, "b": stub("b")}, hedge_enabled=True, hedge_min_samples=5, hedge_min_delay=0.05)
+    for _ in range(5):
+        router.invoke(MESSAGES)
+    slow.latency = 0.5
+    assert router.invoke(MESSAGES).content == "b"
+    assert router.get_stats()["hedge_wins"] == 1
+
+
+async def collect(router: ModelRouter):
+    return [chunk.content async for chunk in router.astream(MESSAGES)]
+
+
+def test_astream_fails_over_before_first_chunk():
+    router = make_router({"a": stub("a", error_rate=1.0), "b": stub("b")})
+    assert asyncio.run(collect(router)) == ["b"]
+    assert router.state.breakers["a"].consecutive_failures == 1
+
+
+def test_astream_does_not_fail_over_after_first_chunk():
+    chunks = []
+
+    async def consume(router):
+        async for chunk in router.astream(MESSAGES):
+            chunks.append(chunk.content)
+
+    router = make_router({"a": BrokenStreamChatModel(model_name="a"), "b": stub("b")})
+    with pytest.raises(ConnectionError):
+        asyncio.run(consume(router))
+    assert chunks == ["partial"]
+    assert router.state.breakers["a"].consecutive_failures == 1
+    assert router.state.get_latencies("test", "b") == []
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+from agents.prompt_index import PromptSQLIndex, get_entity_tokens, get_time_tokens, tokenize
+
+VOCABULARY = frozenset("fuel transaction vehicle driver product station name total amount quantity".split())
+TOTAL_PROMPT = "Show the amount spent by every vehicle that refueled at Total station last month grouped by driver and product"
+TOTAL_SQL = "SELECT driver_name, product_name, SUM(total_amount) FROM fuel_transaction WHERE station_name = 'Total' GROUP BY 1, 2"
+
+
+def make_index() -> PromptSQLIndex:
+    index = PromptSQLIndex(vocabulary=VOCABULARY)
+    index.add(TOTAL_PROMPT, TOTAL_SQL)
+    return index
+
+
+def test_tokenize_folds_synonyms_and_stopwords():
+    assert tokenize("Show the cost per car for the past 3 months") == ["amount", "vehicle", "last", "3", "month"]
+    assert get_time_tokens(tokenize("spend last month in 2024")) == frozenset({"last", "month", "2024"})
+
+
+def test_entity_tokens():
+    assert get_entity_tokens("fuel amount per vehicle last month", VOCABULARY) == frozenset()
+    assert get_entity_tokens("fuel amount at Caltex station", VOCABULARY) == frozenset({"caltex"})
+    assert get_entity_tokens("trips of vehicle B1234XYZ", VOCABULARY) == frozenset({"trips", "b1234xyz"})
+    assert get_entity_tokens("amount where product is 'Diesel Plus'", VOCABULARY) == frozenset({"'diesel plus'"})
+
+
+def test_same_prompt_is_reusable():
+    match = make_index().search(TOTAL_PROMPT)
+    assert match.reusable and match.sql_statement == TOTAL_SQL
+
+
+def test_rephrased_prompt_is_reusable():
+    match = make_index().search(
+        "show the amount spent by every vehicle that refueled at Total station last month, grouped by driver and product"
+    )
+    assert match.reusable
+
+
+def test_other_entity_is_only_an_example():
+    match = make_index().search(TOTAL_PROMPT.replace("Total", "Caltex"))
+    assert match is not None and match.score >= 0.9
+    assert not match.reusable
+
+
+def test_other_time_window_is_only_an_example():
+    match = make_index().search(TOTAL_PROMPT.replace("last month", "this year"))
+    assert match is not None and not match.reusable
+
+
+def test_stale_date_literals_are_not_reused():
+    index = PromptSQLIndex(vocabulary=VOCABULARY)
+    sql = "SELECT SUM(total_amount) FROM fuel_transaction WHERE transaction_date >= '2024-01-01'"
+    index.add("fuel amount this month", sql, datetime.now() - timedelta(days=40))
+    assert not index.search("fuel amount this month").reusable
+    index.add("fuel amount this month", sql, datetime.now())
+    assert index.search("fuel amount this month").reusable
+
+
+def test_unrelated_prompt_has_no_match():
+    assert make_index().search("list every station name") is None
@@ -0,0 +1,61 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from utils.relationship_graph import RelationshipGraph
+from utils.schema_catalog import SchemaCatalog
+
+RELATIONSHIP_DATA = {
+    "table_name": ["maintenance", "fuel_transaction"],
+    "related_tables": ["vehicle via plate_number", "vehicle, station"],
+    "description": ["Workshop visits\n of   each vehicle", "Receipts"],
+}
+
+
+@pytest.fixture(scope="module")
+def catalog() -> SchemaCatalog:
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE vehicle (vehicle_id INTEGER PRIMARY KEY, plate_number TEXT)"))
+        connection.execute(text("CREATE TABLE station (station_id INTEGER PRIMARY KEY, station_name TEXT)"))
+        connection.execute(text(
+            "CREATE TABLE fuel_transaction (transaction_id INTEGER PRIMARY KEY, "
+            "vehicle_id INTEGER REFERENCES vehicle (vehicle_id), station_id INTEGER REFERENCES station (station_id))"
+        ))
+        connection.execute(text("CREATE TABLE maintenance (maintenance_id INTEGER PRIMARY KEY, plate_number TEXT)"))
+        connection.execute(text("CREATE TABLE analysis_history (analysis_id INTEGER PRIMARY KEY)"))
+    return SchemaCatalog.reflect(engine)
+
+
+@pytest.fixture(scope="module")
+def graph(catalog) -> RelationshipGraph:
+    return RelationshipGraph.build(catalog, RELATIONSHIP_DATA, exclude_tables=["analysis_history"])
+
+
+def test_merges_foreign_keys_and_relationship_rows(graph):
+    assert graph.has_edges()
+    assert "analysis_history" not in graph.adjacency
+    assert graph.adjacency["vehicle"] == {"fuel_transaction", "maintenance"}
+    assert graph.adjacency["station"] == {"fuel_transaction"}
+    assert graph.join_columns[("fuel_transaction", "vehicle")] == "vehicle_id"
+    assert graph.notes["maintenance"] == "Workshop visits of each vehicle"
+
+
+def test_no_edges_without_keys_or_metadata(catalog):
+    tables = {name: catalog.tables[name] for name in ("maintenance", "station")}
+    assert not RelationshipGraph.build(SchemaCatalog(tables)).has_edges()
+
+
+def test_connect_adds_join_path_within_max_joins(graph):
+    assert graph.connect(["station", "maintenance"], max_joins=3) == ["station", "maintenance", "fuel_transaction", "vehicle"]
+    assert graph.connect(["station", "maintenance"], max_joins=2) == ["station", "maintenance"]
+    assert graph.connect(["station", "trips"], max_joins=3) == ["station"]
+    assert graph.reachable("station", 2) == {"station": 0, "fuel_transaction": 1, "vehicle": 2}
+
+
+def test_prompt_text_writes_each_edge_once(graph):
+    assert graph.to_prompt_text() == (
+        "fuel_transaction: station(station_id), vehicle(vehicle_id) # Receipts\n"
+        "maintenance: vehicle # Workshop visits of each vehicle\n"
+        "station\n"
+        "vehicle"
+    )
@@ -0,0 +1,74 @@
+import os
+import asyncio
+
+from agents.schemas.html_text import HTMLText
+from agents.tools.file_ops import FileOps
+from controllers.analysis_controller import AnalysisController
+
+CHUNKS = ["<html><body>", "<h1>Spend</h1>", "</body></html>"]
+
+
+class StreamingAgent:
+    """Streams the HTML in chunks, recording the report file as it stood before each chunk"""
+
+    def __init__(self, reports_dir):
+        self.reports_dir = reports_dir
+        self.seen_on_disk = []
+
+    async def astream_html_text(self, html_prompt, data_string, model, use_cache=True):
+        for chunk in CHUNKS:
+            self.seen_on_disk.append(self.read_report())
+            yield "html", chunk
+        yield "explanation", "Spend by month."
+        yield "result", HTMLText(html="".join(CHUNKS), explanation="Spend by month.", file_name="spend")
+
+    def read_report(self) -> str:
+        names = os.listdir(self.reports_dir)
+        if not names:
+            return ""
+        with open(os.path.join(self.reports_dir, names[0]), encoding="utf-8") as report_file:
+            return report_file.read()
+
+
+def make_controller(reports_dir) -> AnalysisController:
+    controller = AnalysisController.__new__(AnalysisController)
+    controller.sql_agent = StreamingAgent(reports_dir)
+    controller.file_ops = FileOps()
+    controller.stage_models = {"report": None}
+
+    async def prepare_report_data(sql_prompt, use_cache):
+        return "SELECT 1", "SELECT 1", None, "month,total"
+
+    controller._aprepare_report_data = prepare_report_data
+    controller._resolve_chart_type = lambda chart_type, html_prompt, capped_result: None
+    controller._get_reports_dir = lambda: str(reports_dir)
+    return controller
+
+
+async def collect(controller):
+    return [event async for event in controller.astream_html_file("spend", "chart of spend")]
+
+
+def test_html_is_written_as_it_streams(tmp_path):
+    controller = make_controller(tmp_path)
+    events = asyncio.run(collect(controller))
+    assert controller.sql_agent.seen_on_disk == ["", "<html><body>", "<html><body><h1>Spend</h1>"]
+    assert [event["delta"] for event in events if event["event"] == "html"] == CHUNKS
+    done = events[-1]
+    assert done["event"] == "done" and done["status"] == "success"
+    assert os.listdir(tmp_path) == [os.path.basename(done["file_path"])]
+    with open(done["file_path"], encoding="utf-8") as report_file:
+        assert report_file.read() == "".join(CHUNKS)
+
+
+def test_partial_report_is_removed_on_error(tmp_path):
+    controller = make_controller(tmp_path)
+
+    async def failing_stream(html_prompt, data_string, model, use_cache=True):
+        yield "html", CHUNKS[0]
+        raise RuntimeError("model went away")
+
+    controller.sql_agent.astream_html_text = failing_stream
+    events = asyncio.run(collect(controller))
+    assert events[-1]["event"] == "error"
+    assert os.listdir(tmp_path) == []
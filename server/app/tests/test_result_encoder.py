@@ -0,0 +1,38 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from utils.result_encoder import ResultEncoder, format_value
+
+
+def test_format_value():
+    assert format_value(None) == ""
+    assert format_value(Decimal("12.50")) == "12.5"
+    assert format_value(3.0) == "3"
+    assert format_value(date(2024, 5, 1)) == "2024-05-01"
+    assert format_value("two\nlines") == "two lines"
+
+
+def test_small_result_is_plain_csv():
+    encoded = ResultEncoder().encode(["plate", "total"], [{"plate": "AB-1", "total": Decimal("10.5")}, {"plate": "C,D", "total": None}])
+    assert encoded.splitlines() == ["Result: 2 rows, 2 columns", "Rows (CSV):", "plate,total", "AB-1,10.5", '"C,D",']
+
+
+def test_large_result_is_summarized_within_budget():
+    start = date(2024, 1, 1)
+    rows = [
+        {"day": start + timedelta(days=index), "station": f"S{index % 3}", "amount": float(index)}
+        for index in range(400)
+    ]
+    encoder = ResultEncoder(token_budget=600)
+    encoded = encoder.encode(["day", "station", "amount"], rows, truncated=True, total_estimate=1000)
+    lines = encoded.splitlines()
+    assert lines[0] == "Result: 400+ rows (about 1000 in total), 3 columns"
+    assert "- amount (numeric): count 400, min 0, max 399, mean 199.5, sum 79800" in lines
+    assert any(line.startswith("- station (text): count 400, 3 distinct") for line in lines)
+    assert "  by month: month, rows, sum amount" in lines
+    assert any(line.startswith("Rows (CSV, first ") for line in lines)
+    assert len(lines) < 400
+
+
+def test_empty_result():
+    assert ResultEncoder().encode(["id"], []) == "No data returned from query."
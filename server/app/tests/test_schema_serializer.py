@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from utils import schema_serializer
+from utils.schema_catalog import SchemaCatalog
+from utils.schema_serializer import SchemaSerializer, count_tokens
+
+PROMPT = "fuel transaction total amount"
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # Count with the built-in estimate so budgets do not depend on the tiktoken download
+    monkeypatch.setattr(schema_serializer, "_encoding", False)
+
+
+@pytest.fixture(scope="module")
+def catalog() -> SchemaCatalog:
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE vehicle (vehicle_id INTEGER PRIMARY KEY, plate_number VARCHAR(20) NOT NULL)"))
+        connection.execute(text("CREATE TABLE station (station_id INTEGER PRIMARY KEY, station_name TEXT)"))
+        connection.execute(text(
+            "CREATE TABLE fuel_transaction (transaction_id INTEGER PRIMARY KEY, "
+            "vehicle_id INTEGER REFERENCES vehicle (vehicle_id), station_id INTEGER REFERENCES station (station_id), "
+            "transaction_date DATE, quantity NUMERIC, unit_price NUMERIC, total_amount NUMERIC, "
+            "previous_km NUMERIC, actual_km NUMERIC, consumption_rate NUMERIC)"
+        ))
+    return SchemaCatalog.reflect(engine)
+
+
+def table_lines(schema_text: str):
+    return [line for line in schema_text.split("\n") if not line.startswith("--")]
+
+
+def test_full_schema_ranked_by_prompt(catalog):
+    lines = SchemaSerializer(catalog, token_budget=4000).serialize(PROMPT).split("\n")
+    assert [line.split("(")[0] for line in lines] == ["fuel_transaction", "station", "vehicle"]
+    assert "vehicle_id int -> vehicle.vehicle_id" in lines[0]
+    assert lines[2] == "vehicle(vehicle_id int PK, plate_number varchar(20))"
+
+
+def test_tables_are_shortened_or_omitted_within_budget(catalog):
+    schema_text = SchemaSerializer(catalog, token_budget=70).serialize(PROMPT)
+    lines = table_lines(schema_text)
+    assert sum(count_tokens(line) + 1 for line in lines) <= 70
+    # Key columns and the columns the prompt names are kept, the rest are counted
+    assert lines == [
+        "fuel_transaction(transaction_id int PK, vehicle_id int -> vehicle.vehicle_id, "
+        "station_id int -> station.station_id, transaction_date date?, total_amount numeric?, ...5 more)"
+    ]
+    assert schema_text.endswith("-- omitted for length: station, vehicle")
+
+
+def test_notes_are_kept_and_count_against_budget(catalog):
+    notes = "-- match names with ILIKE"
+    schema_text = SchemaSerializer(catalog, token_budget=70).serialize(PROMPT, notes=notes)
+    assert schema_text.endswith(notes)
+    assert sum(count_tokens(line) + 1 for line in table_lines(schema_text)) <= 70 - count_tokens(notes) - 1
+
+
+def test_only_known_requested_tables_once(catalog):
+    schema_text = SchemaSerializer(catalog).serialize("x", ["station", "trips", "station"])
+    assert schema_text == "station(station_id int PK, station_name text?)"
@@ -0,0 +1,94 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from utils.schema_catalog import SchemaCatalog
+from utils.sql_checker import SQLCheckFailed, SQLChecker
+
+
+@pytest.fixture(scope="module")
+def checker() -> SQLChecker:
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE vehicle (id INTEGER PRIMARY KEY, plate TEXT)"))
+        connection.execute(text(
+            "CREATE TABLE fuel_transaction (id INTEGER PRIMARY KEY, vehicle_id INTEGER REFERENCES vehicle (id), "
+            "transaction_date DATE, total_amount NUMERIC)"
+        ))
+    return SQLChecker(SchemaCatalog.reflect(engine), max_limit=1000)
+
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM fuel_transaction",
+    "UPDATE vehicle SET plate = 'x'",
+    "DROP TABLE vehicle",
+    "SELECT * INTO backup FROM vehicle",
+    "SELECT * FROM vehicle FOR UPDATE",
+    "SELECT pg_sleep(10)",
+    "WITH gone AS (DELETE FROM vehicle RETURNING id) SELECT id FROM gone",
+])
+def test_rejects_writes_and_blocked_functions(checker, sql):
+    with pytest.raises(SQLCheckFailed):
+        checker.check(sql)
+
+
+def test_rejects_multiple_statements(checker):
+    with pytest.raises(SQLCheckFailed, match="single statement"):
+        checker.check("SELECT id FROM vehicle; SELECT id FROM fuel_transaction")
+
+
+def test_rejects_unknown_names(checker):
+    with pytest.raises(SQLCheckFailed, match='relation "trips" does not exist'):
+        checker.check("SELECT id FROM trips")
+    with pytest.raises(SQLCheckFailed, match='column "amount" does not exist'):
+        checker.check("SELECT amount FROM fuel_transaction")
+    with pytest.raises(SQLCheckFailed, match="column ft.amount does not exist"):
+        checker.check("SELECT ft.amount FROM fuel_transaction ft")
+
+
+def test_adds_and_clamps_limit(checker):
+    added = checker.check("SELECT id FROM vehicle")
+    assert added.limited and added.sql.endswith("LIMIT 1000")
+    clamped = checker.check("SELECT id FROM vehicle LIMIT 5000")
+    assert clamped.limited and clamped.sql.endswith("LIMIT 1000")
+    kept = checker.check("SELECT id FROM vehicle LIMIT 10")
+    assert not kept.limited and kept.sql == "SELECT id FROM vehicle LIMIT 10"
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT id FROM vehicle ORDER BY id DESC FETCH FIRST 10 ROWS ONLY",
+    "SELECT id FROM vehicle FETCH FIRST ROW ONLY",
+    "SELECT id FROM vehicle LIMIT 10::int",
+])
+def test_keeps_fetch_and_cast_limits(checker, sql):
+    checked = checker.check(sql)
+    assert not checked.limited and checked.sql == sql
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT id FROM vehicle LIMIT ALL",
+    "SELECT id FROM vehicle FETCH FIRST 5000 ROWS ONLY",
+    "SELECT id FROM vehicle FETCH FIRST 10 PERCENT ROWS ONLY",
+    "SELECT id FROM vehicle LIMIT (SELECT COUNT(*) FROM fuel_transaction)",
+])
+def test_wraps_limits_it_cannot_clamp(checker, sql):
+    checked = checker.check(sql)
+    assert checked.limited
+    assert checked.sql == f"SELECT * FROM ({sql}) AS _q LIMIT 1000"
+
+
+def test_accepts_table_function_alias_as_column(checker):
+    checked = checker.check(
+        "SELECT day::date, COALESCE(SUM(ft.total_amount), 0) AS total "
+        "FROM generate_series('2024-01-01'::date, '2024-01-31'::date, interval '1 day') AS day "
+        "LEFT JOIN fuel_transaction ft ON ft.transaction_date = day::date "
+        "GROUP BY 1 ORDER BY 1 LIMIT 31"
+    )
+    assert checked.tables == ("fuel_transaction",)
+
+
+def test_accepts_aliases_and_joins(checker):
+    checked = checker.check(
+        "WITH totals AS (SELECT vehicle_id, SUM(total_amount) AS spent FROM fuel_transaction GROUP BY vehicle_id) "
+        "SELECT v.plate, t.spent FROM totals t JOIN vehicle v ON v.id = t.vehicle_id ORDER BY spent DESC LIMIT 10"
+    )
+    assert set(checked.tables) == {"fuel_transaction", "vehicle"}
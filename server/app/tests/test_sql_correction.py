@@ -0,0 +1,175 @@
+import time
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError, ProgrammingError
+
+from agents.sql_fix_cache import SQLFixCache, get_db_error_message
+from controllers.analysis_controller import AnalysisController
+from utils.db_ops import DBOps
+from utils.sql_checker import SQLChecker
+
+MISSING_COLUMN = 'column "amount" does not exist'
+
+
+def make_db_error(message: str) -> ProgrammingError:
+    """A ProgrammingError shaped like the one SQLAlchemy raises for psycopg2/asyncpg"""
+    return ProgrammingError("SELECT amount FROM fuel_transaction", {}, Exception(message))
+
+
+class FakeDBOps:
+    """Fails while the query names the missing column, like Postgres would"""
+
+    def __init__(self):
+        self.executed = []
+
+    def fetch_capped_sql_query(self, sql_query, use_cache=True):
+        self.executed.append(sql_query)
+        if "total_amount" not in sql_query:
+            raise make_db_error(MISSING_COLUMN)
+        return SimpleNamespace(rows=[{"total_amount": 1}], truncated=False)
+
+
+class FakeAsyncDBOps:
+    def __init__(self):
+        self.db_ops = FakeDBOps()
+
+    async def fetch_capped_sql_query(self, sql_query, use_cache=True):
+        return self.db_ops.fetch_capped_sql_query(sql_query, use_cache)
+
+
+class RecordingValidator:
+    def __init__(self):
+        self.calls = []
+
+    def correct_sql_statement(self, sql, error_message, model, schema_str=""):
+        self.calls.append((sql, error_message))
+        return sql.replace("amount", "total_amount")
+
+    async def acorrect_sql_statement(self, sql, error_message, model, schema_str=""):
+        return self.correct_sql_statement(sql, error_message, model, schema_str)
+
+
+class RecordingSQLAgent:
+    def __init__(self):
+        self.evicted = []
+
+    def evict_sql_query(self, schema_str, prompt, model, use_cache=True, schema_fingerprint=None):
+        self.evicted.append(prompt)
+
+
+def make_controller() -> AnalysisController:
+    controller = AnalysisController.__new__(AnalysisController)
+    controller.db_ops = FakeDBOps()
+    controller.async_db_ops = FakeAsyncDBOps()
+    controller.sql_checker = SQLChecker()
+    controller.sql_validator = RecordingValidator()
+    controller.sql_agent = RecordingSQLAgent()
+    controller.sql_fix_cache = SQLFixCache()
+    controller.stage_models = {"sql": None}
+    controller.schema_fingerprint = None
+    return controller
+
+
+def test_stream_sql_query_keeps_driver_errors():
+    db_ops = DBOps()
+    engine = create_engine("sqlite://")
+    db_ops.get_db = lambda: (engine, None)
+    db_ops.query_guard.ENABLED = False
+    db_ops.query_guard.STATEMENT_TIMEOUT_MS = 0
+    with pytest.raises(DBAPIError) as error:
+        db_ops.stream_sql_query("SELECT nope FROM missing_table")
+    assert "missing_table" in get_db_error_message(error.value)
+
+
+def test_missing_column_reaches_validator():
+    controller = make_controller()
+    sql, result = controller._run_sql_with_retries("SELECT amount FROM fuel_transaction", "", "", True)
+    assert controller.sql_validator.calls == [("SELECT amount FROM fuel_transaction", MISSING_COLUMN)]
+    assert sql == "SELECT total_amount FROM fuel_transaction"
+    assert result.rows == [{"total_amount": 1}]
+
+
+def test_learned_fix_skips_validator():
+    controller = make_controller()
+    controller._run_sql_with_retries("SELECT amount FROM fuel_transaction", "", "", True)
+    controller.sql_validator.calls.clear()
+    sql, _ = controller._run_sql_with_retries("SELECT SUM(amount) FROM fuel_transaction", "", "", True)
+    assert sql == "SELECT SUM(total_amount) FROM fuel_transaction"
+    assert controller.sql_validator.calls == []
+
+
+def test_async_missing_column_reaches_validator():
+    controller = make_controller()
+    sql, _ = asyncio.run(controller._arun_sql_with_retries("SELECT amount FROM fuel_transaction", "", "", True))
+    assert sql == "SELECT total_amount FROM fuel_transaction"
+    assert len(controller.sql_validator.calls) == 1
+
+
+def test_correction_attempts_are_bounded(monkeypatch):
+    monkeypatch.setattr("controllers.analysis_controller.SQL_CORRECTION_ATTEMPTS", 2)
+    controller = make_controller()
+    controller.sql_validator.correct_sql_statement = lambda sql, error_message, model, schema_str="": sql + " "
+    with pytest.raises(ProgrammingError):
+        controller._run_sql_with_retries("SELECT amount FROM fuel_transaction", "", "", True)
+    assert len(controller.db_ops.executed) == 3
+
+
+def test_failed_generated_sql_is_evicted_once():
+    controller = make_controller()
+    controller._run_sql_with_retries("SELECT amount FROM fuel_transaction", "", "amount per day", True)
+    assert controller.sql_agent.evicted == ["amount per day"]
+
+
+def test_reused_sql_is_not_evicted():
+    controller = make_controller()
+    controller._run_sql_with_retries("SELECT amount FROM fuel_transaction", "", "amount per day", True, generated=False)
+    assert controller.sql_agent.evicted == []
+
+
+def test_restricted_correction_is_returned():
+    controller = make_controller()
+    controller.sql_validator.correct_sql_statement = lambda sql, error_message, model, schema_str="": "RESTRICTED"
+    assert controller._run_sql_with_retries("SELECT amount FROM fuel_transaction", "", "", True) == ("RESTRICTED", None)
+    assert len(controller.db_ops.executed) == 1
+
+
+def test_async_restricted_correction_is_returned():
+    controller = make_controller()
+
+    async def restricted(sql, error_message, model, schema_str=""):
+        return "RESTRICTED"
+
+    controller.sql_validator.acorrect_sql_statement = restricted
+    result = asyncio.run(controller._arun_sql_with_retries("SELECT amount FROM fuel_transaction", "", "", True))
+    assert result == ("RESTRICTED", None)
+
+
+def test_sync_correction_is_bounded_by_time_budget(monkeypatch):
+    monkeypatch.setattr("controllers.analysis_controller.SQL_CORRECTION_TIME_BUDGET", 0.1)
+    controller = make_controller()
+
+    def slow_correction(sql, error_message, model, schema_str=""):
+        time.sleep(1)
+        return sql
+
+    controller.sql_validator.correct_sql_statement = slow_correction
+    started = time.monotonic()
+    with pytest.raises(ProgrammingError):
+        controller._run_sql_with_retries("SELECT amount FROM fuel_transaction", "", "", True)
+    assert time.monotonic() - started < 0.5
+
+
+def test_validator_failure_keeps_database_error():
+    controller = make_controller()
+
+    def broken_correction(sql, error_message, model, schema_str=""):
+        raise Exception("Error validating SQL statement: model unavailable")
+
+    controller.sql_validator.correct_sql_statement = broken_correction
+    with pytest.raises(ProgrammingError) as error:
+        controller._run_sql_with_retries("SELECT amount FROM fuel_transaction", "", "", True)
+    assert get_db_error_message(error.value) == MISSING_COLUMN
+    assert "model unavailable" in str(error.value.__cause__)
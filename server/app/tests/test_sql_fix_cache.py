@@ -0,0 +1,40 @@
+from sqlalchemy.exc import ProgrammingError
+
+from agents.sql_fix_cache import SQLFixCache, SQLErrorKey, get_db_error_message, parse_sql_error
+
+
+def test_parse_sql_error():
+    assert parse_sql_error('column "ft.amount" does not exist') == SQLErrorKey("column", "amount")
+    assert parse_sql_error('relation "trips" does not exist') == SQLErrorKey("relation", "trips")
+    assert parse_sql_error("syntax error at or near \"FROM\"") is None
+
+
+def test_db_error_message_drops_statement_dump():
+    error = ProgrammingError("SELECT amount FROM fuel_transaction", {}, Exception('column "amount" does not exist'))
+    assert get_db_error_message(error) == 'column "amount" does not exist'
+
+
+def test_learns_and_applies_identifier_fix():
+    cache = SQLFixCache()
+    error = 'column "amount" does not exist'
+    assert cache.learn(error, "SELECT SUM(amount) FROM fuel_transaction", "SELECT SUM(total_amount) FROM fuel_transaction") == "total_amount"
+    fixed = cache.apply("SELECT ft.amount FROM fuel_transaction ft WHERE note = 'amount'", error)
+    assert fixed == "SELECT ft.total_amount FROM fuel_transaction ft WHERE note = 'amount'"
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_unrelated_rewrites_are_not_learned():
+    cache = SQLFixCache()
+    error = 'column "amount" does not exist'
+    assert cache.learn(error, "SELECT amount FROM fuel_transaction", "SELECT SUM(total_amount) FROM fuel_transaction") is None
+    assert cache.apply("SELECT amount FROM fuel_transaction", error) is None
+    assert cache.get_stats()["misses"] == 1
+
+
+def test_oldest_fix_is_evicted():
+    cache = SQLFixCache(max_entries=2)
+    for name in ("a", "b", "c"):
+        cache.learn(f'column "{name}" does not exist', f"SELECT {name} FROM t", f"SELECT {name}_id FROM t")
+    assert len(cache) == 2
+    assert cache.apply("SELECT a FROM t", 'column "a" does not exist') is None
+    assert cache.apply("SELECT c FROM t", 'column "c" does not exist') == "SELECT c_id FROM t"
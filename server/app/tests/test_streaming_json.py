@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from agents.streaming_json import StreamingJSONFieldParser
+
+
+def feed_in_chunks(text: str, size: int):
+    parser = StreamingJSONFieldParser()
+    deltas = []
+    for start in range(0, len(text), size):
+        deltas += parser.feed(text[start:start + size])
+    return parser, deltas
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_fields_match_json_loads_at_any_chunk_size(size):
+    document = {
+        "html": '<div class="a">café \U0001f600\n\t"quoted" \\ slash</div>',
+        "explanation": "Two\nlines",
+        "file_name": "report",
+    }
+    text = "```json\n" + json.dumps(document) + "\n```"
+    parser, deltas = feed_in_chunks(text, size)
+    assert parser.done
+    assert parser.values == document
+    streamed = {}
+    for field, delta in deltas:
+        streamed[field] = streamed.get(field, "") + delta
+    assert streamed == document
+
+
+def test_field_text_arrives_before_the_object_ends():
+    parser = StreamingJSONFieldParser()
+    assert parser.feed('{"html": "<p>Hel') == [("html", "<p>Hel")]
+    assert parser.feed('lo</p>", "expl') == [("html", "lo</p>")]
+    assert not parser.done
+
+
+def test_non_string_values_are_skipped():
+    text = '{"count": 3, "tags": ["a", "}"], "meta": {"x": "{"}, "html": "<b>ok</b>"}'
+    parser, deltas = feed_in_chunks(text, 2)
+    assert parser.done
+    assert parser.values == {"html": "<b>ok</b>"}
+    assert {field for field, _ in deltas} == {"html"}
@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from agents.table_selector import TableSelector, get_table_selector
+from utils.schema_catalog import SchemaCatalog
+
+
+@pytest.fixture(scope="module")
+def catalog() -> SchemaCatalog:
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE vehicle (vehicle_id INTEGER PRIMARY KEY, plate_number TEXT)"))
+        connection.execute(text("CREATE TABLE station (station_id INTEGER PRIMARY KEY, station_name TEXT)"))
+        connection.execute(text("CREATE TABLE driver (driver_id INTEGER PRIMARY KEY, driver_name TEXT)"))
+        connection.execute(text(
+            "CREATE TABLE fuel_transaction (transaction_id INTEGER PRIMARY KEY, "
+            "vehicle_id INTEGER REFERENCES vehicle (vehicle_id), station_id INTEGER REFERENCES station (station_id), "
+            "driver_id INTEGER REFERENCES driver (driver_id), transaction_date DATE, quantity NUMERIC, total_amount NUMERIC)"
+        ))
+        connection.execute(text("CREATE TABLE analysis_history (analysis_id INTEGER PRIMARY KEY, prompt TEXT)"))
+    return SchemaCatalog.reflect(engine)
+
+
+@pytest.fixture(scope="module")
+def selector(catalog) -> TableSelector:
+    return TableSelector(
+        catalog,
+        {"station": ["Shell Central"], "vehicle": ["B1234XYZ"]},
+        exclude_tables=["analysis_history"],
+    )
+
+
+def test_selects_tables_named_in_prompt(selector):
+    selection = selector.select("total amount per station last month")
+    assert selection.table_names == ["station", "fuel_transaction"]
+    assert selection.confidence == 1.0
+
+
+def test_matches_dimension_values(selector):
+    selection = selector.select("how much did B1234XYZ spend at Shell Central in 2024")
+    assert set(selection.table_names[:2]) == {"station", "vehicle"}
+    assert selection.scores["station"] > selection.scores["fuel_transaction"]
+
+
+def test_confidence_is_share_of_recognised_words(selector):
+    selection = selector.select("fuel quantity per driver of penguins")
+    assert selection.table_names == ["fuel_transaction", "driver"]
+    assert 0.0 < selection.confidence < 1.0
+
+
+def test_unrelated_and_excluded_prompts_select_nothing(selector):
+    assert "analysis_history" not in selector.table_names
+    for prompt in ("tell me a joke about penguins", "show the prompt history"):
+        selection = selector.select(prompt)
+        assert selection.table_names == [] and selection.confidence == 0.0
+
+
+def test_shared_selector_is_rebuilt_for_a_new_catalog(catalog):
+    loads = []
+
+    def load_dimension_values():
+        loads.append(1)
+        return {}
+
+    first = get_table_selector(catalog, load_dimension_values)
+    assert get_table_selector(catalog, load_dimension_values) is first
+    refreshed = SchemaCatalog(catalog.tables)
+    assert get_table_selector(refreshed, load_dimension_values) is not first
+    assert len(loads) == 2
@@ -0,0 +1,21 @@
+import os
+
+from utils.tiered_cache import TieredCache
+
+
+def test_delete_drops_both_tiers(tmp_path):
+    cache = TieredCache(disk_dir=str(tmp_path))
+    cache.put("key", "value")
+    cache.delete("key")
+    assert cache.get("key") is None
+    assert os.listdir(tmp_path) == []
+    cache.delete("missing")
+
+
+def test_disk_tier_is_pruned_every_interval(tmp_path):
+    cache = TieredCache(disk_dir=str(tmp_path), disk_max_entries=20)
+    assert cache.prune_interval == 2
+    for index in range(25):
+        cache.put(f"key{index}", index)
+    assert len(os.listdir(tmp_path)) <= cache.disk_max_entries + cache.prune_interval
+    assert TieredCache(disk_dir=str(tmp_path)).get("key24") == 24
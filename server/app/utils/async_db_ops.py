@@ -0,0 +1,278 @@
+import os
+from sqlalchemy import insert, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine
+from models.fuel_transaction import FuelTransaction
+from models.analysis_history import AnalysisHistory
+from utils.db_ops import DBOps, RECEIPT_DIMENSION_FIELDS
+from utils.dimension_cache import get_dimension_cache
+from utils.fuel_rollups import aggregate_rollup_rows, build_rollup_upsert_statement
+from utils.query_stream import AsyncStreamedQueryResult, apply_row_cap
+from utils.query_cache import CappedQueryResult, get_query_cache
+from utils.query_guard import QueryRejected
+from utils.schema_catalog import SchemaCatalog, get_cached_schema_catalog, set_schema_catalog
+
+# Process-wide async engines keyed by async DATABASE_URL
+_ASYNC_ENGINES = {}
+
+class AsyncDBOps:
+    """
+    Async counterpart of DBOps built on an AsyncEngine (asyncpg), so database
+    work in FastAPI and Telegram handlers does not block the event loop.
+    Configuration is shared with DBOps.
+    """
+    def __init__(self):
+        self.db_ops = DBOps()
+        self.DB_ASYNC_CONNECTION = os.getenv("DB_ASYNC_CONNECTION", "postgresql+asyncpg")
+        self.ASYNC_DATABASE_URL = make_url(self.db_ops.DATABASE_URL).set(
+            drivername=self.DB_ASYNC_CONNECTION
+        ).render_as_string(hide_password=False)
+
+    def get_engine(self):
+        """
+        Get the shared async engine, created lazily on first use
+        """
+        engine = _ASYNC_ENGINES.get(self.ASYNC_DATABASE_URL)
+        if engine is None:
+            engine = create_async_engine(
+                self.ASYNC_DATABASE_URL,
+                pool_size=self.db_ops.DB_POOL_SIZE,
+                max_overflow=self.db_ops.DB_MAX_OVERFLOW,
+                pool_timeout=self.db_ops.DB_POOL_TIMEOUT,
+                pool_recycle=self.db_ops.DB_POOL_RECYCLE,
+                pool_pre_ping=self.db_ops.DB_POOL_PRE_PING,
+            )
+            # Engine creation does not await, so setdefault keeps a single engine per URL
+            engine = _ASYNC_ENGINES.setdefault(self.ASYNC_DATABASE_URL, engine)
+        return engine
+
+    @staticmethod
+    async def dispose_engines() -> None:
+        """
+        Dispose every shared async engine and close its pooled connections
+        """
+        engines = list(_ASYNC_ENGINES.values())
+        _ASYNC_ENGINES.clear()
+        for engine in engines:
+            await engine.dispose()
+
+    async def get_schema_catalog(self) -> SchemaCatalog:
+        """
+        Get the process-wide schema catalog, reflecting through the async engine on first use
+        """
+        engine = self.get_engine()
+        catalog = get_cached_schema_catalog(engine.url)
+        if catalog is None:
+            async with engine.connect() as connection:
+                catalog = await connection.run_sync(SchemaCatalog.reflect)
+            catalog = set_schema_catalog(engine.url, catalog)
+            print(f"Schema catalog built: {len(catalog.table_names)} tables, fingerprint {catalog.fingerprint}")
+        return catalog
+
+    async def get_schema_info(self):
+        """
+        Get detailed schema information including tables, columns, and their properties
+        """
+        return (await self.get_schema_catalog()).to_schema_info()
+
+    async def get_schema_ddl(self) -> dict:
+        """
+        Get CREATE TABLE snippets of every table
+        """
+        catalog = await self.get_schema_catalog()
+        return catalog.get_ddl_by_names(catalog.table_names)
+
+    async def get_table_ddl_by_names(self, table_names) -> dict:
+        """
+        Get CREATE TABLE snippets of the given tables that exist
+        """
+        return (await self.get_schema_catalog()).get_ddl_by_names(table_names)
+
+    async def execute_sql_query(self, sql_query: str, use_cache: bool = True):
+        """
+        Execute a raw SQL query and return the result as a list of dictionaries
+        Results are served from the query cache while the data version is unchanged.
+        """
+        try:
+            async with self.get_engine().connect() as connection:
+                cache_key = await self._get_query_cache_key(connection, sql_query, "all") if use_cache else None
+                if cache_key:
+                    cached = get_query_cache().get(cache_key)
+                    if cached is not None:
+                        print("Query result served from cache")
+                        return cached
+                print(sql_query)
+                executed_sql = sql_query
+                decision = await self.check_query_cost(connection, sql_query)
+                if decision and decision.action == "limit":
+                    executed_sql = apply_row_cap(sql_query, self.db_ops.query_guard.MAX_PLAN_ROWS)
+                await self.set_statement_timeout(connection)
+                result = await connection.execute(text(executed_sql))
+                column_names = list(result.keys())
+                result_list = [dict(zip(column_names, row)) for row in result.fetchall()]
+                if executed_sql != sql_query:
+                    result_list = result_list[:self.db_ops.query_guard.MAX_PLAN_ROWS]
+            if cache_key:
+                get_query_cache().put(cache_key, result_list)
+            return result_list
+        except (QueryRejected, DBAPIError):
+            raise
+        except Exception as e:
+            raise Exception(f"Error executing SQL query: {str(e)}")
+
+    async def fetch_capped_sql_query(self, sql_query: str, max_rows: int = None, use_cache: bool = True) -> CappedQueryResult:
+        """
+        Run a query through stream_sql_query and collect at most max_rows rows.
+        Results are served from the query cache while the data version is unchanged.
+        """
+        max_rows = max_rows or self.db_ops.SQL_MAX_RESULT_ROWS
+        cache_key = None
+        if use_cache:
+            async with self.get_engine().connect() as connection:
+                cache_key = await self._get_query_cache_key(connection, sql_query, max_rows)
+            if cache_key:
+                cached = get_query_cache().get(cache_key)
+                if cached is not None:
+                    print("Query result served from cache")
+                    return cached
+        async with await self.stream_sql_query(sql_query, max_rows) as streamed_result:
+            rows = await streamed_result.fetch_all()
+        result = CappedQueryResult(streamed_result.columns, rows, streamed_result.truncated, streamed_result.total_estimate)
+        if cache_key:
+            get_query_cache().put(cache_key, result)
+        return result
+
+    async def _get_query_cache_key(self, connection, sql_query: str, variant):
+        if not self.db_ops.QUERY_CACHE_ENABLED:
+            return None
+        try:
+            data_version = (await connection.execute(text(self.db_ops.QUERY_CACHE_VERSION_QUERY))).scalar()
+        except Exception as e:
+            print(f"Warning: Query cache disabled for this query, data version unavailable: {e}")
+            await connection.rollback()
+            return None
+        return get_query_cache().make_key(sql_query, data_version, variant)
+
+    async def stream_sql_query(self, sql_query: str, max_rows: int = None, chunk_size: int = None) -> AsyncStreamedQueryResult:
+        """
+        Execute a raw SQL query with a server-side cursor and a hard row cap pushed
+        into the query. Returns an AsyncStreamedQueryResult yielding chunks of dictionaries.
+        """
+        max_rows = max_rows or self.db_ops.SQL_MAX_RESULT_ROWS
+        chunk_size = chunk_size or self.db_ops.SQL_STREAM_CHUNK_SIZE
+        connection = await self.get_engine().connect()
+        try:
+            print(sql_query)
+            capped_sql = apply_row_cap(sql_query, max_rows)
+            decision = await self.check_query_cost(connection, capped_sql, max_rows)
+            await self.set_statement_timeout(connection)
+            result = await connection.stream(text(capped_sql), execution_options={"yield_per": chunk_size})
+            if decision:
+                async def estimate_total():
+                    return decision.plan_rows
+            else:
+                async def estimate_total():
+                    return await self.estimate_row_count(sql_query)
+            return AsyncStreamedQueryResult(connection, result, max_rows, chunk_size, estimate_total=estimate_total)
+        except (QueryRejected, DBAPIError):
+            await connection.close()
+            raise
+        except Exception as e:
+            await connection.close()
+            raise Exception(f"Error executing SQL query: {str(e)}")
+
+    async def check_query_cost(self, connection, sql_query: str, row_cap: int = None):
+        """
+        Run EXPLAIN on a query and apply the cost guard.
+        Raises QueryRejected when the estimated cost is over budget.
+        """
+        query_guard = self.db_ops.query_guard
+        if not query_guard.ENABLED:
+            return None
+        plan = (await connection.execute(text(query_guard.build_explain_sql(sql_query)))).scalar()
+        self.db_ops.record_fts_index_use(sql_query, plan, await self.get_schema_catalog())
+        return query_guard.enforce(sql_query, plan, row_cap)
+
+    async def set_statement_timeout(self, connection) -> None:
+        """
+        Limit the run time of statements in the connection's current transaction
+        """
+        if self.db_ops.query_guard.STATEMENT_TIMEOUT_MS > 0:
+            await connection.execute(
+                text("SELECT set_config('statement_timeout', :timeout, true)"),
+                {"timeout": str(self.db_ops.query_guard.STATEMENT_TIMEOUT_MS)}
+            )
+
+    async def estimate_row_count(self, sql_query: str):
+        """
+        Get the planner's row estimate for a query without running it
+        """
+        async with self.get_engine().connect() as connection:
+            plan = (await connection.execute(text(f"EXPLAIN (FORMAT JSON) {sql_query.strip().rstrip(';')}"))).scalar()
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    async def save_fuel_transaction(self, fuel_transaction, driver_name):
+        """Save fuel transaction with related records to the database"""
+        dimension_cache = get_dimension_cache()
+        # Ids of dimension rows created by this transaction, cached only once it commits
+        staged = {}
+        try:
+            async with self.get_engine().begin() as connection:
+                # Resolve related record ids from the in-process cache, upserting on a miss
+                await dimension_cache.awarm(connection)
+                dimension_ids = {}
+                for table_name, field in RECEIPT_DIMENSION_FIELDS.items():
+                    dimension_ids[table_name] = await dimension_cache.aresolve(
+                        connection, table_name, getattr(fuel_transaction, field), staged
+                    )
+                dimension_ids["driver"] = await dimension_cache.aresolve(connection, "driver", driver_name, staged)
+
+                row = self.db_ops.build_fuel_transaction_row(
+                    fuel_transaction,
+                    dimension_ids["product"],
+                    dimension_ids["station"],
+                    dimension_ids["vehicle"],
+                    dimension_ids["driver"],
+                )
+                result = await connection.execute(
+                    insert(FuelTransaction.__table__).returning(FuelTransaction.__table__.c.transaction_id), row
+                )
+                transaction_id = result.scalar_one()
+                await self.apply_fuel_rollups(connection, [row])
+            dimension_cache.publish(staged)
+            get_query_cache().bump_version()
+            return FuelTransaction(transaction_id=transaction_id, **row)
+        except Exception as e:
+            raise Exception(f"Failed to save transaction: {str(e)}")
+
+    async def apply_fuel_rollups(self, connection, rows) -> None:
+        """
+        Add fuel_transaction rows to the daily and monthly rollups in the caller's transaction
+        """
+        if not self.db_ops.FUEL_ROLLUPS_ENABLED or not rows:
+            return
+        try:
+            async with connection.begin_nested():
+                for grain, deltas in aggregate_rollup_rows(rows).items():
+                    if deltas:
+                        await connection.execute(build_rollup_upsert_statement(grain), deltas)
+        except Exception as e:
+            print(f"Warning: Failed to update fuel rollups, they will be repaired by the next rebuild: {e}")
+
+    async def save_analysis_history(self, analysis_history: AnalysisHistory):
+        """Save analysis history to the database"""
+        try:
+            async with self.get_engine().begin() as connection:
+                values = {
+                    "prompt": analysis_history.prompt,
+                    "file_path": analysis_history.file_path,
+                    "sql_statement": analysis_history.sql_statement,
+                    "explanation": analysis_history.explanation,
+                }
+                result = await connection.execute(
+                    insert(AnalysisHistory.__table__).returning(AnalysisHistory.__table__.c.analysis_id), values
+                )
+                return AnalysisHistory(analysis_id=result.scalar_one(), **values)
+        except Exception as e:
+            raise Exception(f"Failed to save analysis history: {str(e)}")
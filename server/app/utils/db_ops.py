@@ -1,6 +1,9 @@
 import os
+import threading
+from typing import Optional
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, inspect, text
+from sqlalchemy import create_engine, insert, select as sa_select, text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import sessionmaker
 from models.base_model import Base
 from models.fuel_transaction import FuelTransaction
@@ -10,6 +13,28 @@ from models.vehicle import Vehicle
 from models.driver import Driver
 from datetime import datetime
 from models.analysis_history import AnalysisHistory
+from utils.dimension_cache import DIMENSIONS, get_dimension_cache
+from utils.partition_manager import PartitionManager
+from utils.fts_indexes import build_fts_index_statement, get_fts_index_name, get_fts_index_monitor, get_fts_index_targets
+from utils.fuel_rollups import ROLLUP_MODELS, ROLLUP_TABLE_NAMES, aggregate_rollup_rows, build_rollup_rebuild_statements, build_rollup_upsert_statement
+from utils.query_stream import StreamedQueryResult, apply_row_cap
+from utils.query_cache import CappedQueryResult, get_query_cache
+from utils.query_guard import GuardDecision, QueryCostGuard, QueryRejected
+from utils.relationship_graph import RelationshipGraph, get_cached_relationship_graph, set_relationship_graph
+from utils.schema_catalog import SchemaCatalog, get_schema_catalog, invalidate_schema_catalog
+
+# Dimension natural key attribute of a receipt, per dimension table
+RECEIPT_DIMENSION_FIELDS = {
+    "product": "product_name",
+    "station": "station_name",
+    "vehicle": "plate_number",
+}
+
+# Process-wide engines keyed by DATABASE_URL. Each engine owns one connection
+# pool that is shared by every DBOps instance in the process.
+_ENGINES = {}
+_SESSION_FACTORIES = {}
+_ENGINE_LOCK = threading.Lock()
 
 class DBOps:
     def __init__(self):
@@ -23,76 +48,394 @@ class DBOps:
         self.DB_DATABASE = os.getenv("DB_DATABASE")
         
         self.DATABASE_URL = f"{self.DB_CONNECTION}://{self.DB_USERNAME}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_DATABASE}"
+        self.query_guard = QueryCostGuard()
+
+        # Connection pool settings
+        self.DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+        self.DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+        self.DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+        self.DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+        self.DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+        # Query result streaming settings
+        self.SQL_MAX_RESULT_ROWS = int(os.getenv("SQL_MAX_RESULT_ROWS", "1000"))
+        self.SQL_STREAM_CHUNK_SIZE = int(os.getenv("SQL_STREAM_CHUNK_SIZE", "500"))
+
+        # Query result cache settings
+        self.QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "true").lower() == "true"
+        self.QUERY_CACHE_VERSION_QUERY = os.getenv(
+            "QUERY_CACHE_VERSION_QUERY", "SELECT MAX(transaction_id) FROM fuel_transaction"
+        )
+
+        # Curated table relationship metadata merged into the relationship graph
+        self.RELATIONSHIP_TABLE = os.getenv("RELATIONSHIP_TABLE", "table_relationships")
+
+        # Distinct dimension values indexed by the local table selector, per table
+        self.TABLE_SELECTOR_VALUE_LIMIT = int(os.getenv("TABLE_SELECTOR_VALUE_LIMIT", "5000"))
+
+        # Bulk ingestion settings
+        self.BULK_INSERT_CHUNK_SIZE = int(os.getenv("BULK_INSERT_CHUNK_SIZE", "1000"))
+
+        # Fleet KPI rollup settings
+        self.FUEL_ROLLUPS_ENABLED = os.getenv("FUEL_ROLLUPS_ENABLED", "true").lower() == "true"
+
+        # Monthly range partitioning of fuel_transaction
+        self.FUEL_TRANSACTION_PARTITIONING = os.getenv("FUEL_TRANSACTION_PARTITIONING", "false").lower() == "true"
+        self.FUEL_PARTITION_MONTHS_AHEAD = int(os.getenv("FUEL_PARTITION_MONTHS_AHEAD", "3"))
+        self.FUEL_PARTITION_BRIN_PAGES_PER_RANGE = int(os.getenv("FUEL_PARTITION_BRIN_PAGES_PER_RANGE", "32"))
+
+        # Full-text search indexes for the to_tsvector() filters the SQL prompt asks for
+        self.FTS_INDEXES_ENABLED = os.getenv("FTS_INDEXES_ENABLED", "true").lower() == "true"
+        self.FTS_INDEX_EXCLUDE_TABLES = [
+            name.strip()
+            for name in os.getenv("FTS_INDEX_EXCLUDE_TABLES", "analysis_history,table_relationships").split(",")
+            if name.strip()
+        ] + list(ROLLUP_TABLE_NAMES)
     
     def get_db(self):
         """
-        Get database engine and session factory
+        Get the shared database engine and session factory.
+        The engine is created lazily on first use and reused by the whole process.
         """
-        engine = create_engine(self.DATABASE_URL)
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-        return engine, SessionLocal
+        engine = _ENGINES.get(self.DATABASE_URL)
+        if engine is None:
+            with _ENGINE_LOCK:
+                engine = _ENGINES.get(self.DATABASE_URL)
+                if engine is None:
+                    engine = create_engine(
+                        self.DATABASE_URL,
+                        pool_size=self.DB_POOL_SIZE,
+                        max_overflow=self.DB_MAX_OVERFLOW,
+                        pool_timeout=self.DB_POOL_TIMEOUT,
+                        pool_recycle=self.DB_POOL_RECYCLE,
+                        pool_pre_ping=self.DB_POOL_PRE_PING,
+                    )
+                    _SESSION_FACTORIES[self.DATABASE_URL] = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+                    _ENGINES[self.DATABASE_URL] = engine
+        return engine, _SESSION_FACTORIES[self.DATABASE_URL]
     
     def init_db(self):
         """
         Initialize the database by creating tables defined in the models
         """
-        engine = create_engine(self.DATABASE_URL)
+        engine, SessionLocal = self.get_db()
         Base.metadata.create_all(bind=engine)
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        self.sync_id_sequences()
+        self.ensure_dimension_unique_keys()
+        if self.FUEL_TRANSACTION_PARTITIONING:
+            self.ensure_fuel_transaction_partitions()
+        if self.FUEL_ROLLUPS_ENABLED:
+            self.rebuild_fuel_rollups()
+        invalidate_schema_catalog()
+        if self.FTS_INDEXES_ENABLED:
+            self.ensure_fts_indexes()
         return engine, SessionLocal
+
+    def sync_id_sequences(self) -> dict[str, int]:
+        """
+        Migrate primary keys to database-allocated ids.
+        Attaches a sequence to every model primary key that has none and moves
+        each sequence past the current max id so existing rows never collide.
+        """
+        engine, _ = self.get_db()
+        next_ids = {}
+        with engine.begin() as connection:
+            for table in Base.metadata.sorted_tables:
+                pk_columns = list(table.primary_key.columns)
+                if len(pk_columns) != 1:
+                    continue
+                table_name = table.name
+                column_name = pk_columns[0].name
+                sequence_name = connection.execute(
+                    text("SELECT pg_get_serial_sequence(:table_name, :column_name)"),
+                    {"table_name": table_name, "column_name": column_name}
+                ).scalar()
+                if sequence_name is None:
+                    sequence_name = f"{table_name}_{column_name}_seq"
+                    connection.execute(text(f"CREATE SEQUENCE IF NOT EXISTS {sequence_name} OWNED BY {table_name}.{column_name}"))
+                    connection.execute(text(f"ALTER TABLE {table_name} ALTER COLUMN {column_name} SET DEFAULT nextval('{sequence_name}')"))
+                next_ids[table_name] = connection.execute(
+                    text(f"SELECT setval('{sequence_name}', COALESCE((SELECT MAX({column_name}) FROM {table_name}), 0) + 1, false)")
+                ).scalar()
+        print("Synced id sequences:", next_ids)
+        return next_ids
+
+    def ensure_dimension_unique_keys(self) -> None:
+        """
+        Migrate existing dimension tables to a unique index on their natural key,
+        which the ON CONFLICT upsert of the dimension cache relies on.
+        """
+        engine, _ = self.get_db()
+        for table_name, (_, key_column) in DIMENSIONS.items():
+            try:
+                with engine.begin() as connection:
+                    has_unique_index = connection.execute(
+                        text(
+                            "SELECT 1 FROM pg_index i "
+                            "JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0] "
+                            "WHERE i.indrelid = CAST(:table_name AS regclass) AND i.indisunique "
+                            "AND i.indnatts = 1 AND a.attname = :column_name"
+                        ),
+                        {"table_name": table_name, "column_name": key_column}
+                    ).first()
+                    if not has_unique_index:
+                        connection.execute(text(f"CREATE UNIQUE INDEX uq_{table_name}_{key_column} ON {table_name} ({key_column})"))
+                        print(f"Created unique index on {table_name}.{key_column}")
+            except Exception as e:
+                print(f"ERROR: Failed to add unique index on {table_name}.{key_column}, remove duplicate rows first: {e}")
+
+    def ensure_fuel_transaction_partitions(self) -> list:
+        """
+        Partition fuel_transaction by month, migrating an existing heap table on
+        first run, and create the partitions of the coming months.
+        Returns the names of the partitions created.
+        """
+        if not self.FUEL_TRANSACTION_PARTITIONING:
+            return []
+        engine, _ = self.get_db()
+        partition_manager = PartitionManager(
+            FuelTransaction.__table__,
+            "transaction_date",
+            months_ahead=self.FUEL_PARTITION_MONTHS_AHEAD,
+            brin_pages_per_range=self.FUEL_PARTITION_BRIN_PAGES_PER_RANGE,
+        )
+        try:
+            with engine.begin() as connection:
+                # Workers starting together must not create the same partitions
+                connection.execute(text("SELECT pg_advisory_xact_lock(hashtext('fuel_transaction_partitions'))"))
+                if partition_manager.migrate(connection):
+                    created = partition_manager.get_partitions(connection)
+                else:
+                    partition_manager.ensure_brin_index(connection)
+                    created = partition_manager.ensure_partitions(connection)
+            invalidate_schema_catalog()
+            return created
+        except Exception as e:
+            raise Exception(f"Failed to partition fuel_transaction: {str(e)}")
+
+    def ensure_fts_indexes(self) -> list:
+        """
+        Create a GIN index on to_tsvector('english', column) for every text column
+        of the schema catalog, so full-text filters in generated SQL can use an index.
+        Returns the names of the ensured indexes.
+        """
+        engine, _ = self.get_db()
+        index_names = []
+        for table_name, column_name in get_fts_index_targets(self.get_schema_catalog(), self.FTS_INDEX_EXCLUDE_TABLES):
+            try:
+                with engine.begin() as connection:
+                    connection.execute(build_fts_index_statement(table_name, column_name))
+                index_names.append(get_fts_index_name(table_name, column_name))
+            except Exception as e:
+                print(f"ERROR: Failed to create full-text index on {table_name}.{column_name}: {e}")
+        print("Ensured full-text indexes:", index_names)
+        return index_names
+
+    def get_fts_index_stats(self) -> dict:
+        return get_fts_index_monitor().get_stats()
+
+    def start_dimension_cache_listener(self) -> None:
+        """Invalidate the dimension cache when other workers insert dimension rows"""
+        engine, _ = self.get_db()
+        get_dimension_cache().start_listener(engine)
+
+    def stop_dimension_cache_listener(self) -> None:
+        get_dimension_cache().stop_listener()
+
+    def get_dimension_cache_stats(self) -> dict:
+        return get_dimension_cache().get_stats()
+
+    def get_pool_status(self) -> dict:
+        """
+        Get connection pool statistics of the shared engine for monitoring
+        """
+        engine = _ENGINES.get(self.DATABASE_URL)
+        if engine is None:
+            return {"initialized": False}
+        pool = engine.pool
+        return {
+            "initialized": True,
+            "pool_class": type(pool).__name__,
+            "pool_size": pool.size() if hasattr(pool, "size") else None,
+            "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+            "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+            "status": pool.status(),
+        }
+
+    @staticmethod
+    def dispose_engines() -> None:
+        """
+        Dispose every shared engine and close its pooled connections
+        """
+        with _ENGINE_LOCK:
+            for engine in _ENGINES.values():
+                engine.dispose()
+            _ENGINES.clear()
+            _SESSION_FACTORIES.clear()
     
+    def get_schema_catalog(self) -> SchemaCatalog:
+        """
+        Get the cached schema catalog, reflected once per process
+        """
+        engine, _ = self.get_db()
+        return get_schema_catalog(engine)
+
+    def refresh_schema_catalog(self) -> SchemaCatalog:
+        """
+        Invalidate the cached schema catalog and reflect the database again
+        """
+        invalidate_schema_catalog()
+        return self.get_schema_catalog()
+
     def get_schema_info(self):
         """
         Get detailed schema information including tables, columns, and their properties
         """
-        engine, _ = self.get_db()
-        inspector = inspect(engine)
-        schema_info = {}
-        
-        # Get all table names
-        for table_name in inspector.get_table_names():
-            columns = []
-            for column in inspector.get_columns(table_name):
-                column_info = {
-                    'name': column['name'],
-                    'type': str(column['type']),
-                    'nullable': column['nullable'],
-                    'default': str(column['default']) if column['default'] else None,
-                }
-                columns.append(column_info)
-            
-            pk = inspector.get_pk_constraint(table_name)
-            
-            foreign_keys = inspector.get_foreign_keys(table_name)
-            
-            # Store all information for this table
-            schema_info[table_name] = {
-                'columns': columns,
-                'primary_key': pk['constrained_columns'],
-                'foreign_keys': foreign_keys
-            }
-        
-        return schema_info
+        return self.get_schema_catalog().to_schema_info()
     
-    def execute_sql_query(self, sql_query: str):
+    def execute_sql_query(self, sql_query: str, use_cache: bool = True):
         """
         Execute a raw SQL query and return the result as a list of dictionaries
+        Results are served from the query cache while the data version is unchanged.
         """
         try:
             engine, _ = self.get_db()
             with engine.connect() as connection:
+                cache_key = self._get_query_cache_key(connection, sql_query, "all") if use_cache else None
+                if cache_key:
+                    cached = get_query_cache().get(cache_key)
+                    if cached is not None:
+                        print("Query result served from cache")
+                        return cached
                 print(sql_query)
-                result = connection.execute(text(sql_query))
+                executed_sql = sql_query
+                decision = self.check_query_cost(connection, sql_query)
+                if decision and decision.action == "limit":
+                    executed_sql = apply_row_cap(sql_query, self.query_guard.MAX_PLAN_ROWS)
+                self.set_statement_timeout(connection)
+                result = connection.execute(text(executed_sql))
                 column_names = result.keys()
                 data = result.fetchall()
                 
                 result_list = []
                 for row in data:
                     result_list.append(dict(zip(column_names, row)))
+                if executed_sql != sql_query:
+                    result_list = result_list[:self.query_guard.MAX_PLAN_ROWS]
+            if cache_key:
+                get_query_cache().put(cache_key, result_list)
             return result_list
+        except (QueryRejected, DBAPIError):
+            raise
         except Exception as e:
             raise Exception(f"Error executing SQL query: {str(e)}")
-    
+
+    def fetch_capped_sql_query(self, sql_query: str, max_rows: int = None, use_cache: bool = True) -> CappedQueryResult:
+        """
+        Run a query through stream_sql_query and collect at most max_rows rows.
+        Results are served from the query cache while the data version is unchanged.
+        """
+        max_rows = max_rows or self.SQL_MAX_RESULT_ROWS
+        cache_key = None
+        if use_cache:
+            engine, _ = self.get_db()
+            with engine.connect() as connection:
+                cache_key = self._get_query_cache_key(connection, sql_query, max_rows)
+            if cache_key:
+                cached = get_query_cache().get(cache_key)
+                if cached is not None:
+                    print("Query result served from cache")
+                    return cached
+        with self.stream_sql_query(sql_query, max_rows) as streamed_result:
+            rows = streamed_result.fetch_all()
+        result = CappedQueryResult(streamed_result.columns, rows, streamed_result.truncated, streamed_result.total_estimate)
+        if cache_key:
+            get_query_cache().put(cache_key, result)
+        return result
+
+    def get_data_version(self, connection):
+        """
+        Get a cheap token that changes when new data is ingested
+        """
+        return connection.execute(text(self.QUERY_CACHE_VERSION_QUERY)).scalar()
+
+    def _get_query_cache_key(self, connection, sql_query: str, variant):
+        if not self.QUERY_CACHE_ENABLED:
+            return None
+        try:
+            data_version = self.get_data_version(connection)
+        except Exception as e:
+            print(f"Warning: Query cache disabled for this query, data version unavailable: {e}")
+            connection.rollback()
+            return None
+        return get_query_cache().make_key(sql_query, data_version, variant)
+
+    def get_query_cache_stats(self) -> dict:
+        return get_query_cache().get_stats()
+
+    def stream_sql_query(self, sql_query: str, max_rows: int = None, chunk_size: int = None) -> StreamedQueryResult:
+        """
+        Execute a raw SQL query with a server-side cursor and a hard row cap pushed
+        into the query. Returns a StreamedQueryResult yielding chunks of dictionaries.
+        """
+        max_rows = max_rows or self.SQL_MAX_RESULT_ROWS
+        chunk_size = chunk_size or self.SQL_STREAM_CHUNK_SIZE
+        engine, _ = self.get_db()
+        connection = engine.connect()
+        try:
+            print(sql_query)
+            capped_sql = apply_row_cap(sql_query, max_rows)
+            decision = self.check_query_cost(connection, capped_sql, max_rows)
+            self.set_statement_timeout(connection)
+            result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(text(capped_sql))
+            # The guard's plan already holds the row estimate, no second EXPLAIN needed
+            estimate_total = (lambda: decision.plan_rows) if decision else (lambda: self.estimate_row_count(sql_query))
+            return StreamedQueryResult(connection, result, max_rows, chunk_size, estimate_total=estimate_total)
+        except (QueryRejected, DBAPIError):
+            connection.close()
+            raise
+        except Exception as e:
+            connection.close()
+            raise Exception(f"Error executing SQL query: {str(e)}")
+
+    def check_query_cost(self, connection, sql_query: str, row_cap: int = None) -> Optional[GuardDecision]:
+        """
+        Run EXPLAIN on a query and apply the cost guard.
+        Raises QueryRejected when the estimated cost is over budget.
+        """
+        if not self.query_guard.ENABLED:
+            return None
+        plan = connection.execute(text(self.query_guard.build_explain_sql(sql_query))).scalar()
+        self.record_fts_index_use(sql_query, plan, self.get_schema_catalog())
+        return self.query_guard.enforce(sql_query, plan, row_cap)
+
+    def record_fts_index_use(self, sql_query: str, plan, catalog) -> None:
+        """Report which full-text predicates of a query are served by an index"""
+        try:
+            get_fts_index_monitor().record(sql_query, plan, catalog)
+        except Exception as e:
+            print(f"Warning: Failed to check full-text index use: {e}")
+
+    def set_statement_timeout(self, connection) -> None:
+        """
+        Limit the run time of statements in the connection's current transaction
+        """
+        if self.query_guard.STATEMENT_TIMEOUT_MS > 0:
+            connection.execute(
+                text("SELECT set_config('statement_timeout', :timeout, true)"),
+                {"timeout": str(self.query_guard.STATEMENT_TIMEOUT_MS)}
+            )
+
+    def estimate_row_count(self, sql_query: str):
+        """
+        Get the planner's row estimate for a query without running it
+        """
+        engine, _ = self.get_db()
+        with engine.connect() as connection:
+            plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {sql_query.strip().rstrip(';')}")).scalar()
+        return int(plan[0]["Plan"]["Plan Rows"])
+
     def verify_tables(self):
         """
         Verify that tables were created in the database
@@ -124,83 +467,219 @@ class DBOps:
     def save_fuel_transaction(self, fuel_transaction, driver_name):
         """Save fuel transaction with related records to the database"""
         engine, SessionLocal = self.get_db()
-        last_record_ids = self.get_last_record_ids()
-        last_product_id = last_record_ids["last_product_id"]
-        last_station_id = last_record_ids["last_station_id"]
-        last_vehicle_id = last_record_ids["last_vehicle_id"] 
-        last_driver_id = last_record_ids["last_driver_id"]
-        last_transaction_id = last_record_ids["last_fuel_transaction_id"]
 
         print(driver_name)
         
+        dimension_cache = get_dimension_cache()
+        # Ids of dimension rows created by this transaction, cached only once it commits
+        staged = {}
+        
         with SessionLocal() as db:
             try:
-                # Get or create related records using helper method
-                product = self.get_or_create_record(
-                    db,
-                    Product,
-                    unique_fields={"product_name": fuel_transaction.product_name},
-                    product_id=last_product_id + 1,
-                    product_name=fuel_transaction.product_name
-                )
-                
-                station = self.get_or_create_record(
-                    db,
-                    Station,
-                    unique_fields={"station_name": fuel_transaction.station_name},
-                    station_id=last_station_id + 1,
-                    station_name=fuel_transaction.station_name
-                )
-                
-                vehicle = self.get_or_create_record(
-                    db,
-                    Vehicle,
-                    unique_fields={"plate_number": fuel_transaction.plate_number},
-                    vehicle_id=last_vehicle_id + 1,
-                    plate_number=fuel_transaction.plate_number
-                )
-                
-                driver = self.get_or_create_record(
-                    db,
-                    Driver,
-                    unique_fields={"driver_name": driver_name},
-                    driver_id=last_driver_id + 1,
-                    driver_name=driver_name
-                )
+                # Resolve related record ids from the in-process cache, upserting on a miss
+                connection = db.connection()
+                dimension_cache.warm(connection)
+                product_id = dimension_cache.resolve(connection, "product", fuel_transaction.product_name, staged)
+                station_id = dimension_cache.resolve(connection, "station", fuel_transaction.station_name, staged)
+                vehicle_id = dimension_cache.resolve(connection, "vehicle", fuel_transaction.plate_number, staged)
+                driver_id = dimension_cache.resolve(connection, "driver", driver_name, staged)
 
                 # Create fuel transaction with the obtained IDs
-                fuel_transaction_model = FuelTransaction(
-                    transaction_id=last_transaction_id + 1,
-                    product_id=product.product_id,
-                    station_id=station.station_id,
-                    vehicle_id=vehicle.vehicle_id,
-                    driver_id=driver.driver_id,
-                    transaction_date=self.convert_date_string(fuel_transaction.transaction_date),
-                    quantity=fuel_transaction.quantity,
-                    unit_price=fuel_transaction.unit_price,
-                    total_amount=fuel_transaction.total_amount,
-                    previous_km=fuel_transaction.previous_km,
-                    actual_km=fuel_transaction.actual_km,
-                    consumption_rate=fuel_transaction.consumption_rate,
+                row = self.build_fuel_transaction_row(
+                    fuel_transaction, product_id, station_id, vehicle_id, driver_id
                 )
+                fuel_transaction_model = FuelTransaction(**row)
                 
+                # Ids are allocated by the database sequences on insert
                 db.add(fuel_transaction_model)
+                self.apply_fuel_rollups(connection, [row])
                 db.commit()
-                db.refresh(fuel_transaction_model)
+                dimension_cache.publish(staged)
+                get_query_cache().bump_version()
                 return fuel_transaction_model
                 
             except Exception as e:
                 db.rollback()
                 raise Exception(f"Failed to save transaction: {str(e)}")
                 
+    def build_fuel_transaction_row(self, fuel_transaction, product_id, station_id, vehicle_id, driver_id) -> dict:
+        """Map an extracted receipt and its dimension ids to fuel_transaction column values"""
+        return {
+            "ticket_uid": fuel_transaction.ticket_no,
+            "product_id": product_id,
+            "station_id": station_id,
+            "vehicle_id": vehicle_id,
+            "driver_id": driver_id,
+            "transaction_date": self.convert_date_string(fuel_transaction.transaction_date),
+            "quantity": fuel_transaction.quantity,
+            "unit_price": fuel_transaction.unit_price,
+            "total_amount": fuel_transaction.total_amount,
+            "previous_km": fuel_transaction.previous_km,
+            "actual_km": fuel_transaction.actual_km,
+            "consumption_rate": fuel_transaction.consumption_rate,
+        }
+
+    def save_fuel_transactions(self, batch) -> dict:
+        """
+        Save many fuel transactions in a single transaction.
+        batch: list of (fuel_transaction, driver_name) tuples
+        Dimension ids are resolved with one set-based upsert per dimension table and
+        the facts are inserted with executemany in chunks. A failing chunk is retried
+        row by row inside savepoints so bad rows are reported without aborting the batch.
+        Returns saved transaction ids and per-row errors keyed by batch index.
+        """
+        engine, _ = self.get_db()
+        dimension_cache = get_dimension_cache()
+        # Ids of dimension rows created by this transaction, cached only once it commits
+        staged = {}
+        errors = {}
+        saved_ids = {}
+
+        # Parse dates up front so malformed receipts fail on their own
+        for index, (fuel_transaction, _) in enumerate(batch):
+            try:
+                self.convert_date_string(fuel_transaction.transaction_date)
+            except ValueError as e:
+                errors[index] = str(e)
+
+        try:
+            with engine.begin() as connection:
+                # 1. Resolve every dimension key in one pass per table
+                dimension_keys = {table_name: [] for table_name in DIMENSIONS}
+                for index, (fuel_transaction, driver_name) in enumerate(batch):
+                    if index in errors:
+                        continue
+                    for table_name, field in RECEIPT_DIMENSION_FIELDS.items():
+                        dimension_keys[table_name].append(getattr(fuel_transaction, field))
+                    dimension_keys["driver"].append(driver_name)
+                dimension_ids = {}
+                for table_name, keys in dimension_keys.items():
+                    dimension_ids[table_name] = self._resolve_dimension_keys(
+                        connection, dimension_cache, table_name, keys, staged
+                    )
+
+                # 2. Build fact rows, skipping rows whose dimensions failed
+                rows = []
+                for index, (fuel_transaction, driver_name) in enumerate(batch):
+                    if index in errors:
+                        continue
+                    keys = {table_name: getattr(fuel_transaction, field) for table_name, field in RECEIPT_DIMENSION_FIELDS.items()}
+                    keys["driver"] = driver_name
+                    missing = [table_name for table_name, key in keys.items() if key not in dimension_ids[table_name]]
+                    if missing:
+                        errors[index] = f"Failed to resolve {', '.join(missing)}"
+                        continue
+                    row = self.build_fuel_transaction_row(
+                        fuel_transaction,
+                        dimension_ids["product"][keys["product"]],
+                        dimension_ids["station"][keys["station"]],
+                        dimension_ids["vehicle"][keys["vehicle"]],
+                        dimension_ids["driver"][keys["driver"]],
+                    )
+                    rows.append((index, row))
+
+                # 3. Insert facts in chunks
+                insert_statement = insert(FuelTransaction.__table__).returning(
+                    FuelTransaction.__table__.c.transaction_id, sort_by_parameter_order=True
+                )
+                for start in range(0, len(rows), self.BULK_INSERT_CHUNK_SIZE):
+                    chunk = rows[start:start + self.BULK_INSERT_CHUNK_SIZE]
+                    try:
+                        with connection.begin_nested():
+                            result = connection.execute(insert_statement, [row for _, row in chunk])
+                            for (index, _), transaction_id in zip(chunk, result.scalars().all()):
+                                saved_ids[index] = transaction_id
+                    except Exception:
+                        # Isolate the failing rows of this chunk
+                        for index, row in chunk:
+                            try:
+                                with connection.begin_nested():
+                                    saved_ids[index] = connection.execute(insert_statement, row).scalar_one()
+                            except Exception as row_error:
+                                errors[index] = str(row_error)
+
+                # 4. Add the saved rows to the KPI rollups
+                self.apply_fuel_rollups(connection, [row for index, row in rows if index in saved_ids])
+            dimension_cache.publish(staged)
+        except Exception as e:
+            raise Exception(f"Failed to save transactions: {str(e)}")
+
+        if saved_ids:
+            get_query_cache().bump_version()
+        print(f"Bulk saved {len(saved_ids)} of {len(batch)} fuel transactions")
+        return {
+            "saved": len(saved_ids),
+            "failed": len(errors),
+            "transaction_ids": [saved_ids[index] for index in sorted(saved_ids)],
+            "errors": [{"index": index, "error": errors[index]} for index in sorted(errors)],
+        }
+
+    def apply_fuel_rollups(self, connection, rows) -> None:
+        """
+        Add fuel_transaction rows to the daily and monthly rollups in the caller's transaction.
+        Runs in a savepoint so a rollup failure never loses the facts; the next
+        rebuild_fuel_rollups() repairs the totals.
+        """
+        if not self.FUEL_ROLLUPS_ENABLED or not rows:
+            return
+        try:
+            with connection.begin_nested():
+                for grain, deltas in aggregate_rollup_rows(rows).items():
+                    if deltas:
+                        connection.execute(build_rollup_upsert_statement(grain), deltas)
+        except Exception as e:
+            print(f"Warning: Failed to update fuel rollups, they will be repaired by the next rebuild: {e}")
+
+    def rebuild_fuel_rollups(self) -> dict:
+        """
+        Recompute the rollup tables from fuel_transaction in one transaction.
+        Used for the initial backfill and by the periodic rollup job.
+        """
+        engine, _ = self.get_db()
+        try:
+            with engine.begin() as connection:
+                for statement in build_rollup_rebuild_statements():
+                    connection.execute(statement)
+                row_counts = {
+                    model.__tablename__: connection.execute(text(f"SELECT COUNT(*) FROM {model.__tablename__}")).scalar()
+                    for model in ROLLUP_MODELS.values()
+                }
+            get_query_cache().bump_version()
+            print("Rebuilt fuel rollups:", row_counts)
+            return row_counts
+        except Exception as e:
+            raise Exception(f"Failed to rebuild fuel rollups: {str(e)}")
+
+    def _resolve_dimension_keys(self, connection, dimension_cache, table_name, keys, staged) -> dict:
+        """
+        Resolve dimension keys set-based, falling back to one key at a time if the batch fails.
+        Ids created inside a savepoint are added to staged only once the savepoint is released.
+        """
+        try:
+            savepoint_staged = {}
+            with connection.begin_nested():
+                ids = dimension_cache.resolve_many(connection, table_name, keys, savepoint_staged)
+            staged.update(savepoint_staged)
+            return ids
+        except Exception as e:
+            print(f"Bulk resolve of {table_name} failed, resolving keys one by one: {e}")
+        ids = {}
+        for key in set(keys):
+            try:
+                savepoint_staged = {}
+                with connection.begin_nested():
+                    ids[key] = dimension_cache.resolve(connection, table_name, key, savepoint_staged)
+                staged.update(savepoint_staged)
+            except Exception as e:
+                print(f"Failed to resolve {table_name} '{key}': {e}")
+        return ids
+
     def save_analysis_history(self, analysis_history: AnalysisHistory):
         """Save analysis history to the database"""
         engine, SessionLocal = self.get_db()
         with SessionLocal() as db:
             try:
-                last_analysis_id = self.get_last_record_ids()["last_analysis_id"]
                 analysis_history_model = AnalysisHistory(
-                    analysis_id=last_analysis_id + 1,
                     prompt=analysis_history.prompt,
                     file_path=analysis_history.file_path,
                     sql_statement=analysis_history.sql_statement,
@@ -208,12 +687,26 @@ class DBOps:
                 )
                 db.add(analysis_history_model)
                 db.commit()
-                db.refresh(analysis_history_model)
                 return analysis_history_model
             except Exception as e:
                 db.rollback()
                 raise Exception(f"Failed to save analysis history: {str(e)}")
 
+    def get_analysis_history_pairs(self, limit: int = 5000) -> list:
+        """
+        Get (prompt, sql_statement, created_at) of the most recent analyses, oldest first
+        """
+        engine, _ = self.get_db()
+        with engine.connect() as connection:
+            rows = connection.execute(
+                text(
+                    "SELECT prompt, sql_statement, created_at FROM analysis_history "
+                    "ORDER BY analysis_id DESC LIMIT :limit"
+                ),
+                {"limit": limit}
+            ).all()
+        return [tuple(row) for row in reversed(rows)]
+
     def convert_date_string(self, date_str: str) -> datetime:
         try:
             parsed_date = datetime.strptime(date_str, '%d/%m/%Y %H:%M')
@@ -222,7 +715,7 @@ class DBOps:
             raise ValueError(f"Invalid date string format. Expected DD/MM/YYYY HH:mm, got: {date_str}") from e
         
     def get_last_record_ids(self) -> dict[str, int]:
-        """Get the last record ids"""
+        """Get the last record ids (not used for id allocation, see sync_id_sequences)"""
         engine, SessionLocal = self.get_db()
         with SessionLocal() as db:
             last_analysis = db.query(AnalysisHistory).order_by(AnalysisHistory.analysis_id.desc()).first()
@@ -243,10 +736,11 @@ class DBOps:
 
     def get_relationship_tables(self, table_name):
         engine, SessionLocal = self.get_db()  
-        inspector = inspect(engine)
+        catalog = self.get_schema_catalog()
         
         # Verify the table exists
-        if table_name not in inspector.get_table_names():
+        table = catalog.get_table(table_name)
+        if table is None:
             return {
                 "error": f"Table '{table_name}' does not exist",
                 "status": False
@@ -254,7 +748,7 @@ class DBOps:
         
         try:
             # Get all columns for this table
-            columns = [col['name'] for col in inspector.get_columns(table_name)]
+            columns = [column.name for column in table.columns]
             
             # Build query
             select_columns = ", ".join(columns)
@@ -282,44 +776,58 @@ class DBOps:
             }
         
 
-    def get_table_schemas_by_names(self, table_names):
+    def get_relationship_graph(self) -> RelationshipGraph:
+        """
+        Get the process-wide relationship graph, built once per schema catalog from
+        foreign keys and the rows of the relationship table
+        """
+        catalog = self.get_schema_catalog()
+        graph = get_cached_relationship_graph(catalog)
+        if graph is None:
+            relationship_info = self.get_relationship_tables(self.RELATIONSHIP_TABLE) if catalog.has_table(self.RELATIONSHIP_TABLE) else {}
+            if relationship_info and relationship_info.get("status") is not True:
+                print(f"Warning: Relationship table not loaded, using foreign keys only: {relationship_info.get('error')}")
+            graph = set_relationship_graph(catalog, RelationshipGraph.build(
+                catalog, relationship_info.get("data"), exclude_tables=[self.RELATIONSHIP_TABLE]
+            ))
+        return graph
+
+    def get_dimension_values(self) -> dict:
+        """
+        Get the natural keys of every dimension table (plate numbers, station names, ...)
+        """
         engine, _ = self.get_db()
-        inspector = inspect(engine)
-        schema_info = {}
-        
-        for table_name in table_names:
-            # Verify the table exists
-            if table_name not in inspector.get_table_names():
-                schema_info[table_name] = {"error": f"Table '{table_name}' does not exist"}
-                continue
-                
-            try:
-                # Get column information with cleaned output
-                columns = []
-                for column in inspector.get_columns(table_name):
-                    # Only include name and type in the column info
-                    column_info = {
-                        'name': column['name'],
-                        'type': str(column['type'])
-                    }
-                    columns.append(column_info)
-                
-                # Get primary key information
-                pk = inspector.get_pk_constraint(table_name)
-                
-                # Get foreign key information
-                foreign_keys = inspector.get_foreign_keys(table_name)
-                
-                # Store all information for this table
-                schema_info[table_name] = {
-                    'columns': columns,
-                    'primary_key': pk['constrained_columns'],
-                    'foreign_keys': foreign_keys
-                }
-            except Exception as e:
-                schema_info[table_name] = {"error": str(e)}
-        
-        return schema_info
+        catalog = self.get_schema_catalog()
+        values = {}
+        with engine.connect() as connection:
+            for table_name, (model, key_column) in DIMENSIONS.items():
+                if not catalog.has_table(table_name):
+                    continue
+                column = model.__table__.c[key_column]
+                rows = connection.execute(
+                    sa_select(column).where(column.isnot(None)).distinct().limit(self.TABLE_SELECTOR_VALUE_LIMIT)
+                )
+                values[table_name] = [row[0] for row in rows]
+        return values
+
+    def get_table_schemas_by_names(self, table_names):
+        """
+        Get name/type column information, primary and foreign keys of the given tables
+        """
+        return self.get_schema_catalog().to_schema_info(table_names, include_column_details=False)
+
+    def get_table_ddl_by_names(self, table_names) -> dict:
+        """
+        Get CREATE TABLE snippets of the given tables that exist
+        """
+        return self.get_schema_catalog().get_ddl_by_names(table_names)
+
+    def get_schema_ddl(self) -> dict:
+        """
+        Get CREATE TABLE snippets of every table
+        """
+        catalog = self.get_schema_catalog()
+        return catalog.get_ddl_by_names(catalog.table_names)
     
     def get_last_n_records(self, table_names, n=3):
         engine, SessionLocal = self.get_db()
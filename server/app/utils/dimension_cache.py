@@ -0,0 +1,313 @@
+import os
+import select
+import threading
+import time
+import uuid
+from datetime import datetime
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Boolean, literal_column, select as sa_select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from models.product import Product
+from models.station import Station
+from models.vehicle import Vehicle
+from models.driver import Driver
+
+# Dimension tables resolved on every receipt: table name -> (model, natural key column)
+DIMENSIONS = {
+    "product": (Product, "product_name"),
+    "station": (Station, "station_name"),
+    "vehicle": (Vehicle, "plate_number"),
+    "driver": (Driver, "driver_name"),
+}
+
+NOTIFY_CHANNEL = "dimension_cache"
+NOTIFY_STATEMENT = text("SELECT pg_notify(:channel, :payload)")
+
+
+def get_id_column(table_name: str):
+    """Get the primary key column of a dimension table"""
+    model, _ = DIMENSIONS[table_name]
+    return list(model.__table__.primary_key.columns)[0]
+
+
+def _build_upsert(table_name: str, keys: List):
+    """
+    INSERT of the natural keys that on conflict rewrites the key to itself. Unlike
+    DO NOTHING, the no-op update returns the row of a key that a concurrent
+    transaction inserted first, once that transaction commits.
+    """
+    model, key_column = DIMENSIONS[table_name]
+    table = model.__table__
+    now = datetime.now()
+    insert = pg_insert(table).values([{key_column: key, "created_at": now, "updated_at": now} for key in keys])
+    # updated_at is kept as is so the column's onupdate default is not applied to existing rows
+    return insert.on_conflict_do_update(
+        index_elements=[key_column],
+        set_={key_column: insert.excluded[key_column], "updated_at": table.c.updated_at},
+    )
+
+
+# xmax is 0 on a row version written by an insert, and set on one written by the conflict update
+_CREATED_COLUMN = literal_column("xmax = 0", Boolean).label("created")
+
+
+def build_upsert_statement(table_name: str, key):
+    """
+    Build a single statement that inserts the natural key if missing and
+    returns (id, created) for the new or existing row:
+        INSERT ... ON CONFLICT (key) DO UPDATE SET key = EXCLUDED.key RETURNING id, xmax = 0
+    """
+    return _build_upsert(table_name, [key]).returning(get_id_column(table_name), _CREATED_COLUMN)
+
+
+def build_bulk_upsert_statement(table_name: str, keys: List):
+    """
+    Set-based variant of build_upsert_statement returning (id, key, created)
+    for every key in one statement; keys must be distinct
+    """
+    model, key_column = DIMENSIONS[table_name]
+    return _build_upsert(table_name, keys).returning(get_id_column(table_name), model.__table__.c[key_column], _CREATED_COLUMN)
+
+
+class DimensionCache:
+    """
+    Bounded in-process LRU cache mapping dimension natural keys to ids.
+    Misses are resolved with one upsert statement; ids of rows the caller's
+    transaction created are staged and published after commit. Entries of a
+    table are dropped when another worker announces a new row over LISTEN/NOTIFY.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: int = 3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.instance_id = uuid.uuid4().hex
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._warmed = False
+        self._listener_thread: Optional[threading.Thread] = None
+        self._listener_stop = threading.Event()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, table_name: str, key) -> Optional[int]:
+        """Get a cached id, or None when missing or expired"""
+        with self._lock:
+            entry = self._entries.get((table_name, key))
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[(table_name, key)]
+                self.misses += 1
+                return None
+            self._entries.move_to_end((table_name, key))
+            self.hits += 1
+            return entry[0]
+
+    def put(self, table_name: str, key, record_id: int) -> None:
+        """Cache an id, evicting the least recently used entries past max_size"""
+        if key is None:
+            return
+        with self._lock:
+            self._entries[(table_name, key)] = (record_id, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end((table_name, key))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, table_name: Optional[str] = None) -> None:
+        """Drop cached entries of one table, or of every table"""
+        with self._lock:
+            if table_name is None:
+                self._entries.clear()
+                self._warmed = False
+            else:
+                for cache_key in [k for k in self._entries if k[0] == table_name]:
+                    del self._entries[cache_key]
+            self.invalidations += 1
+
+    def warm(self, connection) -> None:
+        """Load the dimension tables into the cache once per process"""
+        if self._warmed:
+            return
+        per_table_limit = max(self.max_size // len(DIMENSIONS), 1)
+        for table_name, (model, key_column) in DIMENSIONS.items():
+            id_column = get_id_column(table_name)
+            rows = connection.execute(
+                sa_select(id_column, model.__table__.c[key_column]).limit(per_table_limit)
+            )
+            for record_id, key in rows:
+                self.put(table_name, key, record_id)
+        self._warmed = True
+
+    async def awarm(self, connection) -> None:
+        """Async counterpart of warm() for an AsyncConnection"""
+        if self._warmed:
+            return
+        per_table_limit = max(self.max_size // len(DIMENSIONS), 1)
+        for table_name, (model, key_column) in DIMENSIONS.items():
+            id_column = get_id_column(table_name)
+            rows = await connection.execute(
+                sa_select(id_column, model.__table__.c[key_column]).limit(per_table_limit)
+            )
+            for record_id, key in rows:
+                self.put(table_name, key, record_id)
+        self._warmed = True
+
+    def lookup(self, table_name: str, key, staged: Optional[Dict] = None) -> Optional[int]:
+        """Get an id staged by the current transaction or cached from a committed one"""
+        if staged and (table_name, key) in staged:
+            return staged[(table_name, key)]
+        return self.get(table_name, key)
+
+    def _remember(self, table_name: str, key, record_id: int, created: bool, staged: Optional[Dict]) -> None:
+        # A row created by the current transaction stays private to it until publish()
+        if created and staged is not None:
+            staged[(table_name, key)] = record_id
+        else:
+            self.put(table_name, key, record_id)
+
+    def publish(self, staged: Dict) -> None:
+        """Cache the ids created by a transaction once it has committed; on rollback drop staged instead"""
+        for (table_name, key), record_id in staged.items():
+            self.put(table_name, key, record_id)
+        staged.clear()
+
+    async def aresolve(self, connection, table_name: str, key, staged: Optional[Dict] = None) -> int:
+        """Async counterpart of resolve() for an AsyncConnection"""
+        record_id = self.lookup(table_name, key, staged)
+        if record_id is not None:
+            return record_id
+        record_id, created = (await connection.execute(build_upsert_statement(table_name, key))).one()
+        if created:
+            await connection.execute(NOTIFY_STATEMENT, self.build_notify_params(table_name))
+        self._remember(table_name, key, record_id, created, staged)
+        return record_id
+
+    def resolve(self, connection, table_name: str, key, staged: Optional[Dict] = None) -> int:
+        """
+        Get the id for a natural key, inserting the dimension row if needed.
+        Ids of rows inserted here are added to staged rather than to the cache, so
+        other transactions never see an id that may still be rolled back.
+        """
+        record_id = self.lookup(table_name, key, staged)
+        if record_id is not None:
+            return record_id
+        record_id, created = connection.execute(build_upsert_statement(table_name, key)).one()
+        if created:
+            self.notify(connection, table_name)
+        self._remember(table_name, key, record_id, created, staged)
+        return record_id
+
+    def resolve_many(self, connection, table_name: str, keys: Iterable, staged: Optional[Dict] = None) -> Dict:
+        """Get ids for many natural keys, upserting all cache misses in one statement"""
+        ids = {}
+        missing = []
+        for key in set(keys):
+            if key is None:
+                continue
+            record_id = self.lookup(table_name, key, staged)
+            if record_id is None:
+                missing.append(key)
+            else:
+                ids[key] = record_id
+        if missing:
+            created_any = False
+            # Sorted so concurrent batches lock conflicting rows in the same order and cannot deadlock
+            missing.sort()
+            for record_id, key, created in connection.execute(build_bulk_upsert_statement(table_name, missing)):
+                ids[key] = record_id
+                created_any = created_any or created
+                self._remember(table_name, key, record_id, created, staged)
+            if created_any:
+                self.notify(connection, table_name)
+        return ids
+
+    def notify(self, connection, table_name: str) -> None:
+        """Tell other workers that a dimension row was added (sent on commit)"""
+        connection.execute(NOTIFY_STATEMENT, self.build_notify_params(table_name))
+
+    def build_notify_params(self, table_name: str) -> Dict:
+        return {"channel": NOTIFY_CHANNEL, "payload": f"{table_name}:{self.instance_id}"}
+
+    def handle_notification(self, payload: str) -> None:
+        """Invalidate the table named in a notification sent by another worker"""
+        table_name, _, sender = payload.partition(":")
+        if sender != self.instance_id and table_name in DIMENSIONS:
+            self.invalidate(table_name)
+
+    def start_listener(self, engine) -> None:
+        """Start a daemon thread that listens for dimension inserts by other workers"""
+        if self._listener_thread and self._listener_thread.is_alive():
+            return
+        self._listener_stop.clear()
+        self._listener_thread = threading.Thread(
+            target=self._listen, args=(engine,), name="dimension-cache-listener", daemon=True
+        )
+        self._listener_thread.start()
+
+    def stop_listener(self) -> None:
+        """Stop the listener thread"""
+        self._listener_stop.set()
+        if self._listener_thread:
+            self._listener_thread.join(timeout=10)
+            self._listener_thread = None
+
+    def _listen(self, engine) -> None:
+        while not self._listener_stop.is_set():
+            raw_connection = None
+            try:
+                # Detach so the long-lived LISTEN connection does not hold a pool slot
+                raw_connection = engine.raw_connection()
+                raw_connection.detach()
+                connection = raw_connection.driver_connection
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                # Notifications may have been missed while disconnected
+                self.invalidate()
+                while not self._listener_stop.is_set():
+                    if select.select([connection], [], [], 5) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        self.handle_notification(connection.notifies.pop(0).payload)
+            except Exception as e:
+                print(f"Dimension cache listener error: {e}")
+                self._listener_stop.wait(5)
+            finally:
+                if raw_connection is not None:
+                    try:
+                        raw_connection.close()
+                    except Exception:
+                        pass
+
+    def get_stats(self) -> Dict:
+        """Get cache statistics for monitoring"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "listening": bool(self._listener_thread and self._listener_thread.is_alive()),
+            }
+
+
+_dimension_cache: Optional[DimensionCache] = None
+_dimension_cache_lock = threading.Lock()
+
+
+def get_dimension_cache() -> DimensionCache:
+    """Get the process-wide dimension cache"""
+    global _dimension_cache
+    if _dimension_cache is None:
+        with _dimension_cache_lock:
+            if _dimension_cache is None:
+                _dimension_cache = DimensionCache(
+                    max_size=int(os.getenv("DIMENSION_CACHE_MAX_SIZE", "10000")),
+                    ttl_seconds=int(os.getenv("DIMENSION_CACHE_TTL", "3600")),
+                )
+    return _dimension_cache
@@ -0,0 +1,160 @@
+import re
+import json
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+FTS_CONFIG = "english"
+
+# Column types that get a full-text index, as rendered in the schema catalog
+_TEXT_TYPE_PATTERN = re.compile(r"^(VARCHAR|CHARACTER VARYING|TEXT|CHAR|CHARACTER)\b", re.IGNORECASE)
+
+# to_tsvector('config', [alias.]column)
+_FTS_PREDICATE_PATTERN = re.compile(
+    r"to_tsvector\s*\(\s*'(?P<config>\w+)'(?:::regconfig)?\s*,\s*(?:(?P<alias>\w+)\.)?(?P<column>\w+)\s*\)",
+    re.IGNORECASE,
+)
+
+# FROM/JOIN table [AS] alias
+_TABLE_ALIAS_PATTERN = re.compile(
+    r"\b(?:from|join)\s+(?P<table>\w+)(?:\s+(?:as\s+)?(?P<alias>(?!(?:on|where|join|left|right|inner|full|cross|group|order|limit|using|natural)\b)\w+))?",
+    re.IGNORECASE,
+)
+
+
+class FtsPredicate(NamedTuple):
+    table: Optional[str]
+    column: str
+    config: str
+
+
+def get_fts_index_name(table_name: str, column_name: str) -> str:
+    return f"ix_fts_{table_name}_{column_name}"[:63]
+
+
+def get_fts_index_targets(catalog, exclude_tables: Iterable[str] = ()) -> List[Tuple[str, str]]:
+    """
+    List (table, column) pairs of every text column that should carry a full-text index.
+    The catalog holds partitioned tables but not their partitions, so an index is created
+    once on the parent and Postgres cascades it to every partition.
+    """
+    exclude_tables = set(exclude_tables)
+    targets = []
+    for table_name in catalog.table_names:
+        if table_name in exclude_tables:
+            continue
+        for column in catalog.get_table(table_name).columns:
+            if _TEXT_TYPE_PATTERN.match(column.type):
+                targets.append((table_name, column.name))
+    return targets
+
+
+def build_fts_index_statement(table_name: str, column_name: str):
+    """GIN expression index matching to_tsvector('english', column) predicates"""
+    return text(
+        f"CREATE INDEX IF NOT EXISTS {get_fts_index_name(table_name, column_name)} "
+        f"ON {table_name} USING gin (to_tsvector('{FTS_CONFIG}', {column_name}))"
+    )
+
+
+def extract_fts_predicates(sql_query: str, catalog=None) -> List[FtsPredicate]:
+    """
+    Find to_tsvector() predicates in a query and resolve their table through
+    FROM/JOIN aliases, or through the catalog for unqualified columns.
+    """
+    aliases = {}
+    for match in _TABLE_ALIAS_PATTERN.finditer(sql_query):
+        table_name = match.group("table").lower()
+        aliases[table_name] = table_name
+        if match.group("alias"):
+            aliases[match.group("alias").lower()] = table_name
+    query_tables = set(aliases.values())
+
+    predicates = []
+    for match in _FTS_PREDICATE_PATTERN.finditer(sql_query):
+        column_name = match.group("column").lower()
+        alias = match.group("alias")
+        table_name = aliases.get(alias.lower()) if alias else None
+        if table_name is None and catalog is not None:
+            candidates = [
+                name for name in query_tables
+                if catalog.has_table(name) and any(column.name == column_name for column in catalog.get_table(name).columns)
+            ]
+            table_name = candidates[0] if len(candidates) == 1 else None
+        predicates.append(FtsPredicate(table_name, column_name, match.group("config").lower()))
+    return predicates
+
+
+def get_plan_index_names(plan_json) -> Set[str]:
+    """Collect the names of every index used anywhere in an EXPLAIN (FORMAT JSON) plan"""
+    if isinstance(plan_json, str):
+        plan_json = json.loads(plan_json)
+    index_names = set()
+    stack = [plan_json[0]["Plan"]]
+    while stack:
+        node = stack.pop()
+        if node.get("Index Name"):
+            index_names.add(node["Index Name"])
+        stack.extend(node.get("Plans", []))
+    return index_names
+
+
+def is_index_hit(predicate: FtsPredicate, index_names: Set[str]) -> bool:
+    if predicate.table is None or predicate.config != FTS_CONFIG:
+        return False
+    expected = get_fts_index_name(predicate.table, predicate.column)
+    for index_name in index_names:
+        # Partitions of a partitioned table carry generated index names
+        if index_name == expected or (index_name.startswith(f"{predicate.table}_") and "tsvector" in index_name):
+            return True
+    return False
+
+
+class FtsIndexMonitor:
+    """Counts which full-text predicates in model-issued SQL are served by an index"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._predicates: Dict[str, Dict[str, int]] = {}
+        self.queries = 0
+
+    def record(self, sql_query: str, plan_json, catalog=None) -> List[Tuple[FtsPredicate, bool]]:
+        """Match a query's FTS predicates against the indexes in its plan"""
+        predicates = extract_fts_predicates(sql_query, catalog)
+        if not predicates:
+            return []
+        index_names = get_plan_index_names(plan_json)
+        results = [(predicate, is_index_hit(predicate, index_names)) for predicate in predicates]
+        with self._lock:
+            self.queries += 1
+            for predicate, hit in results:
+                key = f"{predicate.table or '?'}.{predicate.column} ({predicate.config})"
+                counts = self._predicates.setdefault(key, {"hits": 0, "misses": 0})
+                counts["hits" if hit else "misses"] += 1
+        misses = [f"{predicate.table or '?'}.{predicate.column}" for predicate, hit in results if not hit]
+        if misses:
+            print(f"Full-text predicates without index use: {', '.join(misses)}")
+        return results
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "queries_with_fts": self.queries,
+                "predicates": {key: dict(counts) for key, counts in self._predicates.items()},
+            }
+
+
+_fts_index_monitor: Optional[FtsIndexMonitor] = None
+_fts_index_monitor_lock = threading.Lock()
+
+
+def get_fts_index_monitor() -> FtsIndexMonitor:
+    """Get the process-wide full-text index monitor"""
+    global _fts_index_monitor
+    if _fts_index_monitor is None:
+        with _fts_index_monitor_lock:
+            if _fts_index_monitor is None:
+                _fts_index_monitor = FtsIndexMonitor()
+    return _fts_index_monitor
+
@@ -0,0 +1,140 @@
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from models.fuel_transaction_rollup import FuelTransactionDailyRollup, FuelTransactionMonthlyRollup
+
+# Rollup model per period grain
+ROLLUP_MODELS = {
+    "day": FuelTransactionDailyRollup,
+    "month": FuelTransactionMonthlyRollup,
+}
+
+# Rollup dimension -> fuel_transaction foreign key column
+ROLLUP_DIMENSIONS = {
+    "vehicle": "vehicle_id",
+    "driver": "driver_id",
+    "station": "station_id",
+    "product": "product_id",
+}
+
+ROLLUP_TABLE_NAMES = tuple(model.__tablename__ for model in ROLLUP_MODELS.values())
+
+
+def get_period_start(grain: str, transaction_date: datetime) -> date:
+    """Truncate a transaction date to the first day of its period"""
+    if grain == "month":
+        return date(transaction_date.year, transaction_date.month, 1)
+    return transaction_date.date() if isinstance(transaction_date, datetime) else transaction_date
+
+
+def _min_km(*values):
+    values = [value for value in values if value is not None]
+    return min(values) if values else None
+
+
+def _max_km(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def aggregate_rollup_rows(rows: Iterable[dict]) -> Dict[str, List[dict]]:
+    """
+    Aggregate fuel_transaction rows into rollup deltas per grain.
+    rows: fuel_transaction column values as built by DBOps.build_fuel_transaction_row
+    """
+    now = datetime.now()
+    deltas: Dict[Tuple[str, date, str, int], dict] = {}
+    for row in rows:
+        for grain in ROLLUP_MODELS:
+            period_start = get_period_start(grain, row["transaction_date"])
+            for dimension, column in ROLLUP_DIMENSIONS.items():
+                dimension_id = row.get(column)
+                if dimension_id is None:
+                    continue
+                key = (grain, period_start, dimension, dimension_id)
+                delta = deltas.get(key)
+                if delta is None:
+                    delta = deltas[key] = {
+                        "period_start": period_start,
+                        "dimension": dimension,
+                        "dimension_id": dimension_id,
+                        "total_quantity": Decimal(0),
+                        "total_amount": Decimal(0),
+                        "transaction_count": 0,
+                        "min_km": None,
+                        "max_km": None,
+                        "created_at": now,
+                        "updated_at": now,
+                    }
+                delta["total_quantity"] += Decimal(str(row["quantity"]))
+                delta["total_amount"] += Decimal(str(row["total_amount"]))
+                delta["transaction_count"] += 1
+                delta["min_km"] = _min_km(delta["min_km"], row.get("previous_km"), row.get("actual_km"))
+                delta["max_km"] = _max_km(delta["max_km"], row.get("previous_km"), row.get("actual_km"))
+
+    grouped = {grain: [] for grain in ROLLUP_MODELS}
+    for (grain, _, _, _), delta in deltas.items():
+        grouped[grain].append(delta)
+    return grouped
+
+
+def build_rollup_upsert_statement(grain: str):
+    """
+    Build an INSERT ... ON CONFLICT statement that adds deltas to existing rollup rows.
+    Execute it with the delta dictionaries of aggregate_rollup_rows.
+    """
+    table = ROLLUP_MODELS[grain].__table__
+    statement = pg_insert(table)
+    excluded = statement.excluded
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.period_start, table.c.dimension, table.c.dimension_id],
+        set_={
+            "total_quantity": table.c.total_quantity + excluded.total_quantity,
+            "total_amount": table.c.total_amount + excluded.total_amount,
+            "transaction_count": table.c.transaction_count + excluded.transaction_count,
+            # LEAST/GREATEST ignore NULLs, so rows without odometer readings keep the range
+            "min_km": func.least(table.c.min_km, excluded.min_km),
+            "max_km": func.greatest(table.c.max_km, excluded.max_km),
+            "updated_at": excluded.updated_at,
+        },
+    )
+
+
+def build_rollup_rebuild_statements() -> List:
+    """Build statements that recompute every rollup table from fuel_transaction"""
+    # Incremental upserts wait for the rebuild, so no delta is lost or counted twice
+    statements = [text(f"LOCK TABLE {', '.join(ROLLUP_TABLE_NAMES)} IN EXCLUSIVE MODE")]
+    for grain, model in ROLLUP_MODELS.items():
+        table_name = model.__tablename__
+        selects = [
+            f"SELECT date_trunc('{grain}', transaction_date)::date, '{dimension}', {column}, "
+            f"SUM(quantity), SUM(total_amount), COUNT(*), "
+            f"LEAST(MIN(previous_km), MIN(actual_km)), GREATEST(MAX(previous_km), MAX(actual_km)), now(), now() "
+            f"FROM fuel_transaction WHERE {column} IS NOT NULL GROUP BY 1, 3"
+            for dimension, column in ROLLUP_DIMENSIONS.items()
+        ]
+        statements.append(text(f"DELETE FROM {table_name}"))
+        statements.append(text(
+            f"INSERT INTO {table_name} (period_start, dimension, dimension_id, total_quantity, total_amount, "
+            f"transaction_count, min_km, max_km, created_at, updated_at)\n"
+            + "\nUNION ALL\n".join(selects)
+        ))
+    return statements
+
+
+def get_rollup_schema_hint() -> str:
+    """Describe the rollup tables for the SQL generation prompt"""
+    dimensions = ", ".join(
+        f"'{dimension}' -> {dimension}.{column}" for dimension, column in ROLLUP_DIMENSIONS.items()
+    )
+    return (
+        f"-- Pre-aggregated rollups of fuel_transaction: {', '.join(ROLLUP_TABLE_NAMES)}.\n"
+        f"-- One row per period_start (first day of the day/month), dimension and dimension_id "
+        f"({dimensions}) with total_quantity, total_amount, transaction_count, min_km and max_km.\n"
+        f"-- Prefer them over scanning fuel_transaction for per-day or per-month totals; "
+        f"always filter on dimension and join the dimension table on dimension_id."
+    )
@@ -0,0 +1,151 @@
+from datetime import date
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+
+
+def add_months(month_start: date, months: int) -> date:
+    """Move the first day of a month by a number of months"""
+    month_index = month_start.year * 12 + month_start.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def get_month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+class PartitionManager:
+    """
+    Monthly range partitioning of a fact table on a timestamp column.
+    Converts an existing heap table in place, keeps partitions created ahead of
+    time with a DEFAULT partition catching anything outside them, and indexes
+    the partition key with BRIN, which stays tiny for append-mostly time data.
+    """
+
+    def __init__(self, table, partition_column: str, months_ahead: int = 3, brin_pages_per_range: int = 32):
+        self.table = table
+        self.table_name = table.name
+        self.partition_column = partition_column
+        self.months_ahead = months_ahead
+        self.brin_pages_per_range = brin_pages_per_range
+        self.default_partition = f"{self.table_name}_default"
+
+    def get_partition_name(self, month_start: date) -> str:
+        return f"{self.table_name}_y{month_start.year}m{month_start.month:02d}"
+
+    def is_partitioned(self, connection) -> bool:
+        relkind = connection.execute(
+            text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table_name)"),
+            {"table_name": self.table_name}
+        ).scalar()
+        return relkind == "p"
+
+    def get_partitions(self, connection) -> List[str]:
+        return list(connection.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = to_regclass(:table_name)"
+            ),
+            {"table_name": self.table_name}
+        ).scalars())
+
+    def migrate(self, connection) -> bool:
+        """
+        Convert the heap table into a partitioned table in the caller's transaction.
+        Rows are copied into monthly partitions, foreign keys are recreated and the
+        id sequence moves to the new table. Returns False when already partitioned.
+        """
+        if self.is_partitioned(connection):
+            return False
+        old_table = f"{self.table_name}_unpartitioned"
+        id_column = next(iter(self.table.primary_key.columns)).name
+        sequence_name = connection.execute(
+            text("SELECT pg_get_serial_sequence(:table_name, :column_name)"),
+            {"table_name": self.table_name, "column_name": id_column}
+        ).scalar()
+
+        # Free the table, constraint and index names for the partitioned table
+        connection.execute(text(f"ALTER TABLE {self.table_name} RENAME TO {old_table}"))
+        index_names = connection.execute(
+            text("SELECT indexname FROM pg_indexes WHERE tablename = :table_name"),
+            {"table_name": old_table}
+        ).scalars().all()
+        for index_name in index_names:
+            connection.execute(text(f'ALTER INDEX "{index_name}" RENAME TO "{index_name[:50]}_unpartitioned"'))
+
+        connection.execute(text(
+            f"CREATE TABLE {self.table_name} (LIKE {old_table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE ({self.partition_column})"
+        ))
+        # The partition key has to be part of the primary key
+        connection.execute(text(f"ALTER TABLE {self.table_name} ADD PRIMARY KEY ({id_column}, {self.partition_column})"))
+        for fk in self.table.foreign_keys:
+            connection.execute(text(
+                f"ALTER TABLE {self.table_name} ADD FOREIGN KEY ({fk.parent.name}) "
+                f"REFERENCES {fk.column.table.name} ({fk.column.name})"
+            ))
+        if sequence_name:
+            connection.execute(text(f"ALTER SEQUENCE {sequence_name} OWNED BY {self.table_name}.{id_column}"))
+
+        self.ensure_brin_index(connection)
+        first_date = connection.execute(text(f"SELECT MIN({self.partition_column}) FROM {old_table}")).scalar()
+        self.ensure_partitions(connection, get_month_start(first_date) if first_date else None)
+        copied = connection.execute(text(f"INSERT INTO {self.table_name} SELECT * FROM {old_table}")).rowcount
+        connection.execute(text(f"DROP TABLE {old_table}"))
+        print(f"Partitioned {self.table_name} by month, {copied} rows migrated")
+        return True
+
+    def ensure_brin_index(self, connection) -> None:
+        """Create the BRIN index on the partition key, inherited by every partition"""
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {self.table_name}_{self.partition_column}_brin "
+            f"ON {self.table_name} USING brin ({self.partition_column}) "
+            f"WITH (pages_per_range = {int(self.brin_pages_per_range)})"
+        ))
+
+    def ensure_partitions(self, connection, first_month: Optional[date] = None) -> List[str]:
+        """
+        Create missing monthly partitions from first_month (default: this month)
+        through months_ahead months from now, plus the DEFAULT partition.
+        Returns the names of the partitions created.
+        """
+        current_month = get_month_start(date.today())
+        month = min(first_month or current_month, current_month)
+        last_month = add_months(current_month, self.months_ahead)
+        existing = set(self.get_partitions(connection))
+        created = []
+        if self.default_partition not in existing:
+            connection.execute(text(f"CREATE TABLE {self.default_partition} PARTITION OF {self.table_name} DEFAULT"))
+            created.append(self.default_partition)
+        while month <= last_month:
+            partition_name = self.get_partition_name(month)
+            if partition_name not in existing:
+                self.create_partition(connection, partition_name, (month, add_months(month, 1)))
+                created.append(partition_name)
+            month = add_months(month, 1)
+        if created:
+            print(f"Created partitions of {self.table_name}: {created}")
+        return created
+
+    def create_partition(self, connection, partition_name: str, bounds: Tuple[date, date]) -> None:
+        """
+        Create one monthly partition. Rows of that month already in the DEFAULT
+        partition are moved into it, since attaching would fail otherwise.
+        """
+        lower, upper = bounds
+        range_filter = f"{self.partition_column} >= '{lower.isoformat()}' AND {self.partition_column} < '{upper.isoformat()}'"
+        bound_spec = f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+        has_default_rows = connection.execute(
+            text(f"SELECT EXISTS (SELECT 1 FROM {self.default_partition} WHERE {range_filter})")
+        ).scalar()
+        if not has_default_rows:
+            connection.execute(text(f"CREATE TABLE {partition_name} PARTITION OF {self.table_name} {bound_spec}"))
+            return
+        connection.execute(text(
+            f"CREATE TABLE {partition_name} (LIKE {self.table_name} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        ))
+        connection.execute(text(
+            f"WITH moved AS (DELETE FROM {self.default_partition} WHERE {range_filter} RETURNING *) "
+            f"INSERT INTO {partition_name} SELECT * FROM moved"
+        ))
+        connection.execute(text(f"ALTER TABLE {self.table_name} ATTACH PARTITION {partition_name} {bound_spec}"))
@@ -0,0 +1,85 @@
+import os
+import re
+import hashlib
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from utils.tiered_cache import TieredCache
+from utils.sql_checker import get_sql_fingerprint
+
+# Quoted text, comments, whitespace runs, then everything else one character at a time
+_SQL_TOKEN_PATTERN = re.compile(
+    r"(?P<string>'(?:[^']|'')*')"
+    r"|(?P<identifier>\"(?:[^\"]|\"\")*\")"
+    r"|(?P<line_comment>--[^\n]*)"
+    r"|(?P<block_comment>/\*.*?\*/)"
+    r"|(?P<space>\s+)"
+    r"|(?P<other>[^'\"\s\-/]+|.)",
+    re.DOTALL,
+)
+
+
+def normalize_sql(sql_query: str) -> str:
+    """
+    Normalize a query for cache keys: drop comments, collapse whitespace and
+    fold case, leaving string literals and quoted identifiers untouched.
+    """
+    parts = []
+    for match in _SQL_TOKEN_PATTERN.finditer(sql_query):
+        kind = match.lastgroup
+        if kind in ("line_comment", "block_comment", "space"):
+            if parts and parts[-1] != " ":
+                parts.append(" ")
+        elif kind in ("string", "identifier"):
+            parts.append(match.group())
+        else:
+            parts.append(match.group().lower())
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+class CappedQueryResult(NamedTuple):
+    columns: List[str]
+    rows: List[Dict[str, Any]]
+    truncated: bool
+    total_estimate: Optional[int]
+
+
+class QueryResultCache(TieredCache):
+    """
+    Cache of executed query results keyed by the query's AST fingerprint (normalized
+    SQL text without sqlglot) and a data version token.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: int = 600,
+                 disk_dir: Optional[str] = None, disk_max_entries: int = 1000):
+        super().__init__(max_entries, ttl_seconds, disk_dir, disk_max_entries)
+        self._local_version = 0
+
+    def bump_version(self) -> None:
+        """Mark data written by this process so cached results are not reused"""
+        with self._lock:
+            self._local_version += 1
+
+    def make_key(self, sql_query: str, data_version: Any, variant: Any = None) -> str:
+        query_key = get_sql_fingerprint(sql_query) or normalize_sql(sql_query)
+        raw_key = f"{query_key}\x00{data_version}:{self._local_version}\x00{variant}"
+        return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
+
+
+_query_cache: Optional[QueryResultCache] = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> QueryResultCache:
+    """Get the process-wide query result cache"""
+    global _query_cache
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = QueryResultCache(
+                    max_entries=int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "256")),
+                    ttl_seconds=int(os.getenv("QUERY_CACHE_TTL", "600")),
+                    disk_dir=os.getenv("QUERY_CACHE_DIR") or None,
+                    disk_max_entries=int(os.getenv("QUERY_CACHE_DISK_MAX_ENTRIES", "1000")),
+                )
+    return _query_cache
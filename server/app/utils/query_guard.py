@@ -0,0 +1,96 @@
+import os
+import json
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+
+class QueryRejected(Exception):
+    """Raised when a query's estimated cost is over budget and it should be regenerated"""
+
+    def __init__(self, reason: str, total_cost: float, plan_rows: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.total_cost = total_cost
+        self.plan_rows = plan_rows
+
+
+class GuardDecision(NamedTuple):
+    action: str  # "allow", "limit" or "reject"
+    total_cost: float
+    plan_rows: int
+    reason: str
+
+
+class QueryCostGuard:
+    """
+    Pre-flight check of model-generated SQL against planner estimates from
+    EXPLAIN (FORMAT JSON). Over-cost queries are rejected, queries returning
+    more rows than budgeted are limited, and every decision is logged for tuning.
+    """
+
+    def __init__(self):
+        self.ENABLED = os.getenv("SQL_GUARD_ENABLED", "true").lower() == "true"
+        self.MAX_TOTAL_COST = float(os.getenv("SQL_MAX_TOTAL_COST", "1000000"))
+        self.MAX_PLAN_ROWS = int(os.getenv("SQL_MAX_PLAN_ROWS", "100000"))
+        self.STATEMENT_TIMEOUT_MS = int(os.getenv("SQL_STATEMENT_TIMEOUT_MS", "15000"))
+        self.LOG_FILE = os.getenv("SQL_GUARD_LOG_FILE", "logs/query_guard.log")
+
+    def build_explain_sql(self, sql_query: str) -> str:
+        return f"EXPLAIN (FORMAT JSON) {sql_query.strip().rstrip(';')}"
+
+    def evaluate(self, plan_json, row_cap: Optional[int] = None) -> GuardDecision:
+        """
+        Decide on a query from its JSON plan.
+        row_cap: LIMIT already applied by the caller; the estimate of the capped
+        query's input is then compared against the row budget.
+        """
+        if isinstance(plan_json, str):
+            plan_json = json.loads(plan_json)
+        plan = plan_json[0]["Plan"]
+        total_cost = float(plan["Total Cost"])
+        plan_rows = int(plan["Plan Rows"])
+        if row_cap is not None and plan.get("Node Type") == "Limit" and plan.get("Plans"):
+            # Rows the query would produce without the cap
+            plan_rows = int(plan["Plans"][0]["Plan Rows"])
+
+        if total_cost > self.MAX_TOTAL_COST:
+            return GuardDecision(
+                "reject", total_cost, plan_rows,
+                f"estimated cost {total_cost:.0f} exceeds budget {self.MAX_TOTAL_COST:.0f}"
+            )
+        if plan_rows > self.MAX_PLAN_ROWS or (row_cap is not None and plan_rows > row_cap):
+            limit = row_cap if row_cap is not None else self.MAX_PLAN_ROWS
+            return GuardDecision(
+                "limit", total_cost, plan_rows,
+                f"estimated {plan_rows} rows, limited to {limit}"
+            )
+        return GuardDecision("allow", total_cost, plan_rows, "within budget")
+
+    def log_decision(self, sql_query: str, decision: GuardDecision) -> None:
+        """Append the decision to the guard log"""
+        print(f"Query guard: {decision.action} ({decision.reason})")
+        try:
+            log_dir = os.path.dirname(self.LOG_FILE)
+            if log_dir and not os.path.exists(log_dir):
+                os.makedirs(log_dir)
+            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            with open(self.LOG_FILE, "a") as log_file:
+                log_file.write(
+                    f"[{current_time}]\n"
+                    f"Decision: {decision.action}\n"
+                    f"Total Cost: {decision.total_cost:.2f}\n"
+                    f"Plan Rows: {decision.plan_rows}\n"
+                    f"Reason: {decision.reason}\n"
+                    f"SQL: {sql_query}\n"
+                    f"-------------------------\n"
+                )
+        except Exception as e:
+            print(f"Warning: Failed to write query guard log: {e}")
+
+    def enforce(self, sql_query: str, plan_json, row_cap: Optional[int] = None) -> GuardDecision:
+        """Evaluate and log a plan, raising QueryRejected for over-budget queries"""
+        decision = self.evaluate(plan_json, row_cap)
+        self.log_decision(sql_query, decision)
+        if decision.action == "reject":
+            raise QueryRejected(decision.reason, decision.total_cost, decision.plan_rows)
+        return decision
@@ -0,0 +1,144 @@
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional
+
+
+def apply_row_cap(sql_query: str, max_rows: int) -> str:
+    """
+    Wrap a SELECT so the database never returns more than max_rows + 1 rows.
+    The extra row tells the caller that the result was truncated.
+    """
+    inner_query = sql_query.strip().rstrip(";").rstrip()
+    # Newlines keep a trailing "-- comment" in the inner query from swallowing the wrapper
+    return f"SELECT * FROM (\n{inner_query}\n) AS capped_query LIMIT {int(max_rows) + 1}"
+
+
+class StreamedQueryResult:
+    """
+    Chunked iterator over a row-capped query executed with a server-side cursor.
+    The connection stays open until the rows are exhausted or close() is called.
+    After iteration, `truncated` tells whether rows past max_rows were dropped and
+    `total_estimate` holds the planner's row estimate for the uncapped query.
+    """
+
+    def __init__(self, connection, result, max_rows: int, chunk_size: int = 500,
+                 estimate_total: Optional[Callable[[], Optional[int]]] = None):
+        self._connection = connection
+        self._result = result
+        self._estimate_total = estimate_total
+        self.columns: List[str] = list(result.keys())
+        self.max_rows = max_rows
+        self.chunk_size = chunk_size
+        self.row_count = 0
+        self.truncated = False
+        self.total_estimate: Optional[int] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __iter__(self) -> Iterator[List[Dict[str, Any]]]:
+        return self.chunks()
+
+    def chunks(self) -> Iterator[List[Dict[str, Any]]]:
+        """Yield rows as lists of dictionaries, one list per fetched chunk"""
+        try:
+            for partition in self._result.partitions(self.chunk_size):
+                rows = [dict(zip(self.columns, row)) for row in partition]
+                remaining = self.max_rows - self.row_count
+                if len(rows) > remaining:
+                    rows = rows[:remaining]
+                    self.truncated = True
+                self.row_count += len(rows)
+                if rows:
+                    yield rows
+                if self.truncated:
+                    break
+        finally:
+            self.close()
+        if self.truncated and self._estimate_total:
+            try:
+                self.total_estimate = self._estimate_total()
+            except Exception as e:
+                print(f"Warning: Failed to estimate total rows: {e}")
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        """Yield rows one at a time"""
+        for chunk in self.chunks():
+            yield from chunk
+
+    def fetch_all(self) -> List[Dict[str, Any]]:
+        """Collect the capped result into a list"""
+        return list(self.rows())
+
+    def close(self) -> None:
+        if self._connection is not None:
+            try:
+                self._result.close()
+            finally:
+                self._connection.close()
+                self._connection = None
+
+
+class AsyncStreamedQueryResult:
+    """
+    Async counterpart of StreamedQueryResult over an AsyncConnection.stream() result.
+    """
+
+    def __init__(self, connection, result, max_rows: int, chunk_size: int = 500,
+                 estimate_total: Optional[Callable[[], Awaitable[Optional[int]]]] = None):
+        self._connection = connection
+        self._result = result
+        self._estimate_total = estimate_total
+        self.columns: List[str] = list(result.keys())
+        self.max_rows = max_rows
+        self.chunk_size = chunk_size
+        self.row_count = 0
+        self.truncated = False
+        self.total_estimate: Optional[int] = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def __aiter__(self) -> AsyncIterator[List[Dict[str, Any]]]:
+        return self.chunks()
+
+    async def chunks(self) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield rows as lists of dictionaries, one list per fetched chunk"""
+        try:
+            async for partition in self._result.partitions(self.chunk_size):
+                rows = [dict(zip(self.columns, row)) for row in partition]
+                remaining = self.max_rows - self.row_count
+                if len(rows) > remaining:
+                    rows = rows[:remaining]
+                    self.truncated = True
+                self.row_count += len(rows)
+                if rows:
+                    yield rows
+                if self.truncated:
+                    break
+        finally:
+            await self.close()
+        if self.truncated and self._estimate_total:
+            try:
+                self.total_estimate = await self._estimate_total()
+            except Exception as e:
+                print(f"Warning: Failed to estimate total rows: {e}")
+
+    async def fetch_all(self) -> List[Dict[str, Any]]:
+        """Collect the capped result into a list"""
+        rows = []
+        async for chunk in self.chunks():
+            rows.extend(chunk)
+        return rows
+
+    async def close(self) -> None:
+        if self._connection is not None:
+            try:
+                await self._result.close()
+            finally:
+                await self._connection.close()
+                self._connection = None
@@ -0,0 +1,167 @@
+import re
+import threading
+from collections import deque
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
+
+# Columns of table_relationships read as free-text notes about a table
+_NOTE_COLUMN_PATTERN = re.compile(r"desc|note|comment|purpose|meaning", re.IGNORECASE)
+MAX_NOTE_CHARS = 120
+
+
+class RelationshipGraph:
+    """
+    Undirected adjacency of tables built from foreign keys and the curated
+    table_relationships metadata. Edges carry the join columns when known.
+    """
+
+    def __init__(self, adjacency: Mapping[str, Iterable[str]], join_columns: Mapping[Tuple[str, str], str],
+                 notes: Optional[Mapping[str, str]] = None):
+        self.adjacency: Mapping[str, FrozenSet[str]] = MappingProxyType(
+            {table: frozenset(neighbors) for table, neighbors in adjacency.items()}
+        )
+        self.join_columns = MappingProxyType(dict(join_columns))
+        self.notes = MappingProxyType(dict(notes or {}))
+        self._prompt_text: Optional[str] = None
+
+    @classmethod
+    def build(cls, catalog, relationship_data: Optional[Dict[str, list]] = None,
+              exclude_tables: Iterable[str] = ()) -> "RelationshipGraph":
+        """
+        Merge catalog foreign keys with table_relationships rows.
+        relationship_data: column -> list of values, as returned by DBOps.get_relationship_tables
+        """
+        exclude_tables = set(exclude_tables)
+        adjacency: Dict[str, set] = {name: set() for name in catalog.table_names if name not in exclude_tables}
+        join_columns: Dict[Tuple[str, str], str] = {}
+
+        def add_edge(table, other, columns=None):
+            if table == other or table not in adjacency or other not in adjacency:
+                return
+            adjacency[table].add(other)
+            adjacency[other].add(table)
+            if columns:
+                join_columns[(table, other)] = columns
+
+        for table_name in catalog.table_names:
+            for fk in catalog.get_table(table_name).foreign_keys:
+                add_edge(table_name, fk.referred_table, ",".join(fk.constrained_columns))
+
+        notes = {}
+        if relationship_data:
+            table_pattern = re.compile(r"\b(" + "|".join(map(re.escape, adjacency)) + r")\b") if adjacency else None
+            columns = list(relationship_data)
+            row_count = max((len(values) for values in relationship_data.values()), default=0)
+            for index in range(row_count):
+                row = {column: relationship_data[column][index] for column in columns if index < len(relationship_data[column])}
+                # The row's own table is the first value that names a table exactly
+                source = next((value for value in row.values() if isinstance(value, str) and value in adjacency), None)
+                if source is None:
+                    continue
+                for column, value in row.items():
+                    if not isinstance(value, str) or value == source:
+                        continue
+                    if _NOTE_COLUMN_PATTERN.search(column):
+                        notes.setdefault(source, " ".join(value.split())[:MAX_NOTE_CHARS])
+                    elif table_pattern:
+                        for other in table_pattern.findall(value):
+                            add_edge(source, other)
+        return cls(adjacency, join_columns, notes)
+
+    def has_edges(self) -> bool:
+        return any(self.adjacency.values())
+
+    def reachable(self, table_name: str, max_joins: int) -> Dict[str, int]:
+        """Tables reachable from table_name within max_joins joins, with their distance"""
+        if table_name not in self.adjacency:
+            return {}
+        distances = {table_name: 0}
+        queue = deque([table_name])
+        while queue:
+            current = queue.popleft()
+            if distances[current] == max_joins:
+                continue
+            for neighbor in self.adjacency[current]:
+                if neighbor not in distances:
+                    distances[neighbor] = distances[current] + 1
+                    queue.append(neighbor)
+        return distances
+
+    def shortest_path(self, source: str, target: str, max_joins: int) -> Optional[List[str]]:
+        if source not in self.adjacency or target not in self.adjacency:
+            return None
+        previous = {source: None}
+        queue = deque([(source, 0)])
+        while queue:
+            current, depth = queue.popleft()
+            if current == target:
+                path = []
+                while current is not None:
+                    path.append(current)
+                    current = previous[current]
+                return path[::-1]
+            if depth == max_joins:
+                continue
+            for neighbor in self.adjacency[current]:
+                if neighbor not in previous:
+                    previous[neighbor] = current
+                    queue.append((neighbor, depth + 1))
+        return None
+
+    def connect(self, table_names: Iterable[str], max_joins: int) -> List[str]:
+        """Add the intermediate tables needed to join the given tables, keeping their order first"""
+        table_names = [name for name in table_names if name in self.adjacency]
+        connected = list(table_names)
+        for index, source in enumerate(table_names):
+            for target in table_names[index + 1:]:
+                path = self.shortest_path(source, target, max_joins) or []
+                for table_name in path:
+                    if table_name not in connected:
+                        connected.append(table_name)
+        return connected
+
+    def to_prompt_text(self) -> str:
+        """
+        One line per table: "table: neighbor(join columns), ... # note".
+        Each edge is written once, on the side that holds the foreign key.
+        """
+        if self._prompt_text is None:
+            lines = []
+            written = set()
+            for table_name in sorted(self.adjacency):
+                parts = []
+                for neighbor in sorted(self.adjacency[table_name]):
+                    edge = frozenset((table_name, neighbor))
+                    columns = self.join_columns.get((table_name, neighbor))
+                    if edge in written or (columns is None and (neighbor, table_name) in self.join_columns):
+                        continue
+                    written.add(edge)
+                    parts.append(f"{neighbor}({columns})" if columns else neighbor)
+                line = f"{table_name}: {', '.join(parts)}" if parts else table_name
+                if table_name in self.notes:
+                    line += f" # {self.notes[table_name]}"
+                lines.append(line)
+            self._prompt_text = "\n".join(lines)
+        return self._prompt_text
+
+
+# Graph of the current catalog; a refreshed catalog is a new object and forces a rebuild
+_graph_entry: Optional[Tuple[object, RelationshipGraph]] = None
+_graph_lock = threading.Lock()
+
+
+def get_cached_relationship_graph(catalog) -> Optional[RelationshipGraph]:
+    entry = _graph_entry
+    if entry is not None and entry[0] is catalog:
+        return entry[1]
+    return None
+
+
+def set_relationship_graph(catalog, graph: RelationshipGraph) -> RelationshipGraph:
+    global _graph_entry
+    with _graph_lock:
+        if _graph_entry is not None and _graph_entry[0] is catalog:
+            return _graph_entry[1]
+        _graph_entry = (catalog, graph)
+    print(f"Relationship graph built: {len(graph.adjacency)} tables, {sum(map(len, graph.adjacency.values())) // 2} edges")
+    return graph
@@ -0,0 +1,170 @@
+import io
+import csv
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from utils.schema_serializer import count_tokens
+
+# Bucket sizes tried from finest to coarsest, as numpy datetime64 units
+_BUCKET_UNITS = (("D", "day"), ("W", "week"), ("M", "month"), ("Y", "year"))
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+
+def format_value(value: Any) -> str:
+    """Short text form of a cell for the prompt"""
+    if value is None:
+        return ""
+    if isinstance(value, (float, Decimal)):
+        number = round(float(value), 4)
+        return str(int(number)) if number.is_integer() and abs(number) < 1e15 else str(number)
+    if isinstance(value, datetime):
+        return value.date().isoformat() if value.time() == datetime.min.time() else value.isoformat(sep=" ", timespec="seconds")
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value).replace("\n", " ")
+
+
+class ResultEncoder:
+    """
+    Compact prompt form of a query result: per-column statistics over every
+    row (count, min/max/mean/sum, top values, date buckets) followed by as many
+    rows as CSV as fit the token budget. Large results are summarized rather
+    than cut off at a fixed row count, and keys are not repeated per row.
+    """
+
+    def __init__(self, token_budget: int = 3000, top_k: int = 5, max_buckets: int = 24, summary_min_rows: int = 20):
+        self.token_budget = token_budget
+        self.top_k = top_k
+        self.max_buckets = max_buckets
+        self.summary_min_rows = summary_min_rows
+
+    def classify_column(self, values: List[Any]) -> str:
+        """numeric, date or text, from the non-null values of a column"""
+        present = [value for value in values if value is not None]
+        if present and all(_is_number(value) for value in present):
+            return "numeric"
+        if present and all(isinstance(value, (date, datetime)) for value in present):
+            return "date"
+        return "text"
+
+    def summarize_numeric(self, name: str, values: List[Any]) -> str:
+        array = np.array([float(value) for value in values if value is not None], dtype=np.float64)
+        if array.size == 0:
+            return f"- {name} (numeric): all null"
+        return (
+            f"- {name} (numeric): count {array.size}, min {format_value(array.min())}, max {format_value(array.max())}, "
+            f"mean {format_value(array.mean())}, sum {format_value(array.sum())}"
+        )
+
+    def summarize_text(self, name: str, values: List[Any]) -> str:
+        array = np.array([format_value(value) for value in values if value is not None], dtype=object)
+        if array.size == 0:
+            return f"- {name} (text): all null"
+        unique, counts = np.unique(array, return_counts=True)
+        order = np.argsort(-counts, kind="stable")[:self.top_k]
+        top = ", ".join(f"{unique[index]} ({counts[index]})" for index in order)
+        return f"- {name} (text): count {array.size}, {unique.size} distinct, top: {top}"
+
+    def summarize_date(self, name: str, values: List[Any], numeric: Dict[str, List[Any]]) -> str:
+        """Range of a date column plus row counts (and sums of up to two numeric columns) per time bucket"""
+        present = [index for index, value in enumerate(values) if value is not None]
+        if not present:
+            return f"- {name} (date): all null"
+        days = np.array([
+            np.datetime64(values[index].date() if isinstance(values[index], datetime) else values[index], "D")
+            for index in present
+        ])
+        lines = [f"- {name} (date): count {days.size}, from {days.min()} to {days.max()}"]
+        span = days.max() - days.min()
+        if span == np.timedelta64(0, "D"):
+            return lines[0]
+
+        for unit, label in _BUCKET_UNITS:
+            buckets = days.astype(f"datetime64[{unit}]")
+            unique, inverse, counts = np.unique(buckets, return_inverse=True, return_counts=True)
+            if unique.size <= self.max_buckets:
+                break
+        columns = list(numeric)[:2]
+        sums = {}
+        for column in columns:
+            column_values = np.array(
+                [float(numeric[column][index]) if numeric[column][index] is not None else 0.0 for index in present],
+                dtype=np.float64,
+            )
+            sums[column] = np.bincount(inverse, weights=column_values, minlength=unique.size)
+        header = f"  by {label}: {label}, rows" + "".join(f", sum {column}" for column in columns)
+        lines.append(header)
+        for position, bucket in enumerate(unique):
+            # Weeks are labelled by their first day
+            bucket_label = bucket.astype("datetime64[D]") if unit == "W" else bucket
+            cells = [str(bucket_label), str(counts[position])] + [format_value(sums[column][position]) for column in columns]
+            lines.append("  " + ", ".join(cells))
+        return "\n".join(lines)
+
+    def summarize(self, columns: Sequence[str], rows: List[Dict[str, Any]]) -> List[str]:
+        values = {column: [row.get(column) for row in rows] for column in columns}
+        kinds = {column: self.classify_column(values[column]) for column in columns}
+        numeric = {column: values[column] for column in columns if kinds[column] == "numeric"}
+        lines = []
+        for column in columns:
+            if kinds[column] == "numeric":
+                lines.append(self.summarize_numeric(column, values[column]))
+            elif kinds[column] == "date":
+                lines.append(self.summarize_date(column, values[column], numeric))
+            else:
+                lines.append(self.summarize_text(column, values[column]))
+            nulls = sum(value is None for value in values[column])
+            if nulls:
+                lines[-1] += f", {nulls} null"
+        return lines
+
+    def encode_rows(self, columns: Sequence[str], rows: List[Dict[str, Any]]) -> List[str]:
+        """CSV lines, header first"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([format_value(row.get(column)) for column in columns])
+        return buffer.getvalue().rstrip("\n").split("\n")
+
+    def encode(self, columns: Sequence[str], rows: List[Dict[str, Any]], truncated: bool = False,
+               total_estimate: Optional[int] = None) -> str:
+        """Prompt text of a result within the token budget"""
+        if not rows:
+            return "No data returned from query."
+        columns = list(columns) or list(rows[0])
+        header = f"Result: {len(rows)}{'+' if truncated else ''} rows"
+        if truncated and total_estimate is not None:
+            header += f" (about {total_estimate} in total)"
+        header += f", {len(columns)} columns"
+
+        csv_lines = self.encode_rows(columns, rows)
+        used = count_tokens(header) + 1
+        csv_tokens = [count_tokens(line) + 1 for line in csv_lines]
+        if len(rows) < self.summary_min_rows and not truncated and used + sum(csv_tokens) <= self.token_budget:
+            # Small result: the rows say everything
+            return "\n".join([header, "Rows (CSV):"] + csv_lines)
+
+        summary = ["Column summary (over all returned rows):"] + self.summarize(columns, rows)
+        used += sum(count_tokens(line) + 1 for line in summary)
+        included = 0
+        budget = self.token_budget - count_tokens("Rows (CSV, first 100000 of 100000):") - 1
+        for tokens in csv_tokens:
+            if used + tokens > budget:
+                break
+            used += tokens
+            included += 1
+        lines = [header] + summary
+        row_count = max(included - 1, 0)
+        if row_count:
+            label = "Rows (CSV):" if row_count == len(rows) else f"Rows (CSV, first {row_count} of {len(rows)}):"
+            lines += [label] + csv_lines[:included]
+        if row_count < len(rows):
+            print(f"Result encoded with {row_count} of {len(rows)} rows in {self.token_budget} tokens")
+        return "\n".join(lines)
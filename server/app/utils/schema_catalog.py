@@ -0,0 +1,198 @@
+import hashlib
+import threading
+from types import MappingProxyType
+from typing import Dict, Iterable, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+
+class ColumnInfo(NamedTuple):
+    name: str
+    type: str
+    nullable: bool
+    default: Optional[str]
+
+
+class ForeignKeyInfo(NamedTuple):
+    name: Optional[str]
+    constrained_columns: Tuple[str, ...]
+    referred_table: str
+    referred_columns: Tuple[str, ...]
+
+
+class TableInfo(NamedTuple):
+    name: str
+    columns: Tuple[ColumnInfo, ...]
+    primary_key: Tuple[str, ...]
+    foreign_keys: Tuple[ForeignKeyInfo, ...]
+    ddl: str
+
+
+def build_table_ddl(name: str, columns: Iterable[ColumnInfo], primary_key: Iterable[str], foreign_keys: Iterable[ForeignKeyInfo]) -> str:
+    """Render a table as a CREATE TABLE snippet for prompts"""
+    lines = [f"  {column.name} {column.type}{'' if column.nullable else ' NOT NULL'}" for column in columns]
+    primary_key = list(primary_key)
+    if primary_key:
+        lines.append(f"  PRIMARY KEY ({', '.join(primary_key)})")
+    for fk in foreign_keys:
+        lines.append(
+            f"  FOREIGN KEY ({', '.join(fk.constrained_columns)}) "
+            f"REFERENCES {fk.referred_table} ({', '.join(fk.referred_columns)})"
+        )
+    return f"CREATE TABLE {name} (\n" + ",\n".join(lines) + "\n);"
+
+
+def get_partition_names(bind, schema: Optional[str] = None) -> Set[str]:
+    """Names of Postgres partition children, e.g. fuel_transaction_y2024m01, which are queried through their parent"""
+    if bind.dialect.name != "postgresql":
+        return set()
+    query = text(
+        "SELECT c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.relispartition AND n.nspname = COALESCE(:schema, current_schema())"
+    )
+    if isinstance(bind, Engine):
+        with bind.connect() as connection:
+            return set(connection.execute(query, {"schema": schema}).scalars())
+    return set(bind.execute(query, {"schema": schema}).scalars())
+
+
+class SchemaCatalog:
+    """
+    Immutable snapshot of the database schema built from one reflection pass.
+    Tables are looked up by name in O(1) and carry a precomputed DDL snippet.
+    """
+
+    def __init__(self, tables: Dict[str, TableInfo]):
+        self.tables = MappingProxyType(dict(tables))
+        self.table_names: Tuple[str, ...] = tuple(self.tables)
+        digest = hashlib.sha256("\n".join(self.tables[name].ddl for name in sorted(self.tables)).encode("utf-8"))
+        self.fingerprint = digest.hexdigest()[:16]
+
+    @classmethod
+    def reflect(cls, bind, schema: Optional[str] = None) -> "SchemaCatalog":
+        """
+        Reflect every table except partition children with one batched query per
+        object kind (bind: engine or connection)
+        """
+        inspector = inspect(bind)
+        partition_names = get_partition_names(bind, schema)
+        filter_names = None
+        if partition_names:
+            filter_names = [name for name in inspector.get_table_names(schema=schema) if name not in partition_names]
+        multi_columns = inspector.get_multi_columns(schema=schema, filter_names=filter_names)
+        multi_pks = inspector.get_multi_pk_constraint(schema=schema, filter_names=filter_names)
+        multi_fks = inspector.get_multi_foreign_keys(schema=schema, filter_names=filter_names)
+
+        tables = {}
+        for key in sorted(multi_columns, key=lambda k: k[1]):
+            name = key[1]
+            columns = tuple(
+                ColumnInfo(
+                    name=column["name"],
+                    type=str(column["type"]),
+                    nullable=column["nullable"],
+                    default=str(column["default"]) if column["default"] else None,
+                )
+                for column in multi_columns[key]
+            )
+            primary_key = tuple((multi_pks.get(key) or {}).get("constrained_columns") or ())
+            foreign_keys = tuple(
+                ForeignKeyInfo(
+                    name=fk.get("name"),
+                    constrained_columns=tuple(fk["constrained_columns"]),
+                    referred_table=fk["referred_table"],
+                    referred_columns=tuple(fk["referred_columns"]),
+                )
+                for fk in multi_fks.get(key, [])
+            )
+            tables[name] = TableInfo(
+                name=name,
+                columns=columns,
+                primary_key=primary_key,
+                foreign_keys=foreign_keys,
+                ddl=build_table_ddl(name, columns, primary_key, foreign_keys),
+            )
+        return cls(tables)
+
+    def has_table(self, table_name: str) -> bool:
+        return table_name in self.tables
+
+    def get_table(self, table_name: str) -> Optional[TableInfo]:
+        return self.tables.get(table_name)
+
+    def get_ddl(self, table_name: str) -> Optional[str]:
+        table = self.tables.get(table_name)
+        return table.ddl if table else None
+
+    def get_ddl_by_names(self, table_names: Iterable[str]) -> Dict[str, str]:
+        """Get DDL snippets of the requested tables that exist"""
+        return {name: self.tables[name].ddl for name in table_names if name in self.tables}
+
+    def to_schema_info(self, table_names: Optional[Iterable[str]] = None, include_column_details: bool = True) -> Dict:
+        """Render tables in the dictionary layout returned by the SQLAlchemy inspector"""
+        schema_info = {}
+        for name in (self.table_names if table_names is None else table_names):
+            table = self.tables.get(name)
+            if table is None:
+                schema_info[name] = {"error": f"Table '{name}' does not exist"}
+                continue
+            if include_column_details:
+                columns = [column._asdict() for column in table.columns]
+            else:
+                columns = [{"name": column.name, "type": column.type} for column in table.columns]
+            schema_info[name] = {
+                "columns": columns,
+                "primary_key": list(table.primary_key),
+                "foreign_keys": [
+                    {
+                        "name": fk.name,
+                        "constrained_columns": list(fk.constrained_columns),
+                        "referred_table": fk.referred_table,
+                        "referred_columns": list(fk.referred_columns),
+                    }
+                    for fk in table.foreign_keys
+                ],
+            }
+        return schema_info
+
+
+_catalogs: Dict[str, SchemaCatalog] = {}
+_catalog_lock = threading.Lock()
+
+
+def get_catalog_key(url) -> str:
+    """Key catalogs by database location so sync and async drivers share one catalog"""
+    return f"{url.host}:{url.port}/{url.database}"
+
+
+def get_cached_schema_catalog(url) -> Optional[SchemaCatalog]:
+    return _catalogs.get(get_catalog_key(url))
+
+
+def set_schema_catalog(url, catalog: SchemaCatalog) -> SchemaCatalog:
+    """Store a catalog unless another thread already built one, and return the stored catalog"""
+    with _catalog_lock:
+        catalog = _catalogs.setdefault(get_catalog_key(url), catalog)
+    return catalog
+
+
+def get_schema_catalog(engine) -> SchemaCatalog:
+    """Get the process-wide catalog for an engine, reflecting on first use"""
+    key = get_catalog_key(engine.url)
+    catalog = _catalogs.get(key)
+    if catalog is None:
+        with _catalog_lock:
+            catalog = _catalogs.get(key)
+            if catalog is None:
+                catalog = SchemaCatalog.reflect(engine)
+                _catalogs[key] = catalog
+                print(f"Schema catalog built: {len(catalog.table_names)} tables, fingerprint {catalog.fingerprint}")
+    return catalog
+
+
+def invalidate_schema_catalog() -> None:
+    """Drop cached catalogs so the next lookup reflects the database again"""
+    with _catalog_lock:
+        _catalogs.clear()
+    print("Schema catalog invalidated")
@@ -0,0 +1,194 @@
+import os
+import re
+import math
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+# Long reflected type names shortened for the prompt
+_TYPE_ALIASES = [
+    (re.compile(r"^TIMESTAMP WITHOUT TIME ZONE$|^TIMESTAMP$", re.IGNORECASE), "timestamp"),
+    (re.compile(r"^TIMESTAMP WITH TIME ZONE$", re.IGNORECASE), "timestamptz"),
+    (re.compile(r"^CHARACTER VARYING", re.IGNORECASE), "varchar"),
+    (re.compile(r"^DOUBLE PRECISION$", re.IGNORECASE), "float8"),
+    (re.compile(r"^INTEGER$", re.IGNORECASE), "int"),
+    (re.compile(r"^BOOLEAN$", re.IGNORECASE), "bool"),
+]
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Token count of a prompt fragment. Uses tiktoken when it is installed
+    (SCHEMA_TOKENIZER encoding), otherwise a word/punctuation estimate.
+    """
+    global _encoding
+    if tiktoken is not None and _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    _encoding = tiktoken.get_encoding(os.getenv("SCHEMA_TOKENIZER", "cl100k_base"))
+                except Exception as e:
+                    # The encoding file is downloaded on first use and may be unreachable
+                    print(f"Warning: tiktoken encoding unavailable, estimating tokens: {e}")
+                    _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    words = re.findall(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]", text)
+    # Long identifiers split into several tokens, roughly one per four letters
+    return sum(math.ceil(len(word) / 4) if word.isalpha() else 1 for word in words)
+
+
+def format_column_type(column_type: str) -> str:
+    compact = column_type.replace(", ", ",")
+    for pattern, alias in _TYPE_ALIASES:
+        compact = pattern.sub(alias, compact)
+    return compact.lower()
+
+
+def get_name_words(name: str) -> Set[str]:
+    """Words of an identifier or prompt, singular, e.g. fuel_stations -> {fuel, station}"""
+    words = set()
+    for word in _WORD_PATTERN.findall(name.lower()):
+        words.add(word)
+        if len(word) > 3 and word.endswith("s"):
+            words.add(word[:-1])
+    return words
+
+
+class SchemaSerializer:
+    """
+    Compact prompt form of the schema catalog, one line per table:
+    table(id int PK, other_id int -> other.id, nullable_col text?, ...)
+    Tables and columns are ranked by relevance to the prompt and added until
+    the token budget is spent; a table is shortened or left out, never cut.
+    """
+
+    def __init__(self, catalog, token_budget: int = 4000):
+        self.catalog = catalog
+        self.token_budget = token_budget
+        self._lines: Dict[str, str] = {}
+
+    def format_column(self, table, column, references: Dict[str, str]) -> str:
+        parts = [column.name, format_column_type(column.type)]
+        if tuple(table.primary_key) == (column.name,):
+            parts.append("PK")
+        if column.name in references:
+            parts.append(f"-> {references[column.name]}")
+        elif column.nullable and column.name not in table.primary_key:
+            parts[-1] += "?"
+        return " ".join(parts)
+
+    def format_table(self, table_name: str, column_names: Optional[Sequence[str]] = None) -> str:
+        """One table line; column_names keeps a subset of columns in table order"""
+        if column_names is None and table_name in self._lines:
+            return self._lines[table_name]
+        table = self.catalog.get_table(table_name)
+        references = {}
+        extra = []
+        for fk in table.foreign_keys:
+            if len(fk.constrained_columns) == 1:
+                references[fk.constrained_columns[0]] = f"{fk.referred_table}.{fk.referred_columns[0]}"
+            else:
+                extra.append(f"FK({','.join(fk.constrained_columns)}) -> {fk.referred_table}({','.join(fk.referred_columns)})")
+        if len(table.primary_key) > 1:
+            extra.insert(0, f"PK({','.join(table.primary_key)})")
+        keep = set(column_names) if column_names is not None else None
+        parts = [
+            self.format_column(table, column, references)
+            for column in table.columns if keep is None or column.name in keep
+        ]
+        dropped = len(table.columns) - len(parts)
+        if dropped:
+            parts.append(f"...{dropped} more")
+        line = f"{table_name}({', '.join(parts + extra)})"
+        if column_names is None:
+            self._lines[table_name] = line
+        return line
+
+    def score_table(self, table_name: str, prompt_words: Set[str]) -> float:
+        table = self.catalog.get_table(table_name)
+        score = 3.0 * len(get_name_words(table_name) & prompt_words)
+        for column in table.columns:
+            score += len(get_name_words(column.name) & prompt_words)
+        return score
+
+    def rank_columns(self, table_name: str, prompt_words: Set[str]) -> List[str]:
+        """Key columns first, then columns named in the prompt, then dates, then the rest"""
+        table = self.catalog.get_table(table_name)
+        key_columns = set(table.primary_key)
+        for fk in table.foreign_keys:
+            key_columns.update(fk.constrained_columns)
+
+        def rank(item):
+            index, column = item
+            if column.name in key_columns:
+                group = 0
+            elif get_name_words(column.name) & prompt_words:
+                group = 1
+            elif "date" in column.type.lower() or "time" in column.type.lower():
+                group = 2
+            else:
+                group = 3
+            return group, index
+
+        return [column.name for _, column in sorted(enumerate(table.columns), key=rank)]
+
+    def serialize(self, prompt: str, table_names: Optional[Iterable[str]] = None, notes: str = "") -> str:
+        """
+        Schema text of the given tables (every table when None) within the token budget.
+        notes (e.g. usage hints) are always appended and count against the budget.
+        """
+        prompt_words = get_name_words(prompt)
+        requested = list(self.catalog.table_names if table_names is None else table_names)
+        names = [name for name in dict.fromkeys(requested) if self.catalog.has_table(name)]
+        # Stable sort: explicitly selected tables keep their order among equal scores
+        ranked = sorted(names, key=lambda name: -self.score_table(name, prompt_words))
+
+        budget = self.token_budget
+        if notes:
+            budget -= count_tokens(notes) + 1
+        lines = []
+        omitted = []
+        shortened = []
+        used = 0
+        for name in ranked:
+            line = self.format_table(name)
+            cost = count_tokens(line) + 1
+            if used + cost > budget:
+                line = self._shorten_table(name, prompt_words, budget - used)
+                if line is None:
+                    omitted.append(name)
+                    continue
+                shortened.append(name)
+                cost = count_tokens(line) + 1
+            lines.append(line)
+            used += cost
+        if omitted:
+            lines.append(f"-- omitted for length: {', '.join(omitted)}")
+        if notes:
+            lines.append(notes)
+        if omitted or shortened:
+            print(f"Schema fitted to {self.token_budget} tokens: shortened {shortened or 'none'}, omitted {omitted or 'none'}")
+        return "\n".join(lines)
+
+    def _shorten_table(self, table_name: str, prompt_words: Set[str], remaining: int) -> Optional[str]:
+        """Line with the largest ranked prefix of the columns that fits, or None if none does"""
+        ranked_columns = self.rank_columns(table_name, prompt_words)
+        best = None
+        low, high = 1, len(ranked_columns) - 1
+        while low <= high:
+            middle = (low + high) // 2
+            line = self.format_table(table_name, ranked_columns[:middle])
+            if count_tokens(line) + 1 <= remaining:
+                best, low = line, middle + 1
+            else:
+                high = middle - 1
+        return best
@@ -0,0 +1,195 @@
+import os
+import hashlib
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional, Set, Tuple
+
+try:
+    import sqlglot
+    from sqlglot import exp
+    from sqlglot.errors import SqlglotError
+except ImportError:
+    sqlglot = None
+
+DIALECT = "postgres"
+
+# Server functions a read-only report query has no business calling
+BLOCKED_FUNCTIONS = frozenset(
+    "pg_sleep pg_sleep_for pg_sleep_until pg_terminate_backend pg_cancel_backend pg_reload_conf "
+    "pg_read_file pg_read_binary_file pg_ls_dir pg_stat_file lo_import lo_export "
+    "dblink dblink_exec set_config".split()
+)
+
+
+class SQLCheckFailed(Exception):
+    """Raised when a query fails the local check; the message reads like the database's own error"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CheckedSQL(NamedTuple):
+    sql: str  # the query to run, rewritten only when its LIMIT was added or clamped
+    fingerprint: Optional[str]
+    tables: Tuple[str, ...]
+    limited: bool
+
+
+@lru_cache(maxsize=1024)
+def _parse(sql_query: str):
+    """Parsed statements of a query; cached so the check and the cache key share one parse"""
+    return tuple(sqlglot.parse(sql_query, read=DIALECT))
+
+
+def get_sql_fingerprint(sql_query: str) -> Optional[str]:
+    """
+    Hash of the query's AST with comments, formatting and identifier case
+    normalized away, or None when sqlglot is missing or cannot parse the query.
+    """
+    if sqlglot is None:
+        return None
+    try:
+        statements = [statement for statement in _parse(sql_query) if statement is not None]
+    except SqlglotError:
+        return None
+    canonical = ";".join(statement.sql(dialect=DIALECT, normalize=True, comments=False) for statement in statements)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+class SQLChecker:
+    """
+    Local check of model-generated SQL before it reaches the database: one
+    read-only statement, tables and columns that exist in the schema catalog,
+    and a LIMIT no larger than max_limit. A broken query fails in about a
+    millisecond with a Postgres-style message instead of a database round trip.
+    """
+
+    def __init__(self, catalog=None, max_limit: Optional[int] = None):
+        self.catalog = catalog
+        self.ENABLED = os.getenv("SQL_CHECK_ENABLED", "true").lower() == "true"
+        self.max_limit = max_limit or int(os.getenv("SQL_MAX_LIMIT", "100000"))
+        self._columns: Dict[str, Set[str]] = {}
+        if catalog is not None:
+            for table_name in catalog.table_names:
+                self._columns[table_name.lower()] = {column.name.lower() for column in catalog.get_table(table_name).columns}
+        if sqlglot is None:
+            print("Warning: sqlglot is not installed, generated SQL is not checked locally.")
+
+    def check(self, sql_query: str) -> CheckedSQL:
+        """Check a query, raising SQLCheckFailed; the returned SQL is the one to execute"""
+        if sqlglot is None or not self.ENABLED:
+            return CheckedSQL(sql_query, None, (), False)
+        try:
+            statements = [statement for statement in _parse(sql_query) if statement is not None]
+        except SqlglotError as e:
+            raise SQLCheckFailed(f"syntax error: {str(e).splitlines()[0]}")
+        if len(statements) != 1:
+            raise SQLCheckFailed(f"expected a single statement, got {len(statements)}")
+        statement = statements[0]
+        self._check_read_only(statement)
+        tables = self._check_names(statement) if self._columns else ()
+
+        limited = True
+        limit = statement.args.get("limit")
+        limit_value = self._get_limit(limit)
+        if limit is None:
+            statement = statement.copy().limit(self.max_limit, copy=False)
+            print(f"SQL check: LIMIT added at {self.max_limit}")
+        elif limit_value is not None and limit_value <= self.max_limit:
+            limited = False
+        elif limit_value is not None and isinstance(limit, exp.Limit):
+            statement = statement.copy().limit(self.max_limit, copy=False)
+            print(f"SQL check: LIMIT clamped at {self.max_limit}")
+        else:
+            # FETCH, LIMIT ALL or a computed limit: capped from outside, the model's own limit still applies
+            statement = exp.select("*").from_(statement.subquery("_q")).limit(self.max_limit)
+            print(f"SQL check: query wrapped in LIMIT {self.max_limit}")
+        if limited:
+            sql_query = statement.sql(dialect=DIALECT)
+        return CheckedSQL(sql_query, get_sql_fingerprint(sql_query), tables, limited)
+
+    def _check_read_only(self, statement) -> None:
+        if not isinstance(statement, exp.Query):
+            raise SQLCheckFailed(f"only SELECT queries are allowed, got {statement.key.upper()}")
+        for node in statement.walk():
+            if isinstance(node, (exp.Insert, exp.Update, exp.Delete, exp.Merge, exp.Create, exp.Drop,
+                                 exp.Alter, exp.Command, exp.Set, exp.TruncateTable)):
+                raise SQLCheckFailed(f"only SELECT queries are allowed, found {node.key.upper()}")
+            if isinstance(node, exp.Into):
+                raise SQLCheckFailed("SELECT INTO is not allowed")
+            if isinstance(node, exp.Lock):
+                raise SQLCheckFailed("row locking clauses are not allowed")
+            if isinstance(node, exp.Func):
+                name = (node.name if isinstance(node, exp.Anonymous) else node.sql_name()).lower()
+                if name in BLOCKED_FUNCTIONS:
+                    raise SQLCheckFailed(f"function {name}() is not allowed")
+
+    def _check_names(self, statement) -> Tuple[str, ...]:
+        """Check table and column names against the catalog, returning the tables used"""
+        cte_names = {cte.alias_or_name.lower() for cte in statement.find_all(exp.CTE)}
+        # Alias or table name -> catalog table, None for CTEs, subqueries and table functions
+        sources: Dict[str, Optional[str]] = {}
+        tables = []
+        for table in statement.find_all(exp.Table):
+            if not isinstance(table.this, exp.Identifier):
+                if table.alias:
+                    sources[table.alias.lower()] = None
+                continue
+            name = table.name.lower()
+            if name in cte_names and not table.db:
+                sources[table.alias_or_name.lower()] = None
+                continue
+            if name not in self._columns:
+                raise SQLCheckFailed(f'relation "{table.name}" does not exist')
+            sources[table.alias_or_name.lower()] = name
+            sources.setdefault(name, name)
+            if name not in tables:
+                tables.append(name)
+        for subquery in statement.find_all(exp.Subquery, exp.Lateral, exp.Unnest):
+            if subquery.alias:
+                sources[subquery.alias.lower()] = None
+
+        # Names a bare column may refer to besides real columns: output and derived column aliases,
+        # and table function or subquery aliases, e.g. "generate_series(...) AS day" yields a column "day".
+        # Bare columns selected by CTEs and subqueries are checked where they are selected.
+        aliases = {alias.alias.lower() for alias in statement.find_all(exp.Alias)}
+        aliases.update(alias for alias, source in sources.items() if source is None)
+        for table_alias in statement.find_all(exp.TableAlias):
+            aliases.update(column.name.lower() for column in table_alias.columns)
+        table_columns = set().union(*(self._columns[name] for name in tables)) if tables else set()
+
+        for column in statement.find_all(exp.Column):
+            if isinstance(column.this, exp.Star):
+                continue
+            name = column.name.lower()
+            qualifier = column.table.lower()
+            if qualifier:
+                if qualifier not in sources:
+                    raise SQLCheckFailed(f'missing FROM-clause entry for table "{column.table}"')
+                source = sources[qualifier]
+                if source is not None and name not in self._columns[source]:
+                    raise SQLCheckFailed(f'column {column.table}.{column.name} does not exist')
+            elif name not in table_columns and name not in aliases:
+                raise SQLCheckFailed(f'column "{column.name}" does not exist')
+        return tuple(tables)
+
+    def _get_limit(self, limit) -> Optional[int]:
+        """
+        Row count of the outer query's LIMIT or FETCH FIRST clause when it is an integer
+        literal (a cast one included); None for no clause, LIMIT ALL, computed counts
+        and FETCH ... PERCENT or WITH TIES
+        """
+        if isinstance(limit, exp.Fetch):
+            options = limit.args.get("limit_options")
+            if options is not None and (options.args.get("percent") or options.args.get("with_ties")):
+                return None
+            value = limit.args.get("count") or exp.Literal.number(1)
+        elif isinstance(limit, exp.Limit):
+            value = limit.expression
+        else:
+            return None
+        if isinstance(value, exp.Cast):
+            value = value.this
+        if isinstance(value, exp.Literal) and value.is_int:
+            return int(value.this)
+        return None
@@ -65,7 +65,7 @@ class TelegramBot:
             file_path = os.path.join(self.IMG_DIR, file_name)
             await photo_file.download_to_drive(file_path)
             
-            result = self.analysis_controller.extract_and_save_fuel_transaction(file_path, image_info)
+            result = await self.analysis_controller.aextract_and_save_fuel_transaction(file_path, image_info)
             
             log_entry = (
                 f"Image Details:\n"
@@ -118,7 +118,7 @@ class TelegramBot:
 
         try:
             html_prompt = "Based on this data, generate a html page for me to visualize it."
-            html_file_path, explanation = self.analysis_controller.retrive_and_generate_html_file(
+            html_file_path, explanation = await self.analysis_controller.aretrive_and_generate_html_file(
                 sql_prompt=message, 
                 html_prompt=html_prompt
             )
@@ -0,0 +1,148 @@
+import os
+import time
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class TieredCache:
+    """
+    Bounded in-memory LRU with TTL in front of an optional on-disk pickle tier.
+    Subclasses decide how keys are built.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: int = 600,
+                 disk_dir: Optional[str] = None, disk_max_entries: int = 1000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        self.disk_max_entries = disk_max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # The disk tier is pruned every prune_interval writes, so it may exceed disk_max_entries by that much
+        self.prune_interval = max(disk_max_entries // 10, 1)
+        self._disk_writes = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a cached value from memory, then disk, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] >= now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+        value = self._read_disk(key, now)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._store_memory(key, value, now + self.ttl_seconds)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        self._store_memory(key, value, expires_at)
+        self._write_disk(key, value, expires_at)
+
+    def delete(self, key: str) -> None:
+        """Drop a value from both tiers"""
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.disk_dir:
+            try:
+                os.remove(self._disk_path(key))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Warning: Failed to delete cache file: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.disk_dir:
+            for file_name in os.listdir(self.disk_dir):
+                if file_name.endswith(".pkl"):
+                    os.remove(os.path.join(self.disk_dir, file_name))
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else None,
+                "disk_enabled": bool(self.disk_dir),
+            }
+
+    def _store_memory(self, key: str, value: Any, expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.pkl")
+
+    def _read_disk(self, key: str, now: float) -> Optional[Any]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as file:
+                expires_at, value = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Warning: Failed to read cache file {path}: {e}")
+            return None
+        if expires_at < now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return value
+
+    def _write_disk(self, key: str, value: Any, expires_at: float) -> None:
+        if not self.disk_dir:
+            return
+        try:
+            tmp_path = self._disk_path(key) + ".tmp"
+            with open(tmp_path, "wb") as file:
+                pickle.dump((expires_at, value), file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._disk_path(key))
+            with self._lock:
+                self._disk_writes += 1
+                prune = self._disk_writes % self.prune_interval == 0
+            if prune:
+                self._prune_disk()
+        except Exception as e:
+            print(f"Warning: Failed to write cache file: {e}")
+
+    def _prune_disk(self) -> None:
+        paths = [os.path.join(self.disk_dir, name) for name in os.listdir(self.disk_dir) if name.endswith(".pkl")]
+        if len(paths) <= self.disk_max_entries:
+            return
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:len(paths) - self.disk_max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass